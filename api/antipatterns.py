@@ -0,0 +1,468 @@
+"""Find non-sargable predicates and other index-defeating patterns in SQL.
+
+Purely static and deterministic: the same code always yields the same
+findings, each with its location and a concrete rewrite. /optimize feeds the
+findings to the model; on its own:
+
+    python antipatterns.py procedure.sql --dialect postgresql
+    python antipatterns.py query.sql --dialect mysql --json
+
+String literals are scanned too, so queries built as dynamic SQL are covered.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+@dataclass
+class Finding:
+    rule: str
+    message: str
+    line: int
+    column: int
+    code: str
+    rewrite: str
+    # Offsets of ``code`` in the analyzed text.
+    start: int
+    end: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+# =============================================================================
+# Lexical Helpers
+# =============================================================================
+
+_STRING_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|(--[^\n]*|/\*.*?\*/)", re.S)
+
+def _blank_comments(code: str) -> str:
+    """Blank out comments, keeping offsets and string literals intact."""
+    return _STRING_OR_COMMENT.sub(lambda m: " " * len(m.group()) if m.group(1) else m.group(), code)
+
+_NAME = r"(?:[A-Za-z_][\w$]*|\"[^\"]+\"|\[[^\]]+\]|`[^`]+`)"
+_COLUMN = rf"{_NAME}(?:\s*\.\s*{_NAME})*"
+_COMPARISON = r"\s*(=\s*ANY\b|<>\s*ALL\b|NOT\s+IN\b|IN\b|BETWEEN\b|<=|>=|<>|!=|=|<|>)"
+_ATOM = re.compile(r"\s*(?:@{0,2}\w+(?:\s*\.\s*\w+)*|N?'(?:[^']|'')*'|\d+(?:\.\d+)?|" + _NAME + ")")
+
+_NOT_COLUMNS = {"NULL", "TRUE", "FALSE", "CURRENT_DATE", "CURRENT_TIMESTAMP"}
+
+def _unquote(name: str) -> str:
+    return re.sub(r"[\"\[\]`\s]", "", name).lower()
+
+def _close(code: str, index: int) -> int:
+    """Offset of the parenthesis closing the one at ``index``, or -1."""
+    depth = 0
+    for i in range(index, len(code)):
+        if code[i] == "(":
+            depth += 1
+        elif code[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def _operand_end(code: str, pos: int) -> int:
+    """End of the operand starting at ``pos``: a parenthesised group, call, name or literal."""
+    match = re.compile(r"\s*").match(code, pos)
+    pos = match.end()
+    if pos < len(code) and code[pos] == "(":
+        end = _close(code, pos) + 1
+    else:
+        atom = _ATOM.match(code, pos)
+        if atom is None:
+            return pos
+        end = atom.end()
+        if end < len(code) and code[end] == "(":
+            end = _close(code, end) + 1
+    if end <= 0:
+        return len(code)
+    cast = re.compile(r"\s*::\s*\w+(?:\[\])?").match(code, end)
+    return cast.end() if cast else end
+
+def _comparison_end(code: str, operator: str, pos: int) -> int:
+    end = _operand_end(code, pos)
+    if operator.upper() == "BETWEEN":
+        conjunction = re.compile(r"\s+AND\b", re.I).match(code, end)
+        if conjunction:
+            end = _operand_end(code, conjunction.end())
+    return end
+
+def _split_args(text: str) -> List[str]:
+    args, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            args.append(text[start:i].strip())
+            start = i + 1
+    args.append(text[start:].strip())
+    return args
+
+def _location(code: str, offset: int) -> Tuple[int, int]:
+    line = code.count("\n", 0, offset) + 1
+    return line, offset - (code.rfind("\n", 0, offset) + 1) + 1
+
+_SIGNATURE = re.compile(r"\b(?:PROCEDURE|FUNCTION)\s+[^(]*\(", re.I)
+_DECLARED = re.compile(r"(?:\bDECLARE\b|;|\A)\s*(?!DECLARE\b)([A-Za-z_]\w*)\s+(?=(?:CONSTANT\s+)?[A-Za-z_])", re.I)
+_PARAMETER_MODES = {"IN", "OUT", "INOUT", "VARIADIC"}
+
+def _variables(code: str) -> Set[str]:
+    """Lowercased parameter and local variable names of a routine; bare names elsewhere are columns.
+
+    SQL Server variables carry an @ and need no declaration lookup.
+    """
+    names: Set[str] = set()
+    signature = _SIGNATURE.search(code)
+    if signature is None:
+        return names
+    close = _close(code, signature.end() - 1)
+    for parameter in _split_args(code[signature.end():close] if close != -1 else ""):
+        words = parameter.split()
+        if words and words[0].upper() in _PARAMETER_MODES:
+            words = words[1:]
+        if words:
+            names.add(_unquote(words[0]))
+    body = code[close + 1:] if close != -1 else ""
+    begin = re.search(r"\bBEGIN\b", body, re.I)
+    # PL/pgSQL declares between the body delimiter and BEGIN, MySQL after BEGIN.
+    for declarations in (body[:begin.start()] if begin else "", body):
+        for match in _DECLARED.finditer(declarations):
+            if declarations is body and not match.group(0).lstrip().upper().startswith("DECLARE"):
+                continue
+            names.add(match.group(1).lower())
+    return names - {"declare", "begin", "as", "returns", "language", "exit", "continue"}
+
+def _is_column(text: str, variables: Set[str]) -> bool:
+    text = text.strip()
+    if not re.fullmatch(_COLUMN, text) or text.upper() in _NOT_COLUMNS:
+        return False
+    return "." in text or _unquote(text) not in variables
+
+def _table_of(code: str, column: str) -> Optional[str]:
+    """The table behind a column's alias, from the FROM/JOIN clauses."""
+    if "." not in column:
+        return None
+    alias = column.rsplit(".", 1)[0].strip()
+    match = re.search(
+        rf"\b(?:FROM|JOIN)\s+({_COLUMN})\s+(?:AS\s+)?{re.escape(alias)}(?![\w$])", code, re.I
+    )
+    return match.group(1) if match else None
+
+def _bare(column: str) -> str:
+    return column.rsplit(".", 1)[-1].strip()
+
+def _joined_column(code: str, column: str) -> Optional[str]:
+    """A column ``column`` is equated with under another alias, e.g. ``dd.Calendar`` for ``fs.OrderDate``."""
+    target = _unquote(column)
+    alias = target.rsplit(".", 1)[0]
+    for match in re.finditer(rf"({_COLUMN})\s*=\s*({_COLUMN})", code):
+        left, right = match.group(1), match.group(2)
+        for mine, other in ((left, right), (right, left)):
+            other_key = _unquote(other)
+            if _unquote(mine) == target and "." in other_key and other_key.rsplit(".", 1)[0] != alias:
+                return other.strip()
+    return None
+
+# =============================================================================
+# Rules
+# =============================================================================
+
+_DATE_FUNCTIONS = [
+    # (pattern, unit group, column group)
+    re.compile(rf"\b(YEAR|MONTH|DAY)\s*\(\s*({_COLUMN})\s*\)", re.I),
+    re.compile(rf"\bDATE_PART\s*\(\s*'{{1,2}}(\w+)'{{1,2}}\s*,\s*({_COLUMN})\s*\)", re.I),
+    re.compile(rf"\bEXTRACT\s*\(\s*(\w+)\s+FROM\s+({_COLUMN})\s*\)", re.I),
+    re.compile(rf"\bDATEPART\s*\(\s*(\w+)\s*,\s*({_COLUMN})\s*\)", re.I),
+]
+
+_DATEPART_UNITS = {"yy": "year", "yyyy": "year", "mm": "month", "m": "month", "dd": "day", "d": "day"}
+
+def _year_range(dialect: str, column: str, value: str) -> str:
+    make = {
+        "postgresql": lambda year: f"make_date({year}, 1, 1)",
+        "sqlserver": lambda year: f"DATEFROMPARTS({year}, 1, 1)",
+        "mysql": lambda year: f"MAKEDATE({year}, 1)",
+    }[dialect]
+    return f"{column} >= {make(value)} AND {column} < {make(value + ' + 1')}"
+
+def _date_index(dialect: str, code: str, column: str, function: str, unit: str) -> str:
+    table = _table_of(code, column) or "<table>"
+    bare = _bare(column)
+    expression = function.replace(column, bare)
+    if dialect == "postgresql":
+        return f"CREATE INDEX ON {table} (({expression}));"
+    if dialect == "mysql":
+        return f"ALTER TABLE {table} ADD INDEX (({expression}));"
+    computed = re.sub(r"[\"\[\]`]", "", bare) + unit.title()
+    table_name = re.sub(r"[\"\[\]`]", "", table).split(".")[-1]
+    return (
+        f"ALTER TABLE {table} ADD {computed} AS {expression} PERSISTED;\n"
+        f"CREATE INDEX IX_{table_name}_{computed} ON {table} ({computed});\n"
+        f"-- then filter on {computed} instead of {expression}"
+    )
+
+def _date_extraction(code: str, dialect: str, variables: Set[str]) -> List[Finding]:
+    findings = []
+    for pattern in _DATE_FUNCTIONS:
+        for match in pattern.finditer(code):
+            unit, column = match.group(1).lower(), match.group(2)
+            unit = _DATEPART_UNITS.get(unit, unit)
+            comparison = re.compile(_COMPARISON, re.I).match(code, match.end())
+            if comparison is None or not _is_column(column, variables):
+                continue
+            operator = re.sub(r"\s+", " ", comparison.group(1)).upper()
+            end = _comparison_end(code, operator, comparison.end())
+            function, predicate = match.group(), code[match.start():end]
+            rhs = code[comparison.end():end].strip()
+            dimension = _joined_column(code, column)
+            if dimension is not None:
+                rewrite = function.replace(column, dimension) + code[match.end():end]
+                message = (
+                    f"{unit.upper()} extraction on {column} cannot use an index. It is equated with "
+                    f"{dimension}, so filter the (small) dimension instead and let the join restrict {column}."
+                )
+            elif unit == "year" and operator == "=" and "," not in rhs:
+                rewrite = _year_range(dialect, column, rhs)
+                message = f"YEAR extraction on {column} cannot use an index; compare against a date range instead."
+            else:
+                rewrite = _date_index(dialect, code, column, function, unit)
+                message = (
+                    f"{unit.upper()} extraction on {column} cannot use an index; join a date dimension and filter "
+                    "it there, or index the expression."
+                )
+            findings.append(_finding(code, "non-sargable-date-part", message, match.start(), end, rewrite))
+    return findings
+
+_VARIABLE = {
+    "sqlserver": r"@\w+",
+    "postgresql": r"(?<![\w.@\"\]`])[A-Za-z_]\w*",
+    "mysql": r"(?<![\w.@\"\]`])[A-Za-z_]\w*",
+}
+
+def _catch_all_rewrite(dialect: str, tested: List[str], variables: List[str], predicate: str) -> str:
+    condition = " AND ".join(f"{variable} IS NOT NULL" for variable in tested)
+    predicate = re.sub(r"\s+", " ", predicate).strip()
+    if dialect == "sqlserver":
+        fragment = predicate.replace("''", "'").replace("'", "''")
+        return (
+            f"IF {condition} SET @Sql = @Sql + N' AND {fragment}';\n"
+            "-- pass the variables as sp_executesql parameters, or append OPTION (RECOMPILE) to the static query"
+        )
+    pattern = re.compile(r"(?<![\w.@])(" + "|".join(map(re.escape, variables)) + r")(?!\w)", re.I)
+    # Alternating SQL text and variable names, leaving string literals alone.
+    pieces = [""]
+    for segment in re.split(r"('(?:[^']|'')*')", predicate):
+        parts = [segment] if segment.startswith("'") else pattern.split(segment)
+        pieces[-1] += parts[0]
+        pieces.extend(parts[1:])
+    if dialect == "postgresql":
+        literal = "".join("%L" if index % 2 else piece for index, piece in enumerate(pieces)).replace("'", "''")
+        arguments = ", ".join(pieces[1::2])
+        return (
+            f"IF {condition} THEN\n    query := query || format(' AND {literal}', {arguments});\nEND IF;\n"
+            "-- then OPEN cursor FOR EXECUTE query"
+        )
+    parts = [
+        f"QUOTE({piece})" if index % 2 else "'" + piece.replace("'", "''") + "'"
+        for index, piece in enumerate(pieces) if piece or index % 2
+    ]
+    return (
+        f"IF {condition} THEN\n    SET @sql = CONCAT(@sql, ' AND ', {', '.join(parts)});\nEND IF;\n"
+        "-- then PREPARE stmt FROM @sql; EXECUTE stmt;"
+    )
+
+def _split_or(text: str) -> List[str]:
+    """Operands of the top-level ORs in ``text``."""
+    depth, parts, begin = 0, [], 0
+    depths = []
+    for char in text:
+        depth += char == "("
+        depth -= char == ")"
+        depths.append(depth)
+    for match in re.finditer(r"\bOR\b", text, re.I):
+        if depths[match.start()] == 0:
+            parts.append(text[begin:match.start()])
+            begin = match.end()
+    parts.append(text[begin:])
+    return parts
+
+def _catch_all(code: str, dialect: str, variables: Set[str]) -> List[Finding]:
+    findings = []
+    is_null = re.compile(rf"\s*({_VARIABLE[dialect]})\s+IS\s+NULL\s*", re.I)
+    for opening in re.finditer(r"\(", code):
+        close = _close(code, opening.start())
+        if close == -1:
+            continue
+        parts = _split_or(code[opening.end():close])
+        tested = [match.group(1) for match in map(is_null.fullmatch, parts) if match]
+        predicates = [part for part in parts if not is_null.fullmatch(part)]
+        if not tested or len(predicates) != 1 or not re.search(rf"{_NAME}\s*\.\s*{_NAME}", predicates[0]):
+            continue
+        predicate = predicates[0]
+        # Every variable the predicate reads has to be passed into the dynamic SQL.
+        used = [
+            name for name in dict.fromkeys(re.findall(_VARIABLE[dialect], predicate))
+            if name.lower() in variables and name not in tested
+        ]
+        message = (
+            f"Catch-all filter on {', '.join(tested)}: one plan has to serve both the NULL and the "
+            "filtered case, so indexes on the filtered column go unused. Add the predicate only when "
+            "the variable is set."
+        )
+        findings.append(_finding(
+            code, "catch-all-predicate", message, opening.start(), close + 1,
+            _catch_all_rewrite(dialect, tested, tested + used, predicate),
+        ))
+    return findings
+
+def _find_in_set(code: str, dialect: str, variables: Set[str]) -> List[Finding]:
+    findings = []
+    for match in re.finditer(r"\bFIND_IN_SET\s*\(", code, re.I):
+        close = _close(code, match.end() - 1)
+        args = _split_args(code[match.end():close]) if close != -1 else []
+        if len(args) != 2 or not re.search(_NAME, args[0]):
+            continue
+        needle, haystack = args
+        rewrite = (
+            f"{needle} IN (SELECT j.v FROM JSON_TABLE(CONCAT('[\"', REPLACE({haystack}, ',', '\",\"'), '\"]'),"
+            " '$[*]' COLUMNS (v VARCHAR(255) PATH '$')) AS j)"
+        )
+        message = (
+            f"FIND_IN_SET scans every row and cannot use an index on {needle}; "
+            "turn the list into a derived table and use IN."
+        )
+        if "(" in needle:
+            message += " The function around the column still needs its own fix."
+        findings.append(_finding(code, "find-in-set", message, match.start(), close + 1, rewrite))
+    return findings
+
+_CASTS = [
+    re.compile(rf"({_COLUMN})\s*::\s*(\w+)(?:\s*\(\s*\d+\s*\))?", re.I),
+    re.compile(rf"\bCAST\s*\(\s*({_COLUMN})\s+AS\s+(\w+)(?:\s*\([^)]*\))?\s*\)", re.I),
+]
+
+# Key-like columns (``...id``) are assumed to be integers.
+_INTEGER = {"postgresql": "integer", "sqlserver": "INT", "mysql": "SIGNED"}
+
+def _column_cast(code: str, dialect: str, variables: Set[str]) -> List[Finding]:
+    findings = []
+    for pattern in _CASTS:
+        for match in pattern.finditer(code):
+            column = match.group(1)
+            comparison = re.compile(_COMPARISON, re.I).match(code, match.end())
+            if comparison is None or not _is_column(column, variables) or "." not in column:
+                continue
+            operator = re.sub(r"\s+", " ", comparison.group(1)).upper()
+            end = _comparison_end(code, operator, comparison.end())
+            rhs = code[comparison.end():end].strip()
+            column_type = _INTEGER[dialect] if re.search(r"id$", _unquote(column)) else "<column type>"
+            if operator in ("= ANY", "<> ALL") and rhs.startswith("(") and rhs.endswith(")"):
+                rewrite = f"{column} {operator}({rhs[1:-1].strip()}::{column_type}[])"
+            elif rhs.startswith("("):
+                rewrite = f"{column} {operator} {rhs}  -- with {column_type} values"
+            else:
+                rewrite = f"{column} {operator} CAST({rhs} AS {column_type})"
+            message = (
+                f"Casting {column} to {match.group(2)} is evaluated per row and defeats its index; "
+                "cast the other side to the column's type instead."
+            )
+            findings.append(_finding(code, "column-cast", message, match.start(), end, rewrite))
+    return findings
+
+def _leading_wildcard(code: str, dialect: str, variables: Set[str]) -> List[Finding]:
+    findings = []
+    pattern = re.compile(rf"({_COLUMN})\s+(?:NOT\s+)?I?LIKE\s+N?'{{1,2}}%", re.I)
+    for match in pattern.finditer(code):
+        column = match.group(1)
+        if not _is_column(column, variables):
+            continue
+        table = _table_of(code, column) or "<table>"
+        bare = _bare(column)
+        rewrite = {
+            "postgresql": f"CREATE EXTENSION IF NOT EXISTS pg_trgm;\nCREATE INDEX ON {table} USING gin ({bare} gin_trgm_ops);",
+            "mysql": f"ALTER TABLE {table} ADD FULLTEXT INDEX ({bare});  -- and search with MATCH ... AGAINST",
+            "sqlserver": f"CREATE FULLTEXT INDEX ON {table} ({bare}) KEY INDEX <primary key index>;  -- and use CONTAINS",
+        }[dialect]
+        message = f"LIKE with a leading wildcard on {column} cannot seek an index."
+        end = code.find("'", match.end())
+        findings.append(_finding(code, "leading-wildcard", message, match.start(), end + 1 if end != -1 else match.end(), rewrite))
+    return findings
+
+def _finding(code: str, rule: str, message: str, start: int, end: int, rewrite: str) -> Finding:
+    line, column = _location(code, start)
+    return Finding(rule, message, line, column, code[start:end], rewrite, start, end)
+
+RULES: Dict[str, Callable[[str, str, Set[str]], List[Finding]]] = {
+    "non-sargable-date-part": _date_extraction,
+    "catch-all-predicate": _catch_all,
+    "find-in-set": _find_in_set,
+    "column-cast": _column_cast,
+    "leading-wildcard": _leading_wildcard,
+}
+
+# Rules are part of the /optimize prompt, so they take part in its cache version.
+RULES_FINGERPRINT = hashlib.sha256(inspect.getsource(sys.modules[__name__]).encode("utf-8")).hexdigest()[:16]
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def find_antipatterns(code: str, dialect: str) -> List[Finding]:
+    """Every anti-pattern found in ``code``, in source order."""
+    text = _blank_comments(code)
+    variables = _variables(text)
+    findings = [finding for rule in RULES.values() for finding in rule(text, dialect, variables)]
+    for finding in findings:
+        finding.code = code[finding.start:finding.end]
+    seen = set()
+    unique = []
+    for finding in sorted(findings, key=lambda f: (f.start, f.rule)):
+        if (finding.rule, finding.start) not in seen:
+            seen.add((finding.rule, finding.start))
+            unique.append(finding)
+    return unique
+
+def render_findings(findings: List[Finding]) -> str:
+    """Findings as a prompt section; empty when there are none."""
+    if not findings:
+        return ""
+    lines = [
+        "Static analysis found these performance problems in the code below. Apply the suggested "
+        "rewrites where they keep the results identical:"
+    ]
+    for number, finding in enumerate(findings, start=1):
+        found = re.sub(r"\s+", " ", finding.code)
+        lines.append(
+            f"\n{number}. Line {finding.line}, column {finding.column} ({finding.rule}): {finding.message}\n"
+            f"   Found: {found}\n"
+            f"   Suggested: {finding.rewrite}"
+        )
+    return "\n".join(lines)
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="SQL file to analyze ('-' for stdin)")
+    parser.add_argument("--dialect", choices=["sqlserver", "postgresql", "mysql"], required=True)
+    parser.add_argument("--json", action="store_true", help="print findings as JSON")
+    args = parser.parse_args()
+    if args.file == "-":
+        source = sys.stdin.read()
+    else:
+        with open(args.file, encoding="utf-8") as handle:
+            source = handle.read()
+    results = find_antipatterns(source, args.dialect)
+    if args.json:
+        print(json.dumps([finding.to_dict() for finding in results], indent=2))
+    else:
+        print(render_findings(results) or "No anti-patterns found.")
+    sys.exit(1 if results else 0)
@@ -0,0 +1,242 @@
+"""Load-test the API against a mock (or real) LLM backend.
+
+Runs in-process against the ASGI app by default, with the mock backend and
+no persistent cache, so results reflect the service's own overhead:
+
+    python benchmark.py --endpoint convert --concurrency 32 --requests 500
+    python benchmark.py --endpoint stream --latency-ms 300 --tokens-per-second 150
+    python benchmark.py --url http://localhost:8000 --endpoint batch
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+# =============================================================================
+# Workload
+# =============================================================================
+
+DIALECT_PAIRS = [
+    ("sqlserver", "postgresql"),
+    ("postgresql", "sqlserver"),
+    ("mysql", "postgresql"),
+    ("mysql", "sqlserver"),
+]
+
+_ROUTINE_NAME = re.compile(r"\b(PROCEDURE|FUNCTION)(\s+[\w.\[\]`\"]*?)(\w+)([\]`\"]?\s*\()", re.I)
+
+def _make_distinct(sql: str, index: int) -> str:
+    """Rename the routine so every request has its own cache/coalescing key."""
+    return _ROUTINE_NAME.sub(lambda m: f"{m.group(1)}{m.group(2)}{m.group(3)}_b{index}{m.group(4)}", sql, count=1)
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+def load_examples() -> Dict[str, str]:
+    """One procedure per source dialect, taken from the few-shot library."""
+    sources = {
+        "postgresql": "sales_summary_brands",
+        "sqlserver": "sales_summary_brands",
+        "mysql": "sales_by_product_best_rank",
+    }
+    examples = {}
+    for dialect, name in sources.items():
+        with open(os.path.join(EXAMPLES_DIR, name, f"{dialect}.sql"), encoding="utf-8") as handle:
+            examples[dialect] = handle.read()
+    return examples
+
+def build_request(endpoint: str, index: int, examples: Dict[str, str], distinct: bool, batch_size: int):
+    """(method path, JSON body) for the index-th request of the run."""
+    def item(i: int) -> dict:
+        source_type, target_type = DIALECT_PAIRS[i % len(DIALECT_PAIRS)]
+        code = examples[source_type]
+        return {
+            "source_code": _make_distinct(code, i) if distinct else code,
+            "source_type": source_type,
+            "target_type": target_type,
+            "bypass_cache": distinct,
+        }
+
+    if endpoint == "convert":
+        return "/convert", item(index)
+    if endpoint == "stream":
+        return "/convert/stream", item(index)
+    if endpoint == "batch":
+        return "/convert/batch", {"items": [item(index * batch_size + i) for i in range(batch_size)]}
+    if endpoint == "optimize":
+        sql_type = DIALECT_PAIRS[index % len(DIALECT_PAIRS)][0]
+        code = examples[sql_type]
+        return "/optimize", {
+            "sql_code": _make_distinct(code, index) if distinct else code,
+            "sql_type": sql_type,
+            "bypass_cache": distinct,
+        }
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from short sleeps."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - started - self.interval, 0.0))
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+async def send(client: httpx.AsyncClient, path: str, body: dict) -> Dict[str, float]:
+    """Issue one request; for SSE, also record time to first event."""
+    started = time.perf_counter()
+    if path.endswith("/stream"):
+        first_event = None
+        ok = True
+        async with client.stream("POST", path, json=body) as response:
+            ok = response.status_code == 200
+            async for line in response.aiter_lines():
+                if first_event is None and line.startswith("data:"):
+                    first_event = time.perf_counter() - started
+                if line.startswith("event: error"):
+                    ok = False
+        return {"latency": time.perf_counter() - started, "ok": ok, "ttfe": first_event}
+    response = await client.post(path, json=body)
+    ok = response.status_code == 200
+    if ok and path == "/convert/batch":
+        ok = response.json().get("failed", 0) == 0
+    return {"latency": time.perf_counter() - started, "ok": ok, "ttfe": None}
+
+async def run_benchmark(args: argparse.Namespace, client: httpx.AsyncClient, examples: Dict[str, str]) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(args.requests):
+        queue.put_nowait(index)
+    results: List[Dict[str, float]] = []
+
+    async def worker() -> None:
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            path, body = build_request(args.endpoint, index, examples, not args.repeat, args.batch_size)
+            try:
+                results.append(await send(client, path, body))
+            except httpx.HTTPError:
+                results.append({"latency": 0.0, "ok": False, "ttfe": None})
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    latencies = [r["latency"] for r in results if r["ok"]]
+    first_events = [r["ttfe"] for r in results if r["ttfe"] is not None]
+    items = args.requests * (args.batch_size if args.endpoint == "batch" else 1)
+    report = {
+        "endpoint": args.endpoint,
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "throughput_items_ps": round(items / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+        "event_loop_lag_ms": {
+            "p50": round(percentile(monitor.samples, 50) * 1000, 2),
+            "p99": round(percentile(monitor.samples, 99) * 1000, 2),
+            "max": round(max(monitor.samples, default=0.0) * 1000, 2),
+        },
+    }
+    if first_events:
+        report["time_to_first_event_ms"] = {
+            "p50": round(percentile(first_events, 50) * 1000, 1),
+            "p95": round(percentile(first_events, 95) * 1000, 1),
+        }
+    return report
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", choices=["convert", "optimize", "batch", "stream"], default="convert")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10, help="items per /convert/batch request")
+    parser.add_argument("--repeat", action="store_true",
+                        help="send identical payloads (exercises cache and coalescing) instead of distinct ones")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--latency-ms", type=float, help="mock backend time to first token")
+    parser.add_argument("--jitter", type=float, help="mock backend log-normal latency sigma")
+    parser.add_argument("--tokens-per-second", type=float, help="mock backend generation rate")
+    parser.add_argument("--llm-concurrency", type=int, help="override LLM_MAX_CONCURRENCY in-process")
+    parser.add_argument("--rpm-limit", type=int, help="override LLM_RPM_LIMIT (scheduler budget) in-process")
+    parser.add_argument("--tpm-limit", type=int, help="override LLM_TPM_LIMIT (scheduler budget) in-process")
+    parser.add_argument("--mock-rpm", type=int, help="mock backend rejects calls over this rate with 429")
+    return parser.parse_args()
+
+async def main_async(args: argparse.Namespace) -> dict:
+    # Configure before the app (and its config) is imported.
+    os.environ.setdefault("LLM_BACKEND", "mock")
+    os.environ.setdefault("CACHE_DB_PATH", "")
+    for name, value in (
+        ("MOCK_LLM_LATENCY_MS", args.latency_ms),
+        ("MOCK_LLM_JITTER", args.jitter),
+        ("MOCK_LLM_TOKENS_PER_SECOND", args.tokens_per_second),
+        ("LLM_MAX_CONCURRENCY", args.llm_concurrency),
+        ("LLM_RPM_LIMIT", args.rpm_limit),
+        ("LLM_TPM_LIMIT", args.tpm_limit),
+        ("MOCK_LLM_RATE_LIMIT_RPM", args.mock_rpm),
+    ):
+        if value is not None:
+            os.environ[name] = str(value)
+    examples = load_examples()
+    timeout = httpx.Timeout(600.0)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await run_benchmark(args, client, examples)
+
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+        return await run_benchmark(args, client, examples)
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(main_async(parse_args())), indent=2))
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import inspect
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# =============================================================================
+# Cache Keys
+# =============================================================================
+
+# String literals are kept verbatim; comments and runs of whitespace are not.
+_TOKEN_PATTERN = re.compile(
+    r"('(?:[^']|'')*')"                   # string literal
+    r"|((?:\s+|--[^\n]*|/\*.*?\*/)+)",     # whitespace and comments
+    re.DOTALL,
+)
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and strip comments outside of string literals."""
+    return _TOKEN_PATTERN.sub(lambda m: m.group(1) or " ", sql).strip()
+
+def prompt_version(*parts) -> str:
+    """Fingerprint prompt builders and templates.
+
+    Functions are hashed by their source, so editing a prompt yields a new
+    version and invalidates every entry built with the old one.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        text = inspect.getsource(part) if callable(part) else str(part)
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+def cache_key(kind: str, sql: str, source_type: str, target_type: str, version: str) -> str:
+    """Content-addressed key for a conversion or optimization request."""
+    payload = "\0".join([kind, version, source_type, target_type, normalize_sql(sql)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# =============================================================================
+# Two-Tier Conversion Cache
+# =============================================================================
+
+class ConversionCache:
+    """Bounded in-memory LRU backed by a persistent SQLite store.
+
+    The SQLite file is safe to share between worker processes on one host;
+    every worker keeps its own memory tier in front of it.
+    """
+
+    def __init__(self, max_entries: int, db_path: Optional[str], max_db_entries: int = 0):
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "writes": 0,
+            "bypasses": 0,
+        }
+        if db_path:
+            self._open(db_path)
+
+    def _open(self, db_path: str) -> None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversions_accessed ON conversions (accessed_at)")
+        self._db.commit()
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT value FROM conversions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE conversions SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        return row[0] if row else None
+
+    def _disk_put(self, key: str, value: str) -> None:
+        if self._db is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversions (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.max_db_entries:
+                cursor = self._db.execute(
+                    "DELETE FROM conversions WHERE key IN ("
+                    " SELECT key FROM conversions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_db_entries,),
+                )
+                self.stats["disk_evictions"] += max(cursor.rowcount, 0)
+            self._db.commit()
+
+    # -- public API ------------------------------------------------------------
+
+    async def get(self, key: str, bypass: bool = False) -> Optional[str]:
+        """Look up a key, promoting disk hits into the memory tier.
+
+        With ``bypass`` set the lookup is skipped and only counted.
+        """
+        if bypass:
+            self.stats["bypasses"] += 1
+            return None
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return value
+        value = await asyncio.to_thread(self._disk_get, key)
+        if value is not None:
+            self._remember(key, value)
+            self.stats["disk_hits"] += 1
+            return value
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, value: str) -> None:
+        """Store a value in both tiers."""
+        self._remember(key, value)
+        self.stats["writes"] += 1
+        await asyncio.to_thread(self._disk_put, key, value)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current tier sizes, for the stats endpoint."""
+        disk_entries = 0
+        if self._db is not None:
+            with self._lock:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM conversions").fetchone()[0]
+        return {**self.stats, "memory_entries": len(self._memory), "disk_entries": disk_entries}
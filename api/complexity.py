@@ -0,0 +1,58 @@
+import re
+from dataclasses import dataclass
+from typing import Sequence
+from segmenter import _mask
+
+# =============================================================================
+# Complexity Scoring
+# =============================================================================
+#
+# A cheap, local estimate of how hard a conversion is, used to pick a model
+# tier. Weights are deliberately coarse: the goal is to keep short queries
+# and simple procedures on the small model and send large multi-cursor or
+# dynamic-SQL procedures to a stronger one.
+
+_STATEMENT = re.compile(
+    r"\b(SELECT|INSERT|UPDATE|DELETE|MERGE|SET|DECLARE|IF|WHILE|LOOP|OPEN|FETCH|EXEC(?:UTE)?|CALL|RETURN)\b", re.I
+)
+_CURSOR = re.compile(r"\bOPEN\s+\w+\s+FOR\b|\bDECLARE\s+\w+\s+CURSOR\b|\b\w+\s+CURSOR\s+FOR\b", re.I)
+_CTE = re.compile(r"(?:\bWITH|,)\s*(?:RECURSIVE\s+)?\w+\s*(?:\([^()]*\)\s*)?AS\s*\(", re.I)
+_DYNAMIC_SQL = re.compile(r"\bsp_executesql\b|\bEXEC(?:UTE)?\s*\(\s*@|\bEXECUTE\s+format\s*\(|\bPREPARE\s+\w+\s+FROM\b", re.I)
+
+WEIGHTS = {
+    "statements": 0.5,
+    "cursors": 4.0,
+    "ctes": 2.0,
+    "dynamic_sql": 6.0,
+    "lines": 0.05,
+    "is_procedure": 5.0,
+}
+
+@dataclass
+class Complexity:
+    statements: int
+    cursors: int
+    ctes: int
+    dynamic_sql: int
+    lines: int
+    is_procedure: bool
+    score: float
+
+def score_complexity(sql: str, is_procedure: bool) -> Complexity:
+    """Score ``sql`` from statement, cursor, CTE and dynamic-SQL counts and length."""
+    masked = _mask(sql)
+    features = {
+        "statements": len(_STATEMENT.findall(masked)),
+        "cursors": len(_CURSOR.findall(masked)),
+        "ctes": len(_CTE.findall(masked)),
+        # Dynamic SQL lives in string literals, so count it on the raw text.
+        "dynamic_sql": len(_DYNAMIC_SQL.findall(sql)),
+        "lines": sum(1 for line in sql.splitlines() if line.strip()),
+        "is_procedure": bool(is_procedure),
+    }
+    score = sum(WEIGHTS[name] * float(value) for name, value in features.items())
+    return Complexity(score=round(score, 2), **features)
+
+def select_tier(score: float, thresholds: Sequence[float]) -> int:
+    """Index of the model tier for ``score``: one past the last threshold it reaches."""
+    return sum(1 for threshold in thresholds if score >= threshold)
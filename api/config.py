@@ -15,13 +15,107 @@ class Config:
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     
+    # LLM Backend Configuration ("openai", or "mock" for offline load testing)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "openai").lower()
+    # Model tiers, smallest first; requests are routed by complexity score and
+    # escalated one tier when the output fails local validation.
+    LLM_MODEL_TIERS: list = [
+        model.strip() for model in os.getenv("LLM_MODEL_TIERS", "gpt-4o-mini,gpt-4o").split(",") if model.strip()
+    ]
+    COMPLEXITY_TIER_THRESHOLDS: list = [
+        float(value) for value in os.getenv("COMPLEXITY_TIER_THRESHOLDS", "60").split(",") if value.strip()
+    ]
+    MODEL_ROUTING_ENABLED: bool = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    MODEL_ESCALATION_ENABLED: bool = os.getenv("MODEL_ESCALATION_ENABLED", "true").lower() == "true"
+    
+    # Output Repair Configuration (fragments failing local validation are sent back for repair)
+    REPAIR_ENABLED: bool = os.getenv("REPAIR_ENABLED", "true").lower() == "true"
+    REPAIR_MAX_ROUNDS: int = int(os.getenv("REPAIR_MAX_ROUNDS", "2"))
+    REPAIR_MAX_FRAGMENTS: int = int(os.getenv("REPAIR_MAX_FRAGMENTS", "4"))
+    MOCK_LLM_LATENCY_MS: float = float(os.getenv("MOCK_LLM_LATENCY_MS", "800"))
+    MOCK_LLM_JITTER: float = float(os.getenv("MOCK_LLM_JITTER", "0.3"))
+    MOCK_LLM_TOKENS_PER_SECOND: float = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "80"))
+    # Simulated provider limit: calls beyond this many per minute get a 429 (0 disables).
+    MOCK_LLM_RATE_LIMIT_RPM: int = int(os.getenv("MOCK_LLM_RATE_LIMIT_RPM", "0"))
+    
+    # Startup Configuration (LLM client is built in the background after startup)
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    STARTUP_BUDGET_SECONDS: float = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+    
+    # LLM Concurrency Configuration
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    
+    # Upstream Rate Limits (requests/tokens per minute for the API key; 0 disables a limit)
+    LLM_RPM_LIMIT: int = int(os.getenv("LLM_RPM_LIMIT", "0"))
+    LLM_TPM_LIMIT: int = int(os.getenv("LLM_TPM_LIMIT", "0"))
+    LLM_RATE_BURST_SECONDS: float = float(os.getenv("LLM_RATE_BURST_SECONDS", "5"))
+    # 429/503 responses are retried with jittered exponential backoff, honoring Retry-After.
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_RETRY_BASE_SECONDS: float = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+    LLM_RETRY_MAX_SECONDS: float = float(os.getenv("LLM_RETRY_MAX_SECONDS", "60"))
+    
+    # Local Transpiler Configuration (plain queries skip the LLM when possible)
+    LOCAL_TRANSPILER_ENABLED: bool = os.getenv("LOCAL_TRANSPILER_ENABLED", "true").lower() == "true"
+    # SQL Server sp_executesql strings are parameterized before conversion (see dynamicsql.py)
+    DYNAMIC_SQL_UNROLL_ENABLED: bool = os.getenv("DYNAMIC_SQL_UNROLL_ENABLED", "true").lower() == "true"
+    
+    # Segmented Conversion Configuration (procedures split into result-set blocks)
+    SEGMENTED_CONVERSION_ENABLED: bool = os.getenv("SEGMENTED_CONVERSION_ENABLED", "true").lower() == "true"
+    SEGMENT_MIN_BLOCKS: int = int(os.getenv("SEGMENT_MIN_BLOCKS", "2"))
+    # Re-converting an edited procedure reuses the previous conversion's unchanged blocks
+    INCREMENTAL_CONVERSION_ENABLED: bool = os.getenv("INCREMENTAL_CONVERSION_ENABLED", "true").lower() == "true"
+    
+    # Few-Shot Example Configuration (nearest verified conversions included in prompts)
+    FEWSHOT_EXAMPLES_DIR: str = os.getenv(
+        "FEWSHOT_EXAMPLES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+    )
+    FEWSHOT_MAX_EXAMPLES: int = int(os.getenv("FEWSHOT_MAX_EXAMPLES", "2"))
+    # Fits the largest seeded example as a source/target pair (about 1,500 tokens).
+    FEWSHOT_TOKEN_BUDGET: int = int(os.getenv("FEWSHOT_TOKEN_BUDGET", "1600"))
+    FEWSHOT_MIN_SIMILARITY: float = float(os.getenv("FEWSHOT_MIN_SIMILARITY", "0.3"))
+    
+    # Batch Conversion Configuration
+    BATCH_MAX_PARALLELISM: int = int(os.getenv("BATCH_MAX_PARALLELISM", "8"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+    # Batch and job items sharing a template family are converted once and derived (see families.py)
+    FAMILY_CONVERSION_ENABLED: bool = os.getenv("FAMILY_CONVERSION_ENABLED", "true").lower() == "true"
+    
+    # Index Advisor Configuration (POST /advise/indexes)
+    INDEX_ADVISOR_MAX_ROUTINES: int = int(os.getenv("INDEX_ADVISOR_MAX_ROUTINES", "10000"))
+    
+    # Background Job Configuration (POST /jobs; empty JOBS_DB_PATH keeps the queue in memory)
+    JOBS_DB_PATH: str = os.getenv(
+        "JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs.sqlite3")
+    )
+    # Keep this below LLM_MAX_CONCURRENCY so interactive requests always find a free slot.
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_MAX_ITEMS: int = int(os.getenv("JOB_MAX_ITEMS", "10000"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    # Claimed items are leased to their process and renewed while it runs; expired leases are requeued.
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    # Items failing on rate limits or timeouts are retried after this backoff, up to JOB_MAX_ATTEMPTS tries.
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+    JOB_RETRY_MAX_SECONDS: float = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+    
+    # Conversion Cache Configuration
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    CACHE_DB_PATH: str = os.getenv(
+        "CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "conversions.sqlite3")
+    )
+    CACHE_DB_MAX_ENTRIES: int = int(os.getenv("CACHE_DB_MAX_ENTRIES", "100000"))
+    
     # CORS Configuration
     CORS_ORIGINS: list = ["*"]  # In production, specify actual origins
     
     @classmethod
     def validate_config(cls) -> None:
         """Validate that required configuration is present."""
-        if not cls.OPENAI_API_KEY:
+        if cls.LLM_BACKEND not in ("openai", "mock"):
+            raise ValueError(f"Unknown LLM_BACKEND: {cls.LLM_BACKEND}")
+        if not cls.LLM_MODEL_TIERS:
+            raise ValueError("LLM_MODEL_TIERS must name at least one model")
+        if cls.LLM_BACKEND == "openai" and not cls.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY environment variable is required")
     
     @classmethod
@@ -0,0 +1,755 @@
+"""Unroll SQL Server dynamic SQL into plan-stable, fully parameterized statements.
+
+The statements that build the ``sp_executesql`` text are evaluated symbolically:
+every IF that appends to it becomes a choice. Lists spliced into the text
+(``IN (' + @months + ')'``) become JSON or STRING_SPLIT parameters, and spliced
+scalars become real parameters. Each combination of choices is then a static
+statement with a stable cached plan, and all of them are enumerated:
+
+    python dynamicsql.py procedure.sql
+    python dynamicsql.py procedure.sql --json
+
+OPENJSON and STRING_SPLIT need database compatibility level 130 (SQL Server 2016).
+Spliced identifiers (table names, sort columns) cannot be parameters; they are
+left in place and reported.
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+from segmenter import _mask
+from transpiler import _TOKENIZERS, UnsupportedConstruct
+
+# =============================================================================
+# Tokens
+# =============================================================================
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper() if self.kind == "word" else ""
+
+def _tokens(code: str, start: int) -> List[_Token]:
+    """Significant T-SQL tokens from ``start`` on, with their offsets."""
+    pattern = _TOKENIZERS["sqlserver"]
+    tokens = []
+    position = start
+    while position < len(code):
+        match = pattern.match(code, position)
+        if match is None:
+            raise UnsupportedConstruct(f"Unexpected character {code[position]!r}")
+        kind = re.sub(r"\d+$", "", match.lastgroup)
+        if kind not in ("ws", "comment"):
+            tokens.append(_Token(kind, match.group(), match.start(), match.end()))
+        position = match.end()
+    return tokens
+
+def _literal(token: _Token) -> str:
+    """The value of a string literal token."""
+    body = token.text[1:] if token.text[0] in "Nn" else token.text
+    return body[1:-1].replace("''", "'")
+
+def _content_span(token: _Token) -> Tuple[int, int]:
+    """Offsets of a string literal's content, inside its quotes."""
+    opening = token.start + (2 if token.text[0] in "Nn" else 1)
+    return opening, token.end - 1
+
+def _escape(text: str) -> str:
+    return text.replace("'", "''")
+
+# =============================================================================
+# Parsing
+# =============================================================================
+
+# Words that begin a new statement when they appear outside parentheses.
+_STARTERS = {
+    "SET", "IF", "ELSE", "BEGIN", "END", "DECLARE", "EXEC", "EXECUTE", "SELECT", "INSERT", "UPDATE", "DELETE",
+    "MERGE", "WITH", "RETURN", "PRINT", "WHILE", "RAISERROR", "THROW", "COMMIT", "ROLLBACK", "TRUNCATE", "OPEN",
+    "FETCH", "CLOSE", "DEALLOCATE", "BREAK", "CONTINUE", "GOTO", "WAITFOR", "CREATE", "ALTER", "DROP",
+}
+_SET_OPERATORS = {"UNION", "ALL", "EXCEPT", "INTERSECT"}
+
+@dataclass
+class _Assign:
+    variable: str
+    expression: List[_Token]
+    append: bool = False
+    # ``SELECT @v = ... FROM ...``: the value comes from data.
+    query: bool = False
+
+@dataclass
+class _If:
+    condition: str
+    then: List["_Statement"]
+    otherwise: List["_Statement"]
+
+@dataclass
+class _Loop:
+    body: List["_Statement"]
+
+@dataclass
+class _Exec:
+    tokens: List[_Token]
+
+@dataclass
+class _Other:
+    tokens: List[_Token]
+
+_Statement = Union[_Assign, _If, _Loop, _Exec, _Other]
+
+class _Parser:
+    """Just enough T-SQL control flow to follow how a dynamic statement is built."""
+
+    def __init__(self, code: str, tokens: List[_Token]):
+        self.code = code
+        self.tokens = tokens
+        self.i = 0
+        # Declared variable types, for the parameters added to sp_executesql.
+        self.types: Dict[str, str] = {}
+
+    def peek(self, offset: int = 0) -> Optional[_Token]:
+        index = self.i + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def word(self, offset: int = 0) -> str:
+        token = self.peek(offset)
+        return token.upper if token else ""
+
+    def text(self, tokens: List[_Token]) -> str:
+        return self.code[tokens[0].start:tokens[-1].end] if tokens else ""
+
+    def block(self, until_end: bool = False) -> List[_Statement]:
+        statements = []
+        while self.peek() is not None:
+            if self.word() == "END":
+                if until_end:
+                    return statements
+                self.i += 1  # the END of an unparsed construct; nothing to follow
+                continue
+            if self.peek().text == ";" or self.word() == "ELSE":
+                self.i += 1
+                continue
+            statements.append(self.statement())
+        return statements
+
+    def statement(self) -> _Statement:
+        word = self.word()
+        if word == "BEGIN" and self.word(1) not in ("TRAN", "TRANSACTION", "DISTRIBUTED"):
+            self.i += 2 if self.word(1) in ("TRY", "CATCH") else 1
+            body = self.block(until_end=True)
+            self.i += 1
+            if self.word() in ("TRY", "CATCH"):
+                self.i += 1
+            return _If("", body, [])
+        if word == "IF":
+            self.i += 1
+            condition = self.text(self.until_statement())
+            then = [self.statement()]
+            while self.peek() is not None and self.peek().text == ";":
+                self.i += 1
+            otherwise: List[_Statement] = []
+            if self.word() == "ELSE":
+                self.i += 1
+                otherwise = [self.statement()]
+            return _If(condition, then, otherwise)
+        if word == "WHILE":
+            self.i += 1
+            self.until_statement()
+            return _Loop([self.statement()])
+        if word in ("SET", "SELECT") and self.peek(1) is not None and self.peek(1).kind == "param":
+            operator = "".join(token.text for token in self.tokens[self.i + 2:self.i + 4])
+            if self.peek(2).text == "=" or operator == "+=":
+                variable = self.peek(1).text.lower()
+                self.i += 2 if self.peek(2).text == "=" else 3
+                self.i += 1
+                assign = _Assign(variable, self.expression(), append=operator == "+=")
+                if word == "SELECT" and self.word() in ("FROM", "WHERE", ","):
+                    assign.query = True
+                    self.until_statement()
+                return assign
+        if word == "DECLARE" and self.peek(1) is not None and self.peek(1).kind == "param":
+            return self.declare()
+        tokens = self.until_statement(consume_first=True)
+        return _Exec(tokens) if word in ("EXEC", "EXECUTE") else _Other(tokens)
+
+    def declare(self) -> _Statement:
+        self.i += 1
+        assigns: List[_Statement] = []
+        while self.peek() is not None and self.peek().kind == "param":
+            variable = self.peek().text.lower()
+            self.i += 1
+            if self.word() == "AS":
+                self.i += 1
+            type_start = self.i
+            if self.word() in ("CURSOR", "TABLE"):
+                self.i -= 1
+                return _Other(self.until_statement(consume_first=True))
+            self.i += 1
+            if self.peek() is not None and self.peek().text == "(":
+                self.skip_group()
+            self.types[variable] = self.text(self.tokens[type_start:self.i])
+            if self.peek() is not None and self.peek().text == "=":
+                self.i += 1
+                assigns.append(_Assign(variable, self.expression()))
+            if self.peek() is None or self.peek().text != ",":
+                break
+            self.i += 1
+        return _If("", assigns, []) if len(assigns) != 1 else assigns[0]
+
+    def skip_group(self) -> None:
+        depth = 0
+        while self.peek() is not None:
+            text = self.peek().text
+            self.i += 1
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def operand(self) -> None:
+        token = self.peek()
+        if token is None:
+            return
+        if token.text == "(":
+            self.skip_group()
+        elif token.upper == "CASE":
+            depth = 0
+            while self.peek() is not None:
+                word = self.word()
+                self.i += 1
+                depth += word == "CASE"
+                depth -= word == "END"
+                if depth == 0:
+                    return
+        else:
+            self.i += 1
+            if token.kind == "word" and self.peek() is not None and self.peek().text == "(":
+                self.skip_group()
+
+    def expression(self) -> List[_Token]:
+        """An operand followed by any number of arithmetic or concatenation operators and operands."""
+        start = self.i
+        self.operand()
+        while self.peek() is not None and self.peek().text in ("+", "-", "*", "/", "%"):
+            self.i += 1
+            self.operand()
+        return self.tokens[start:self.i]
+
+    def until_statement(self, consume_first: bool = False) -> List[_Token]:
+        """Tokens up to the next statement at this level (a ``;`` ends the current one and is consumed)."""
+        start = self.i
+        if consume_first:
+            self.i += 1
+        depth = case = 0
+        previous = ""
+        while self.peek() is not None:
+            token = self.peek()
+            word = token.upper
+            if depth == 0 and case == 0:
+                if token.text == ";":
+                    tokens = self.tokens[start:self.i]
+                    self.i += 1
+                    return tokens
+                if word in _STARTERS and previous not in _SET_OPERATORS and not (word == "SELECT" and previous == "("):
+                    break
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+            elif word == "CASE":
+                case += 1
+            elif word == "END" and case:
+                case -= 1
+            previous = word
+            self.i += 1
+        return self.tokens[start:self.i]
+
+# =============================================================================
+# Symbolic Evaluation
+# =============================================================================
+
+@dataclass(frozen=True)
+class Text:
+    text: str
+    # The literal the text came from, when it is rewritten in place.
+    token: Optional[_Token] = None
+
+@dataclass(frozen=True)
+class Splice:
+    code: str
+    variable: Optional[str]
+    start: int
+    end: int
+    # String literals right before and after the splice in the same concatenation.
+    before: Optional[_Token] = None
+    after: Optional[_Token] = None
+
+@dataclass(frozen=True)
+class Choice:
+    condition: str
+    then: Tuple["Part", ...]
+    otherwise: Tuple["Part", ...]
+
+Part = Union[Text, Splice, Choice]
+
+@dataclass
+class _ExecSite:
+    statement: List[_Token]
+    sql: Tuple[Part, ...]
+    params: Tuple[Part, ...]
+    # The EXEC arguments after the statement text and the parameter declaration.
+    arguments: List[List[_Token]]
+
+def _split_arguments(tokens: List[_Token]) -> List[List[_Token]]:
+    arguments: List[List[_Token]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token.text == "," and depth == 0:
+            arguments.append([])
+            continue
+        depth += token.text == "("
+        depth -= token.text == ")"
+        arguments[-1].append(token)
+    return [argument for argument in arguments if argument]
+
+def _value(argument: List[_Token]) -> List[_Token]:
+    """An EXEC argument without its ``@name =`` prefix."""
+    if len(argument) > 2 and argument[0].kind == "param" and argument[1].text == "=":
+        return argument[2:]
+    return argument
+
+def _execute_call(tokens: List[_Token]) -> Optional[List[List[_Token]]]:
+    """Arguments of ``EXEC [sys.]sp_executesql ...``, or None for any other EXEC."""
+    for position, token in enumerate(tokens[1:5], start=1):
+        if token.text.lower() == "sp_executesql":
+            return _split_arguments(tokens[position + 1:])
+    return None
+
+class _Evaluator:
+    """Follows every assignment to the variables passed to sp_executesql."""
+
+    def __init__(self, parser: _Parser, tracked: set):
+        self.parser = parser
+        self.tracked = tracked
+        self.sites: List[_ExecSite] = []
+        # The last unconditional assignment of every variable, to trace spliced lists to their source.
+        self.definitions: Dict[str, List[_Token]] = {}
+
+    def run(self, statements: List[_Statement], env: Dict[str, Tuple[Part, ...]], top: bool = True) -> Dict[str, Tuple[Part, ...]]:
+        for statement in statements:
+            if isinstance(statement, _Assign):
+                if top:
+                    self.definitions[statement.variable] = statement.expression
+                if statement.variable in self.tracked:
+                    if statement.query:
+                        raise UnsupportedConstruct(f"{statement.variable} is assigned by a query")
+                    value = self.evaluate(statement.expression, env)
+                    env = {**env, statement.variable: (env.get(statement.variable, ()) + value) if statement.append else value}
+            elif isinstance(statement, _If):
+                if not statement.condition:
+                    env = self.run(statement.then, env, top)
+                    continue
+                then = self.run(statement.then, env, False)
+                otherwise = self.run(statement.otherwise, env, False)
+                env = {variable: _merge(statement.condition, env.get(variable, ()), then.get(variable, ()), otherwise.get(variable, ()))
+                       for variable in set(env) | set(then) | set(otherwise)}
+            elif isinstance(statement, _Loop):
+                if self.run(statement.body, env, False) != env:
+                    raise UnsupportedConstruct("Dynamic SQL is built inside a loop")
+            elif isinstance(statement, _Exec):
+                self.execute(statement.tokens, env)
+        return env
+
+    def execute(self, tokens: List[_Token], env: Dict[str, Tuple[Part, ...]]) -> None:
+        arguments = _execute_call(tokens)
+        if not arguments:
+            return
+        sql = _value(arguments[0])
+        if len(sql) == 1 and sql[0].kind == "param" and sql[0].text.lower() not in env:
+            raise UnsupportedConstruct(f"{sql[0].text} is executed but never assigned")
+        params = _value(arguments[1]) if len(arguments) > 1 else []
+        self.sites.append(_ExecSite(
+            statement=tokens,
+            sql=self.evaluate(sql, env),
+            params=self.evaluate(params, env) if params else (),
+            arguments=arguments[2:],
+        ))
+
+    def evaluate(self, expression: List[_Token], env: Dict[str, Tuple[Part, ...]]) -> Tuple[Part, ...]:
+        operands = _split_concatenation(expression)
+        if operands is None:
+            return (self.splice(expression, None, None),)
+        parts: List[Part] = []
+        for index, operand in enumerate(operands):
+            if len(operand) == 1 and operand[0].kind == "string":
+                parts.append(Text(_literal(operand[0]), operand[0]))
+            elif len(operand) == 1 and operand[0].kind == "param" and operand[0].text.lower() in self.tracked:
+                parts.extend(env.get(operand[0].text.lower(), ()))
+            else:
+                before = operands[index - 1] if index else None
+                after = operands[index + 1] if index + 1 < len(operands) else None
+                parts.append(self.splice(operand, before, after))
+        return tuple(parts)
+
+    def splice(self, operand: List[_Token], before, after) -> Splice:
+        variables = {token.text.lower() for token in operand if token.kind == "param"}
+
+        def literal(tokens):
+            return tokens[0] if tokens and len(tokens) == 1 and tokens[0].kind == "string" else None
+
+        return Splice(
+            code=self.parser.text(operand),
+            variable=variables.pop() if len(variables) == 1 else None,
+            start=operand[0].start,
+            end=operand[-1].end,
+            before=literal(before),
+            after=literal(after),
+        )
+
+def _split_concatenation(expression: List[_Token]) -> Optional[List[List[_Token]]]:
+    """Operands of a ``+`` chain, or None when other operators are involved."""
+    operands: List[List[_Token]] = [[]]
+    depth = 0
+    for token in expression:
+        if depth == 0 and token.text in ("-", "*", "/", "%"):
+            return None
+        if depth == 0 and token.text == "+":
+            operands.append([])
+            continue
+        depth += token.text == "("
+        depth -= token.text == ")"
+        operands[-1].append(token)
+    return operands if all(operands) else None
+
+def _merge(condition: str, before: Tuple[Part, ...], then: Tuple[Part, ...], otherwise: Tuple[Part, ...]) -> Tuple[Part, ...]:
+    """Join the values after both branches of an IF, keeping what they share outside the choice."""
+    if then == otherwise:
+        return then
+    shared = 0
+    while shared < min(len(then), len(otherwise)) and then[shared] == otherwise[shared]:
+        shared += 1
+    return then[:shared] + (Choice(condition, then[shared:], otherwise[shared:]),)
+
+
+# =============================================================================
+# Parameterization
+# =============================================================================
+
+_LIST_BEFORE = re.compile(r"\bIN\s*\(\s*$", re.I)
+_LIST_AFTER = re.compile(r"^\s*\)")
+_IDENTIFIER_BEFORE = re.compile(r"(?:\b(?:FROM|JOIN|BY|INTO|UPDATE|TOP|AS)\s*\(?|[.,\[])\s*$", re.I)
+_FORMAT_FUNCTIONS = {"REPLACE", "LTRIM", "RTRIM", "TRIM", "UPPER", "LOWER"}
+
+def _splices(parts: Tuple[Part, ...]) -> Iterator[Splice]:
+    for part in parts:
+        if isinstance(part, Splice):
+            yield part
+        elif isinstance(part, Choice):
+            yield from _splices(part.then)
+            yield from _splices(part.otherwise)
+
+def _texts(parts: Tuple[Part, ...]) -> Iterator[Text]:
+    for part in parts:
+        if isinstance(part, Text):
+            yield part
+        elif isinstance(part, Choice):
+            yield from _texts(part.then)
+            yield from _texts(part.otherwise)
+
+def _list_source(expression: Optional[List[_Token]], parameters: Dict[str, str]) -> Tuple[Optional[str], Set[str]]:
+    """The procedure parameter a spliced list was cleaned up from, and the literals used to clean it.
+
+    ``REPLACE(REPLACE(REPLACE(@month, '"', ''), '[', ''), ']', '')`` only strips
+    JSON punctuation from ``@month``, so OPENJSON can read ``@month`` itself.
+    """
+    tokens = expression or []
+    literals: Set[str] = set()
+    while len(tokens) > 2 and tokens[0].upper in _FORMAT_FUNCTIONS and tokens[1].text == "(":
+        arguments = _split_arguments(tokens[2:-1])
+        literals.update(_literal(token) for argument in arguments[1:] for token in argument if token.kind == "string")
+        tokens = arguments[0] if arguments else []
+    if len(tokens) == 1 and tokens[0].kind == "param" and tokens[0].text.lower() in parameters:
+        return tokens[0].text, literals
+    return None, literals
+
+class _Parameterizer:
+    """Turns splices into references to sp_executesql parameters, as edits to the source."""
+
+    def __init__(self, evaluator: _Evaluator, parameters: Dict[str, str]):
+        self.definitions = evaluator.definitions
+        self.parameters = parameters
+        self.types = {**evaluator.parser.types, **parameters}
+        self.edits: Dict[Tuple[int, int], Tuple[int, int, str]] = {}
+        self.changes: List[str] = []
+        self.notes: List[str] = []
+
+    def note(self, text: str) -> None:
+        if text not in self.notes:
+            self.notes.append(text)
+
+    def site(self, site: _ExecSite) -> None:
+        """Parameterize one EXEC's statement text and pass the new parameters to it."""
+        needed: Dict[str, str] = {}
+        for splice in _splices(site.sql):
+            parameter = self.splice(splice)
+            if parameter is not None:
+                needed[parameter.lower()] = parameter
+        declared_text = "".join(text.text for text in _texts(site.params))
+        declared = {name.lower() for name in re.findall(r"@\w+", declared_text)}
+        added = [needed[name] for name in needed if name not in declared]
+        if added:
+            self.pass_parameters(site, added)
+
+    def splice(self, splice: Splice) -> Optional[str]:
+        """Rewrite one splice; the parameter it now reads, or None when it is left as is."""
+        if splice.variable is None:
+            self.note(f"{splice.code} is not built from string literals and variables")
+            return None
+        if splice.before is None:
+            self.note(f"{splice.code} does not follow a string literal")
+            return None
+        before = _literal(splice.before)
+        after = _literal(splice.after) if splice.after is not None else None
+        variable = next(
+            (name for name in re.findall(r"@\w+", splice.code) if name.lower() == splice.variable), splice.variable
+        )
+        if _LIST_BEFORE.search(before) and after is not None and _LIST_AFTER.match(after):
+            source, literals = _list_source(self.definitions.get(splice.variable), self.parameters)
+            if source is not None and "[" in literals:
+                query, parameter = f"SELECT value FROM OPENJSON({source})", source
+            else:
+                value = "LTRIM(RTRIM(value))"
+                if "'" in literals:
+                    value = f"REPLACE({value}, '''', '')"
+                query, parameter = f"SELECT {value} FROM STRING_SPLIT({variable}, ',')", variable
+            self.change(splice, f"IN ({query})", 0, 0, query)
+            return parameter
+        if _IDENTIFIER_BEFORE.search(before) or (after or "").startswith("."):
+            self.note(f"{splice.code} supplies an identifier, which cannot be a parameter")
+            return None
+        if before.endswith("'") and (after or "").startswith("'"):
+            self.change(splice, variable, 1, 1, variable)
+            return variable
+        if not before.endswith("'"):
+            self.change(splice, variable, 0, 0, variable)
+            return variable
+        self.note(f"{splice.code} is spliced inside a quoted string")
+        return None
+
+    def change(self, splice: Splice, description: str, trim_before: int, trim_after: int, replacement: str) -> None:
+        """Cut from inside the literal before the splice to inside the one after it; quotes count double."""
+        if (splice.start, splice.end) in self.edits:
+            return
+        start = _content_span(splice.before)[1] - 2 * trim_before
+        if splice.after is not None:
+            end, text = _content_span(splice.after)[0] + 2 * trim_after, _escape(replacement)
+        else:
+            end, text = splice.end, _escape(replacement) + "'"
+        self.edits[(splice.start, splice.end)] = (start, end, text)
+        self.changes.append(f"{splice.code} -> {description}")
+
+    def pass_parameters(self, site: _ExecSite, added: List[str]) -> None:
+        """Declare the new parameters to sp_executesql and pass them, by position or by name like the rest."""
+        declarations = ", ".join(f"{name} {self.types.get(name.lower(), 'NVARCHAR(MAX)')}" for name in added)
+        call = _execute_call(site.statement)
+        named = any(len(argument) > 1 and argument[1].text == "=" for argument in call)
+        values = ", ".join(f"{name} = {name}" if named else name for name in added)
+        texts = [text for text in _texts(site.params) if text.token is not None]
+        if texts:
+            end = _content_span(texts[-1].token)[1]
+            prefix = ", " if _literal(texts[-1].token).strip() else ""
+            self.edits[(end, end)] = (end, end, _escape(prefix + declarations))
+        elif not site.params:
+            end = call[0][-1].end
+            declaration = f"@params = N'{_escape(declarations)}'" if named else f"N'{_escape(declarations)}'"
+            if len(call) == 1:
+                self.edits[(end, end)] = (end, end, f", {declaration}, {values}")
+                return
+            self.edits[(end, end)] = (end, end, f", {declaration}")
+        else:
+            self.note(f"The parameter declarations passed to sp_executesql could not be extended; add {declarations}")
+            return
+        end = call[-1][-1].end
+        self.edits[(end, end + 1)] = (end, end, f", {values}")
+
+    def apply(self, code: str) -> str:
+        for start, end, text in sorted(self.edits.values(), key=lambda edit: (edit[0], edit[1]), reverse=True):
+            code = code[:start] + text + code[end:]
+        return code
+
+# =============================================================================
+# Query Shapes
+# =============================================================================
+
+MAX_SHAPES = 256
+
+@dataclass
+class QueryShape:
+    conditions: List[str]
+    sql: str
+    parameters: List[str]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def _count(parts: Tuple[Part, ...]) -> int:
+    count = 1
+    for part in parts:
+        if isinstance(part, Choice):
+            count *= _count(part.then) + _count(part.otherwise)
+    return count
+
+def _variants(parts: Tuple[Part, ...], start: int = 0) -> Iterator[Tuple[List[str], str]]:
+    """Every (conditions, text) the parts can produce; splices left in show as ``<code>``.
+
+    Variants are produced one at a time, so a caller taking the first few
+    never pays for the 2^n combinations of n independent IFs.
+    """
+    index = start
+    while index < len(parts) and not isinstance(parts[index], Choice):
+        index += 1
+    text = "".join(part.text if isinstance(part, Text) else f"<{part.code}>" for part in parts[start:index])
+    if index == len(parts):
+        yield [], text
+        return
+    choice = parts[index]
+    for condition, branch in ((choice.condition, choice.then), (f"NOT ({choice.condition})", choice.otherwise)):
+        for branch_conditions, branch_text in _variants(branch):
+            for rest_conditions, rest_text in _variants(parts, index + 1):
+                yield [condition] + branch_conditions + rest_conditions, text + branch_text + rest_text
+
+def _tidy(text: str) -> str:
+    """Drop trailing spaces and blank lines, so shapes differing only in layout compare equal."""
+    return "\n".join(line.rstrip() for line in text.splitlines() if line.strip())
+
+def query_shapes(parts: Tuple[Part, ...], limit: int = MAX_SHAPES) -> List[QueryShape]:
+    """The distinct statements ``parts`` can produce, each with the conditions that select it."""
+    shapes: Dict[str, QueryShape] = {}
+    for conditions, text in itertools.islice(_variants(parts), limit):
+        sql = _tidy(text)
+        if sql not in shapes:
+            parameters = sorted(set(re.findall(r"@\w+", _mask(sql))), key=str.lower)
+            shapes[sql] = QueryShape(conditions, sql, parameters)
+    return list(shapes.values())
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+@dataclass
+class UnrolledSql:
+    code: str
+    shapes: List[QueryShape]
+    # Combinations of choices before identical statements are merged, so it can exceed len(shapes).
+    shape_count: int
+    changes: List[str] = field(default_factory=list)
+    notes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+_DYNAMIC_SQL = re.compile(r"\bsp_executesql\b", re.I)
+_HEADER = re.compile(r"\b(?:CREATE|ALTER)\s+(?:OR\s+ALTER\s+)?PROC(?:EDURE)?\b", re.I)
+_PARAMETER = re.compile(r"(@\w+)\s+(?:AS\s+)?([A-Za-z_]\w*(?:\s*\(\s*(?:\d+|MAX)(?:\s*,\s*\d+)?\s*\))?)", re.I)
+
+def has_dynamic_sql(code: str) -> bool:
+    return bool(_DYNAMIC_SQL.search(_mask(code)))
+
+def _exec_statements(statements: List[_Statement]) -> Iterator[List[_Token]]:
+    for statement in statements:
+        if isinstance(statement, _Exec):
+            yield statement.tokens
+        elif isinstance(statement, _If):
+            yield from _exec_statements(statement.then)
+            yield from _exec_statements(statement.otherwise)
+        elif isinstance(statement, _Loop):
+            yield from _exec_statements(statement.body)
+
+def _evaluate(code: str) -> Tuple[_Evaluator, Dict[str, str]]:
+    """Evaluate a procedure body (or a plain batch); also returns the procedure's parameter types."""
+    masked = _mask(code)
+    parameters: Dict[str, str] = {}
+    body_start = 0
+    header = _HEADER.search(masked)
+    if header is not None:
+        depth = 0
+        for match in re.finditer(r"[()]|\bAS\b", masked[header.end():], re.I):
+            if match.group() in "()":
+                depth += 1 if match.group() == "(" else -1
+            elif depth == 0:
+                body_start = header.end() + match.end()
+                break
+        for name, type_name in _PARAMETER.findall(masked[header.end():body_start]):
+            parameters[name.lower()] = re.sub(r"\s+", "", type_name).upper()
+    parser = _Parser(code, _tokens(code, body_start))
+    statements = parser.block()
+    tracked = set()
+    for tokens in _exec_statements(statements):
+        for argument in map(_value, (_execute_call(tokens) or [])[:2]):
+            if len(argument) == 1 and argument[0].kind == "param":
+                tracked.add(argument[0].text.lower())
+    evaluator = _Evaluator(parser, tracked)
+    evaluator.run(statements, {})
+    return evaluator, parameters
+
+def unroll_dynamic_sql(code: str, max_shapes: int = MAX_SHAPES) -> UnrolledSql:
+    """Parameterize the sp_executesql statements in ``code`` and list the statements they can run.
+
+    Raises UnsupportedConstruct when there is no sp_executesql call, or the
+    statement text is built in a way that cannot be followed (in a loop, or
+    by a query).
+    """
+    evaluator, parameters = _evaluate(code)
+    if not evaluator.sites:
+        raise UnsupportedConstruct("No sp_executesql call to unroll")
+    parameterizer = _Parameterizer(evaluator, parameters)
+    for site in evaluator.sites:
+        parameterizer.site(site)
+    rewritten = parameterizer.apply(code)
+    sites = _evaluate(rewritten)[0].sites if parameterizer.edits else evaluator.sites
+    shapes: List[QueryShape] = []
+    for site in sites:
+        shapes.extend(query_shapes(site.sql, max(max_shapes - len(shapes), 0)))
+    count = sum(_count(site.sql) for site in sites)
+    return UnrolledSql(rewritten, shapes, count, parameterizer.changes, parameterizer.notes)
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="SQL Server procedure or batch ('-' for stdin)")
+    parser.add_argument("--json", action="store_true", help="print the rewritten code and the shapes as JSON")
+    parser.add_argument("--max-shapes", type=int, default=MAX_SHAPES, help="stop listing statements after this many")
+    args = parser.parse_args()
+    if args.file == "-":
+        source = sys.stdin.read()
+    else:
+        with open(args.file, encoding="utf-8") as handle:
+            source = handle.read()
+    try:
+        result = unroll_dynamic_sql(source, args.max_shapes)
+    except UnsupportedConstruct as e:
+        print(f"Cannot unroll: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+        sys.exit(0)
+    print(result.code)
+    for change in result.changes:
+        print(f"-- parameterized: {change}", file=sys.stderr)
+    for note in result.notes:
+        print(f"-- left as is: {note}", file=sys.stderr)
+    print(f"-- {len(result.shapes)} distinct statements from {result.shape_count} combinations", file=sys.stderr)
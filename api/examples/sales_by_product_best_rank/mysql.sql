@@ -0,0 +1,76 @@
+DELIMITER $$
+CREATE DEFINER=`mysql_sai_charan`@`%` PROCEDURE `SALES_SUMMARY_SALES_BY_PRODUCT_BEST_RANK_FILTERS`(
+IN year int , 
+IN month nvarchar(255) ,
+IN store nvarchar(4000),
+IN state nvarchar(4000),
+IN channel nvarchar(4000),
+IN product nvarchar(4000),
+IN fromdate date ,
+IN todate date 
+)
+BEGIN
+	DECLARE latestdate date;
+    DECLARE maxdate date;
+    DECLARE latestmonth date;
+	DECLARE length int;
+    DECLARE lastyear date;
+	DECLARE FinancialYearStart date;
+        
+	SET month = REPLACE(REPLACE(REPLACE(REPLACE(month, '"', ''), '[', ''), ']', ''),'''','');
+    IF month = 'all' THEN
+		SET month = REPLACE(month, 'all', null);
+	END IF;
+    
+	SET store = REPLACE(REPLACE(REPLACE(store, '"', ''), '[', ''), ']', '');
+    IF store = 'all' THEN
+		SET store = REPLACE(store, 'all', null);
+	END IF;
+    
+    SET state = REPLACE(REPLACE(REPLACE(state, '"', ''), '[', ''), ']', '');
+    IF state = 'all' THEN
+		SET state = REPLACE(state, 'all', null);
+	END IF;
+    
+    SET channel = REPLACE(REPLACE(REPLACE(channel, '"', ''), '[', ''), ']', '');
+    IF channel = 'all' THEN
+		SET channel = REPLACE(channel, 'all', null);
+	END IF; 
+
+	SET product = REPLACE(REPLACE(REPLACE(product, '"', ''), '[', ''), ']', '');
+    IF product = 'all' THEN
+		SET product = REPLACE(product, 'all', null);
+	END IF; 
+
+    
+    if fromdate is not null or todate is not null then
+			set year = null;
+			set month = null;
+	end if;
+
+	
+
+	with cte as
+	(
+		SELECT dp.ProductID as ProductID,
+		DENSE_RANK() OVER (ORDER BY sum(fs.Salesamount) DESC) AS SalesByYear
+		FROM FactSales fs
+		inner join DimStore ds on fs.StoreID = ds.StoreID
+		inner join DimRegion dr on dr.RegionID = ds.RegionID
+		inner join DimChannel dc on dc.ChannelID = fs.ChannelID
+		inner join DimDate dd on dd.Calendar = fs.OrderDate
+		inner join DimProduct dp on dp.ProductID = fs.ProductID
+		where (dd.FinancialYear = year OR year IS NULL)
+			and (FIND_IN_SET(MONTH(fs.OrderDate), month) OR month IS NULL)
+    		and (FIND_IN_SET(ds.StoreID, store) OR store IS NULL)
+    		and (FIND_IN_SET(dr.Level3Value, state) OR state IS NULL)
+    	and (FIND_IN_SET(fs.ChannelID, channel) OR channel IS NULL)
+    	and (fs.OrderDate BETWEEN fromdate AND todate OR fromdate IS NULL OR todate IS NULL)
+		GROUP BY dp.ProductID,dp.ProductName
+	)
+		SELECT SalesByYear as 'Best Ranking Till Date' from cte
+		where (FIND_IN_SET(ProductID, product) OR product IS NULL);
+
+
+END$$
+DELIMITER ;
@@ -0,0 +1,86 @@
+CREATE OR REPLACE FUNCTION public.sales_summary_sales_by_product_best_rank_filters(
+    year integer,
+    month json,
+    store json,
+    state json,
+    channel json,
+    product json,
+    fromdate date,
+    todate date)
+    RETURNS SETOF refcursor
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE PARALLEL UNSAFE
+    ROWS 1000
+AS $BODY$
+DECLARE
+    cursor1 refcursor := 'main';
+    months integer[];
+    stores text[];
+    states text[];
+    channels text[];
+    products text[];
+BEGIN
+    -- Parse JSON arrays
+    IF month IS NULL OR month::jsonb = '["all"]'::jsonb THEN
+        months := NULL;
+    ELSE
+        months := ARRAY(SELECT json_array_elements_text(month)::int);
+    END IF;
+
+    IF store IS NULL OR store::jsonb = '["all"]'::jsonb THEN
+        stores := NULL;
+    ELSE
+        stores := ARRAY(SELECT json_array_elements_text(store)::text);
+    END IF;
+
+    IF state IS NULL OR state::jsonb = '["all"]'::jsonb THEN
+        states := NULL;
+    ELSE
+        states := ARRAY(SELECT json_array_elements_text(state)::text);
+    END IF;
+
+    IF channel IS NULL OR channel::jsonb = '["all"]'::jsonb THEN
+        channels := NULL;
+    ELSE
+        channels := ARRAY(SELECT json_array_elements_text(channel)::text);
+    END IF;
+
+    IF product IS NULL OR product::jsonb = '["all"]'::jsonb THEN
+        products := NULL;
+    ELSE
+        products := ARRAY(SELECT json_array_elements_text(product)::text);
+    END IF;
+
+    -- Override filters if date range provided
+    IF fromdate IS NOT NULL OR todate IS NOT NULL THEN
+        year := NULL;
+        months := NULL;
+    END IF;
+
+    OPEN cursor1 FOR
+    WITH cte AS (
+        SELECT
+            dp.productid AS productid,
+            DENSE_RANK() OVER (ORDER BY SUM(fs.salesamount) DESC) AS salesbyyear
+        FROM factsales fs
+        INNER JOIN dimstore ds ON fs.storeid = ds.storeid
+        INNER JOIN dimregion dr ON dr.regionid = ds.regionid
+        INNER JOIN dimchannel dc ON dc.channelid = fs.channelid
+        INNER JOIN dimdate dd ON dd.calendar = fs.orderdate
+        INNER JOIN dimproduct dp ON dp.productid = fs.productid
+        WHERE (year IS NULL OR dd.financialyear = year)
+            AND (months IS NULL OR date_part('month', fs.orderdate) = ANY(months))
+            AND (stores IS NULL OR ds.storeid::text = ANY(stores))
+            AND (states IS NULL OR dr.level3value = ANY(states))
+            AND (channels IS NULL OR fs.channelid::text = ANY(channels))
+            AND (fromdate IS NULL OR todate IS NULL OR fs.orderdate BETWEEN fromdate AND todate)
+        GROUP BY dp.productid, dp.productname
+    )
+    SELECT salesbyyear AS "Best Ranking Till Date"
+    FROM cte
+    WHERE (products IS NULL OR productid::text = ANY(products));
+
+    RETURN NEXT cursor1;
+END;
+$BODY$;
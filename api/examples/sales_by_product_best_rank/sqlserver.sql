@@ -0,0 +1,87 @@
+CREATE PROCEDURE [dbo].[SALES_SUMMARY_SALES_BY_PRODUCT_BEST_RANK_FILTERS](
+    @year INT = NULL,
+    @month NVARCHAR(MAX) = NULL,
+    @store NVARCHAR(MAX) = NULL,
+    @state NVARCHAR(MAX) = NULL,
+    @channel NVARCHAR(MAX) = NULL,
+    @product NVARCHAR(MAX) = NULL,
+    @fromdate DATE = NULL,
+    @todate DATE = NULL
+)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @months NVARCHAR(MAX);
+    DECLARE @stores NVARCHAR(MAX);
+    DECLARE @states NVARCHAR(MAX);
+    DECLARE @channels NVARCHAR(MAX);
+    DECLARE @products NVARCHAR(MAX);
+
+    -- Parse JSON-like strings
+    SET @months = REPLACE(REPLACE(REPLACE(@month, '"', ''), '[', ''), ']', '');
+    IF @months = 'all' SET @months = '0';
+
+    SET @stores = REPLACE(REPLACE(REPLACE(@store, '"', ''), '[', ''), ']', '');
+    IF @stores = 'all' SET @stores = '0';
+
+    SET @states = REPLACE(REPLACE(REPLACE(@state, '"', ''''), '[', ''), ']', '');
+    IF @states = '''all''' SET @states = '0';
+
+    SET @channels = REPLACE(REPLACE(REPLACE(@channel, '"', ''), '[', ''), ']', '');
+    IF @channels = 'all' SET @channels = '0';
+
+    SET @products = REPLACE(REPLACE(REPLACE(@product, '"', ''), '[', ''), ']', '');
+    IF @products = 'all' SET @products = '0';
+
+    -- Override filters if date range provided
+    IF @fromdate IS NOT NULL OR @todate IS NOT NULL
+    BEGIN
+        SET @year = NULL;
+        SET @months = '0';
+    END;
+
+    -- Dynamic SQL construction
+    DECLARE @Sql NVARCHAR(MAX) = N'
+    WITH cte AS (
+        SELECT
+            dp.ProductID AS ProductID,
+            DENSE_RANK() OVER (ORDER BY SUM(fs.SalesAmount) DESC) AS SalesByYear
+        FROM FactSales fs WITH(NOLOCK)
+        INNER JOIN DimStore ds WITH(NOLOCK) ON fs.StoreID = ds.StoreID
+        INNER JOIN DimRegion dr WITH(NOLOCK) ON dr.RegionID = ds.RegionID
+        INNER JOIN DimChannel dc WITH(NOLOCK) ON dc.ChannelID = fs.ChannelID
+        INNER JOIN DimDate dd WITH(NOLOCK) ON dd.Calendar = fs.OrderDate
+        INNER JOIN DimProduct dp WITH(NOLOCK) ON dp.ProductID = fs.ProductID
+        WHERE 1=1';
+
+    IF @year IS NOT NULL
+        SET @Sql = @Sql + N' AND dd.FinancialYear = @year';
+
+    IF @months IS NOT NULL AND @months != '0'
+        SET @Sql = @Sql + N' AND MONTH(fs.OrderDate) IN (' + @months + ')';
+
+    IF @stores IS NOT NULL AND @stores != '0'
+        SET @Sql = @Sql + N' AND ds.StoreID IN (' + @stores + ')';
+
+    IF @states IS NOT NULL AND @states != '0'
+        SET @Sql = @Sql + N' AND dr.Level3Value IN (' + @states + ')';
+
+    IF @channels IS NOT NULL AND @channels != '0'
+        SET @Sql = @Sql + N' AND fs.ChannelID IN (' + @channels + ')';
+
+    IF @fromdate IS NOT NULL AND @todate IS NOT NULL
+        SET @Sql = @Sql + N' AND fs.OrderDate BETWEEN @fromdate AND @todate';
+
+    SET @Sql = @Sql + N'
+        GROUP BY dp.ProductID, dp.ProductName
+    )
+    SELECT SalesByYear AS [Best Ranking Till Date] FROM cte';
+
+    IF @products IS NOT NULL AND @products != '0'
+        SET @Sql = @Sql + N' WHERE ProductID IN (' + @products + ')';
+
+    -- Execute dynamic SQL
+    DECLARE @params NVARCHAR(MAX) = N'@year INT, @fromdate DATE, @todate DATE';
+    EXEC sp_executesql @Sql, @params, @year, @fromdate, @todate;
+END
@@ -0,0 +1,68 @@
+DELIMITER $$
+DROP PROCEDURE IF EXISTS `SALES_SUMMARY_BRANDS_BY_SALES_FILTERS`$$
+CREATE PROCEDURE `SALES_SUMMARY_BRANDS_BY_SALES_FILTERS`(
+    IN p_year INT,
+    IN p_month JSON,
+    IN p_store JSON,
+    IN p_state JSON,
+    IN p_channel JSON,
+    IN p_fromdate DATE,
+    IN p_todate DATE
+)
+BEGIN
+    DECLARE v_year INT DEFAULT p_year;
+    DECLARE v_months VARCHAR(4000) DEFAULT NULL;
+    DECLARE v_stores VARCHAR(4000) DEFAULT NULL;
+    DECLARE v_states VARCHAR(4000) DEFAULT NULL;
+    DECLARE v_channels VARCHAR(4000) DEFAULT NULL;
+
+    -- Parse JSON arrays into comma-separated lists; "all" disables the filter
+    IF p_month IS NOT NULL AND JSON_SEARCH(p_month, 'one', 'all') IS NULL THEN
+        SET v_months = REPLACE(REPLACE(REPLACE(p_month, '"', ''), '[', ''), ']', '');
+    END IF;
+
+    IF p_store IS NOT NULL AND JSON_SEARCH(p_store, 'one', 'all') IS NULL THEN
+        SET v_stores = REPLACE(REPLACE(REPLACE(REPLACE(p_store, '"', ''), '[', ''), ']', ''), ' ', '');
+    END IF;
+
+    IF p_state IS NOT NULL AND JSON_SEARCH(p_state, 'one', 'all') IS NULL THEN
+        SET v_states = REPLACE(REPLACE(REPLACE(REPLACE(p_state, '"', ''), '[', ''), ']', ''), ', ', ',');
+    END IF;
+
+    IF p_channel IS NOT NULL AND JSON_SEARCH(p_channel, 'one', 'all') IS NULL THEN
+        SET v_channels = REPLACE(REPLACE(REPLACE(REPLACE(p_channel, '"', ''), '[', ''), ']', ''), ' ', '');
+    END IF;
+
+    -- Override filters if date range provided
+    IF p_fromdate IS NOT NULL OR p_todate IS NOT NULL THEN
+        SET v_year = NULL;
+        SET v_months = NULL;
+    END IF;
+
+    SELECT
+        db.BrandName AS y,
+        SUM(fs.SalesAmount) AS x,
+        CASE
+            WHEN SUM(fs.SalesAmount) < 99999 THEN CONCAT('$', FORMAT(SUM(fs.SalesAmount) / 1000, 2), 'K')
+            ELSE CONCAT('$', FORMAT(SUM(fs.SalesAmount) / 1000000, 2), 'M')
+        END AS text,
+        db.BrandId AS id,
+        'bar' AS type,
+        'h' AS orientation
+    FROM FactSales fs
+    INNER JOIN DimProduct dp ON fs.ProductID = dp.ProductID
+    INNER JOIN DimBrand db ON db.BrandId = dp.BrandId
+    INNER JOIN DimDate dd ON dd.Calendar = fs.OrderDate
+    INNER JOIN DimStore ds ON fs.StoreID = ds.StoreID
+    INNER JOIN DimRegion dr ON dr.RegionID = ds.RegionID
+    INNER JOIN DimChannel dc ON dc.ChannelID = fs.ChannelID
+    WHERE (v_year IS NULL OR dd.FinancialYear = v_year)
+        AND (v_months IS NULL OR FIND_IN_SET(MONTH(fs.OrderDate), v_months))
+        AND (v_states IS NULL OR FIND_IN_SET(dr.Level3Value, v_states))
+        AND (v_stores IS NULL OR FIND_IN_SET(fs.StoreID, v_stores))
+        AND (v_channels IS NULL OR FIND_IN_SET(fs.ChannelID, v_channels))
+        AND (p_fromdate IS NULL OR fs.OrderDate BETWEEN p_fromdate AND p_todate)
+    GROUP BY db.BrandName, db.BrandId
+    ORDER BY x ASC;
+END$$
+DELIMITER ;
@@ -0,0 +1,80 @@
+CREATE OR REPLACE FUNCTION public.sales_summary_brands_by_sales_filters(
+    year integer,
+    month json,
+    store json,
+    state json,
+    channel json,
+    fromdate date,
+    todate date)
+    RETURNS SETOF refcursor 
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE PARALLEL UNSAFE
+    ROWS 1000
+AS $BODY$
+DECLARE 
+    query1 refcursor := 'main';
+    months integer[];
+    stores text[];
+    states text[];
+    channels text[];
+BEGIN
+    -- Parse JSON arrays
+    IF month IS NULL OR month::jsonb = '["all"]'::jsonb THEN 
+        months := NULL;
+    ELSE
+        months := ARRAY(SELECT json_array_elements_text(month)::text);
+    END IF;
+    
+    IF store IS NULL OR store::jsonb = '["all"]'::jsonb THEN 
+        stores := NULL;
+    ELSE
+        stores := ARRAY(SELECT json_array_elements_text(store)::text);
+    END IF;
+    
+    IF state IS NULL OR state::jsonb = '["all"]'::jsonb THEN 
+        states := NULL;
+    ELSE
+        states := ARRAY(SELECT json_array_elements_text(state)::text);
+    END IF;
+    
+    IF channel IS NULL OR channel::jsonb = '["all"]'::jsonb THEN 
+        channels := NULL;
+    ELSE
+        channels := ARRAY(SELECT json_array_elements_text(channel)::text);
+    END IF;
+    
+    -- Override filters if date range provided
+    IF fromdate IS NOT NULL OR todate IS NOT NULL THEN
+        year := NULL;
+        months := NULL;
+    END IF;
+    
+    -- Main query
+    OPEN query1 FOR 
+    SELECT 
+        db.brandname AS y,
+        SUM(fs.salesamount) AS x,
+        currency_convert(SUM(fs.salesamount)) AS text,
+        db.brandid AS id,
+        'bar' AS type, 
+        'h' AS orientation
+    FROM factsales fs
+    INNER JOIN DimProduct dp ON fs.productid = dp.productid 
+    INNER JOIN DimBrand db ON db.brandid = dp.brandid
+    INNER JOIN dimdate dd ON fs.OrderDate = dd.calendar
+    INNER JOIN dimstore ds ON fs.storeid = ds.storeid
+    INNER JOIN dimregion dr ON dr.regionid = ds.regionid 
+    INNER JOIN dimchannel dc ON dc.channelid = fs.channelid
+    WHERE (year IS NULL OR dd.financialyear = year)
+        AND (months IS NULL OR date_part('MONTH', fs.OrderDate) = ANY(months))
+        AND (states IS NULL OR dr.level3value = ANY(states))
+        AND (stores IS NULL OR fs.storeid::text = ANY(stores))
+        AND (channels IS NULL OR fs.channelid::text = ANY(channels))
+        AND (fromdate IS NULL OR fs.OrderDate BETWEEN fromdate AND todate)
+    GROUP BY db.brandname, db.brandid 
+    ORDER BY x ASC;
+
+    RETURN NEXT query1;
+END;
+$BODY$;
@@ -0,0 +1,88 @@
+CREATE PROCEDURE [dbo].[SALES_SUMMARY_BRANDS_BY_SALES_FILTERS](
+    @year INT = NULL, 
+    @month NVARCHAR(MAX) = NULL,
+    @fromdate DATE = NULL,
+    @todate DATE = NULL,
+    @store NVARCHAR(MAX) = NULL,
+    @state NVARCHAR(MAX) = NULL,
+    @channel NVARCHAR(MAX) = NULL,
+    @date DATE = NULL
+)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @months NVARCHAR(MAX);
+    DECLARE @stores NVARCHAR(MAX);
+    DECLARE @states NVARCHAR(MAX);
+    DECLARE @channels NVARCHAR(MAX);
+    
+    -- Parse JSON-like strings
+    SET @months = REPLACE(REPLACE(REPLACE(@month, '"', ''), '[', ''), ']', '');
+    IF @months = 'all' SET @months = '0';
+    
+    SET @stores = REPLACE(REPLACE(REPLACE(@store, '"', ''''), '[', ''), ']', '');
+    IF @stores = '''all''' SET @stores = '0';
+    
+    SET @states = REPLACE(REPLACE(REPLACE(@state, '"', ''''), '[', ''), ']', '');
+    IF @states = '''all''' SET @states = '0';
+    
+    SET @channels = REPLACE(REPLACE(REPLACE(@channel, '"', ''), '[', ''), ']', '');
+    IF @channels = 'all' SET @channels = '0';
+    
+    -- Override filters if date range provided
+    IF @fromdate IS NOT NULL OR @todate IS NOT NULL OR @date IS NOT NULL
+    BEGIN
+        SET @year = '0';
+        SET @months = '0';
+    END;
+    
+    -- Dynamic SQL construction
+    DECLARE @Sql NVARCHAR(MAX) = N'
+    SELECT 
+        db.BrandName AS y,
+        SUM(fs.SalesAmount) AS x,
+        CASE 
+            WHEN SUM(fs.SalesAmount) < 99999 THEN ''$'' + FORMAT(SUM(fs.SalesAmount) / 1000, ''N2'') + ''K''
+            ELSE FORMAT(SUM(fs.SalesAmount), ''$0,,.00M'')
+        END AS text,
+        db.BrandId AS id,
+        ''bar'' AS type, 
+        ''h'' AS orientation
+    FROM FactSales fs WITH(NOLOCK)
+    INNER JOIN DimProduct dp WITH(NOLOCK) ON fs.ProductID = dp.ProductID
+    INNER JOIN DimBrand db WITH(NOLOCK) ON db.BrandId = dp.BrandId
+    INNER JOIN DimDate dd WITH(NOLOCK) ON dd.Calendar = fs.OrderDate
+    INNER JOIN DimStore ds WITH(NOLOCK) ON fs.StoreID = ds.StoreID
+    INNER JOIN DimRegion dr WITH(NOLOCK) ON dr.RegionID = ds.RegionID
+    INNER JOIN DimChannel dc WITH(NOLOCK) ON dc.ChannelID = fs.ChannelID
+    WHERE 1=1';
+    
+    -- Add conditional filters
+    IF @year IS NOT NULL AND @year != '0'
+        SET @Sql = @Sql + N' AND dd.FinancialYear = @year';
+    
+    IF @months IS NOT NULL AND @months != '0'
+        SET @Sql = @Sql + N' AND MONTH(fs.OrderDate) IN (' + @months + ')';
+    
+    IF @fromdate IS NOT NULL AND @todate IS NOT NULL
+        SET @Sql = @Sql + N' AND fs.OrderDate BETWEEN @fromdate AND @todate';
+    
+    IF @date IS NOT NULL
+        SET @Sql = @Sql + N' AND fs.OrderDate = @date';
+    
+    IF @states IS NOT NULL AND @states != '''0'''
+        SET @Sql = @Sql + N' AND dr.Level3Value IN (' + @states + ')';
+    
+    IF @stores IS NOT NULL AND @stores != '''0'''
+        SET @Sql = @Sql + N' AND ds.StoreID IN (' + @stores + ')';
+    
+    IF @channels IS NOT NULL AND @channels != '0'
+        SET @Sql = @Sql + N' AND fs.ChannelID IN (' + @channels + ')';
+    
+    SET @Sql = @Sql + N' GROUP BY db.BrandName, db.BrandId ORDER BY x ASC';
+    
+    -- Execute dynamic SQL
+    DECLARE @params NVARCHAR(MAX) = N'@year INT, @fromdate DATE, @todate DATE, @date DATE';
+    EXEC sp_executesql @Sql, @params, @year, @fromdate, @todate, @date;
+END
@@ -0,0 +1,39 @@
+DELIMITER $$
+DROP PROCEDURE IF EXISTS `UpsertStoreInventory`$$
+CREATE PROCEDURE `UpsertStoreInventory`(
+    IN p_store_id INT,
+    IN p_product_id INT,
+    IN p_quantity INT,
+    IN p_updated_by VARCHAR(100)
+)
+BEGIN
+    DECLARE v_now DATETIME DEFAULT NOW();
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        RESIGNAL;
+    END;
+
+    IF p_quantity < 0 THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Quantity cannot be negative';
+    END IF;
+
+    START TRANSACTION;
+
+    INSERT INTO StoreInventory (StoreID, ProductID, Quantity, UpdatedBy, UpdatedAt)
+    VALUES (p_store_id, p_product_id, p_quantity, IFNULL(p_updated_by, CURRENT_USER()), v_now)
+    ON DUPLICATE KEY UPDATE
+        Quantity = VALUES(Quantity),
+        UpdatedBy = VALUES(UpdatedBy),
+        UpdatedAt = VALUES(UpdatedAt);
+
+    INSERT INTO InventoryAudit (StoreID, ProductID, Quantity, ChangedAt)
+    VALUES (p_store_id, p_product_id, p_quantity, v_now);
+
+    COMMIT;
+
+    SELECT StoreID, ProductID, Quantity, UpdatedAt
+    FROM StoreInventory
+    WHERE StoreID = p_store_id AND ProductID = p_product_id;
+END$$
+DELIMITER ;
@@ -0,0 +1,39 @@
+CREATE OR REPLACE FUNCTION public.upsert_store_inventory(
+    p_storeid integer,
+    p_productid integer,
+    p_quantity integer,
+    p_updatedby text DEFAULT NULL)
+    RETURNS SETOF refcursor
+    LANGUAGE 'plpgsql'
+    COST 100
+    VOLATILE PARALLEL UNSAFE
+    ROWS 1000
+AS $BODY$
+DECLARE
+    cursor1 refcursor := 'main';
+    v_now timestamp := now();
+BEGIN
+    IF p_quantity < 0 THEN
+        RAISE EXCEPTION 'Quantity cannot be negative';
+    END IF;
+
+    -- The function body runs in one transaction; an exception rolls it back.
+    INSERT INTO storeinventory (storeid, productid, quantity, updatedby, updatedat)
+    VALUES (p_storeid, p_productid, p_quantity, COALESCE(p_updatedby, current_user), v_now)
+    ON CONFLICT (storeid, productid) DO UPDATE
+    SET quantity = EXCLUDED.quantity,
+        updatedby = EXCLUDED.updatedby,
+        updatedat = EXCLUDED.updatedat;
+
+    INSERT INTO inventoryaudit (storeid, productid, quantity, changedat)
+    VALUES (p_storeid, p_productid, p_quantity, v_now);
+
+    OPEN cursor1 FOR
+    SELECT si.storeid, si.productid, si.quantity, si.updatedat
+    FROM storeinventory si
+    WHERE si.storeid = p_storeid
+        AND si.productid = p_productid;
+
+    RETURN NEXT cursor1;
+END;
+$BODY$;
@@ -0,0 +1,50 @@
+CREATE PROCEDURE [dbo].[UPSERT_STORE_INVENTORY](
+    @StoreID INT,
+    @ProductID INT,
+    @Quantity INT,
+    @UpdatedBy NVARCHAR(100) = NULL
+)
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @Now DATETIME = GETDATE();
+
+    IF @Quantity < 0
+    BEGIN
+        RAISERROR('Quantity cannot be negative', 16, 1);
+        RETURN;
+    END;
+
+    BEGIN TRY
+        BEGIN TRANSACTION;
+
+        IF EXISTS (SELECT 1 FROM StoreInventory WITH(UPDLOCK, HOLDLOCK) WHERE StoreID = @StoreID AND ProductID = @ProductID)
+        BEGIN
+            UPDATE StoreInventory
+            SET Quantity = @Quantity,
+                UpdatedBy = ISNULL(@UpdatedBy, SYSTEM_USER),
+                UpdatedAt = @Now
+            WHERE StoreID = @StoreID AND ProductID = @ProductID;
+        END
+        ELSE
+        BEGIN
+            INSERT INTO StoreInventory (StoreID, ProductID, Quantity, UpdatedBy, UpdatedAt)
+            VALUES (@StoreID, @ProductID, @Quantity, ISNULL(@UpdatedBy, SYSTEM_USER), @Now);
+        END;
+
+        INSERT INTO InventoryAudit (StoreID, ProductID, Quantity, ChangedAt)
+        VALUES (@StoreID, @ProductID, @Quantity, @Now);
+
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+        THROW;
+    END CATCH;
+
+    SELECT StoreID, ProductID, Quantity, UpdatedAt
+    FROM StoreInventory
+    WHERE StoreID = @StoreID AND ProductID = @ProductID;
+END
@@ -0,0 +1,347 @@
+"""Group routines into template families and convert each family once.
+
+Large catalogs hold many routines that differ only in their names, the
+dimension tables and columns they read, or a literal. Identifiers and
+literals are abstracted away to fingerprint a routine's structure; routines
+with the same fingerprint form a family. One representative per family goes
+to the model, and every other member's conversion is derived from its output
+by substituting the member's identifiers and literals for the
+representative's. A derivation is only used when the substitution accounts
+for every difference and local validation finds nothing new; otherwise the
+member is converted on its own. The migrate CLI, /convert/batch and /jobs
+all convert through FamilyConverter.
+
+    python families.py schema.sql --source sqlserver
+    python families.py schema.sql --source mysql --json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from transpiler import _TOKENIZERS
+from validation import validate_output
+
+# =============================================================================
+# Fingerprinting
+# =============================================================================
+
+# Words that are structure rather than names. Built-in functions are also
+# kept, since they decide how a routine converts; any other word followed by
+# "(" is taken to be a function call or type too, unless it is being defined.
+_KEYWORDS = {
+    "ADD", "ALL", "ALTER", "AND", "ANY", "AS", "ASC", "BEGIN", "BETWEEN", "BREAK", "BY", "CALL", "CASCADE",
+    "CASE", "CAST", "CATCH", "CLOSE", "COLLATE", "COMMIT", "CONSTRAINT", "CONTINUE", "CONVERT", "CREATE",
+    "CROSS", "CURSOR", "DEALLOCATE", "DECLARE", "DEFAULT", "DELETE", "DELIMITER", "DESC", "DETERMINISTIC",
+    "DISTINCT", "DO", "DROP", "EACH", "ELSE", "ELSEIF", "ELSIF", "END", "EXCEPT", "EXEC", "EXECUTE", "EXISTS",
+    "EXIT", "FALSE", "FETCH", "FIRST", "FOR", "FOREIGN", "FROM", "FULL", "FUNCTION", "GO", "GOTO", "GROUP",
+    "HANDLER", "HAVING", "IF", "IN", "INNER", "INOUT", "INSERT", "INTERSECT", "INTO", "IS", "ITERATE", "JOIN",
+    "KEY", "LANGUAGE", "LAST", "LEAVE", "LEFT", "LIKE", "ILIKE", "LIMIT", "LOOP", "MERGE", "NEXT", "NOCOUNT",
+    "NOLOCK", "NOT", "NULL", "NULLS", "OF", "OFF", "OFFSET", "ON", "ONLY", "OPEN", "OR", "ORDER", "OUT",
+    "OUTER", "OUTPUT", "OVER", "PARTITION", "PERFORM", "PRIMARY", "PRINT", "PROC", "PROCEDURE", "RAISE",
+    "RAISERROR", "READS", "RECOMPILE", "REFERENCES", "REPEAT", "REPLACE", "RETURN", "RETURNS", "RIGHT",
+    "ROLLBACK", "ROWS", "SELECT", "SET", "SETOF", "SIGNAL", "SQL", "SQLSTATE", "TABLE", "TEMPORARY", "THEN",
+    "THROW", "TOP", "TRAN", "TRANSACTION", "TRIGGER", "TRUE", "TRUNCATE", "TRY", "UNION", "UNIQUE", "UNTIL",
+    "UPDATE", "USING", "VALUES", "VARYING", "VIEW", "VOLATILE", "STABLE", "IMMUTABLE", "WHEN", "WHERE",
+    "WHILE", "WITH", "XACT_ABORT",
+    # Types
+    "BIGINT", "BINARY", "BIT", "BOOLEAN", "BOOL", "CHAR", "CHARACTER", "DATE", "DATETIME", "DATETIME2",
+    "DATETIMEOFFSET", "DECIMAL", "DOUBLE", "FLOAT", "INT", "INTEGER", "JSON", "JSONB", "MAX", "MONEY",
+    "NCHAR", "NUMERIC", "NVARCHAR", "PRECISION", "REAL", "RECORD", "REFCURSOR", "SMALLINT", "SYSNAME",
+    "TEXT", "TIME", "TIMESTAMP", "TINYINT", "UNIQUEIDENTIFIER", "UNSIGNED", "UUID", "VARBINARY", "VARCHAR",
+    "VOID", "XML", "ZONE",
+    # Date parts and functions written without parentheses
+    "CURRENT_DATE", "CURRENT_TIMESTAMP", "CURRENT_USER", "DAY", "MONTH", "QUARTER", "WEEK", "YEAR",
+    "HOUR", "MINUTE", "SECOND", "INTERVAL",
+}
+
+# Words after which a name followed by "(" is being defined or referenced, not called.
+_NAME_INTRODUCERS = {"PROCEDURE", "PROC", "FUNCTION", "TABLE", "INTO", "FROM", "JOIN", "UPDATE", "EXEC",
+                     "EXECUTE", "CALL", "REFERENCES", "VIEW", "TRIGGER", "KEY", "ON"}
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+@lru_cache(maxsize=None)
+def _kind(group: str) -> str:
+    return group.rstrip("0123456789")
+
+def _tokens(code: str, dialect: str) -> Iterator[_Token]:
+    """Tokens with their offsets; characters no tokenizer rule covers (``$$``) come out as "other"."""
+    pattern = _TOKENIZERS[dialect]
+    position = 0
+    while position < len(code):
+        match = pattern.match(code, position)
+        if match is None:
+            yield _Token("other", code[position], position, position + 1)
+            position += 1
+            continue
+        kind = _kind(match.lastgroup)
+        if kind != "ws":
+            yield _Token(kind, match.group(), match.start(), match.end())
+        position = match.end()
+
+def _unquote(token: _Token) -> str:
+    """The name a word, identifier or variable token refers to, lowercased."""
+    if token.kind == "ident":
+        return token.text[1:-1].lower()
+    return token.text.lower()
+
+def _string_value(text: str) -> str:
+    body = text[1:] if text[0] in "Nn" else text
+    return body[1:-1].replace(body[0] * 2, body[0])
+
+@dataclass
+class Template:
+    """The structure of a routine, and the names and literals that fill it in."""
+    key: str
+    # Distinct names and literal values, in order of first appearance; names
+    # compare case-insensitively and keep the spelling they first appear with.
+    names: List[str]
+    literals: List[str]
+    # How often each literal value and each name (lowercased) appears, to
+    # tell substituted occurrences from ones the model added or dropped.
+    literal_counts: Dict[str, int]
+    name_counts: Dict[str, int]
+
+# String literals holding SQL (dynamic SQL) are fingerprinted as code.
+_SQL_TEXT = re.compile(r"\b(?:SELECT|FROM|WHERE|AND|JOIN|GROUP\s+BY|ORDER\s+BY|UPDATE|INSERT|DELETE)\b", re.I)
+
+def fingerprint(sql: str, dialect: str) -> Template:
+    """Abstract every name and literal in ``sql``; routines with equal keys form a family.
+
+    Names are numbered by first appearance, so two routines only share a
+    key when each name is used in the same places in both.
+    """
+    names: Dict[str, int] = {}
+    literals: Dict[str, int] = {}
+    literal_counts: Counter = Counter()
+    name_counts: Counter = Counter()
+    spellings: List[str] = []
+    shape: List[str] = []
+
+    def name(token: _Token) -> int:
+        number = names.setdefault(_unquote(token), len(names))
+        if number == len(spellings):
+            spellings.append(token.text[1:-1] if token.kind == "ident" else token.text)
+        name_counts[spellings[number].lower()] += 1
+        return number
+
+    def visit(code: str) -> None:
+        tokens = list(_tokens(code, dialect))
+        for index, token in enumerate(tokens):
+            if token.kind == "comment":
+                continue
+            prefix = "N" if token.text[0] in "Nn" and token.kind == "string" else ""
+            if token.kind == "string" and _SQL_TEXT.search(token.text):
+                shape.append(f"{prefix}S(")
+                visit(_string_value(token.text))
+                shape.append(")")
+            elif token.kind in ("string", "number"):
+                value = _string_value(token.text) if token.kind == "string" else token.text
+                literal_counts[value] += 1
+                shape.append(f"{prefix}L{literals.setdefault(value, len(literals))}")
+            elif token.kind == "ident" or (token.kind == "param" and token.text[0] == "@"):
+                shape.append(f"{'V' if token.kind == 'param' else 'N'}{name(token)}")
+            elif token.kind == "word" and _is_name(tokens, index):
+                shape.append(f"N{name(token)}")
+            else:
+                shape.append(token.text.upper())
+
+    visit(sql)
+    key = hashlib.sha256(" ".join([dialect, *shape]).encode("utf-8")).hexdigest()[:16]
+    return Template(key, spellings, list(literals), dict(literal_counts), dict(name_counts))
+
+def _is_name(tokens: List[_Token], index: int) -> bool:
+    word = tokens[index].text.upper()
+    if word in _KEYWORDS:
+        return False
+    following = tokens[index + 1] if index + 1 < len(tokens) else None
+    if following is None or following.text != "(":
+        return True
+    previous = tokens[index - 1] if index else None
+    return previous is not None and (previous.text == "." or previous.text.upper() in _NAME_INTRODUCERS)
+
+# =============================================================================
+# Derivation
+# =============================================================================
+
+def _recase(value: str, like: str) -> str:
+    """``value`` in the case the model wrote the name it replaces: lowered, uppercased or as given."""
+    if like.islower():
+        return value.lower()
+    if like.isupper() and not value.isupper():
+        return value.upper()
+    return value
+
+def derive(
+    representative: Template, converted: str, member: Template, target: str, is_procedure: bool,
+) -> Tuple[str, List[str]]:
+    """A member's conversion from its representative's, and the problems that rule it out.
+
+    Names are replaced wherever they appear as words, including inside
+    strings (dynamic SQL) and comments; literals only where the whole literal
+    matches. Outside comments, each must be replaced exactly as often as it
+    appears in the source. The result is only usable when the problems list
+    is empty.
+    """
+    renames = {
+        old.lower(): new
+        for old, new in zip(representative.names, member.names) if old.lower() != new.lower()
+    }
+    relits = {old: new for old, new in zip(representative.literals, member.literals) if old != new}
+    problems: List[str] = []
+    renamed: Counter = Counter()
+    word = re.compile(
+        r"(?<![\w@#$])(@?)(" + "|".join(re.escape(name.lstrip("@")) for name in sorted(renames, key=len, reverse=True)) + r")(?![\w$])",
+        re.I,
+    ) if renames else None
+
+    names = {name.lower() for name in representative.names}
+
+    def rename_words(text: str, count: bool = True) -> str:
+        def replace(match: re.Match) -> str:
+            old = (match.group(1) + match.group(2)).lower()
+            if old not in renames and not match.group(1) and old not in names:
+                # Dialects without @variables drop the @ from parameter names.
+                old = "@" + old
+            if old not in renames:
+                return match.group()
+            renamed[old] += count
+            return match.group(1) + _recase(renames[old].lstrip("@"), match.group(2))
+        return word.sub(replace, text) if word else text
+
+    pieces: List[str] = []
+    position = 0
+    literal_hits: Counter = Counter()
+    for token in _tokens(converted, target):
+        if token.kind == "comment":
+            # Comments are not part of the fingerprint, so names in them are not counted.
+            pieces.append(rename_words(converted[position:token.start]))
+            pieces.append(rename_words(token.text, count=False))
+            position = token.end
+            continue
+        if token.kind not in ("string", "number"):
+            continue
+        value = _string_value(token.text) if token.kind == "string" else token.text
+        if value in relits:
+            literal_hits[value] += 1
+            pieces.append(rename_words(converted[position:token.start]))
+            if token.kind == "string":
+                opening = token.text.index(token.text.lstrip("Nn")[0]) + 1
+                quote = token.text[opening - 1]
+                pieces.append(token.text[:opening] + relits[value].replace(quote, quote * 2) + quote)
+            else:
+                pieces.append(relits[value])
+            position = token.end
+    pieces.append(rename_words(converted[position:]))
+    code = "".join(pieces)
+
+    for old, new in renames.items():
+        if renamed[old] != representative.name_counts.get(old, 0):
+            problems.append(f"{old} appears {renamed[old]} times in the conversion, "
+                            f"{representative.name_counts.get(old, 0)} in the source")
+    for old, new in relits.items():
+        if literal_hits[old] != representative.literal_counts.get(old, 0):
+            problems.append(f"literal {old!r} appears {literal_hits[old]} times in the conversion, "
+                            f"{representative.literal_counts.get(old, 0)} in the source")
+    before = set(validate_output(converted, target, is_procedure))
+    for message in validate_output(code, target, is_procedure):
+        if message not in before:
+            problems.append(message)
+    return code, problems
+
+# =============================================================================
+# Family Conversion
+# =============================================================================
+
+@dataclass
+class _Representative:
+    name: str
+    sql: str
+    template: Template
+    converted: str
+
+class FamilyConverter:
+    """Converts the first routine seen of each family and derives the others from it.
+
+    Members arriving while their representative is still converting wait for
+    it. A member whose derivation is ruled out, or whose representative
+    failed, is converted on its own.
+    """
+
+    def __init__(self, source: str, target: str, convert: Callable[[str], Awaitable[str]],
+                 is_procedure: Callable[[str], bool]):
+        self.source = source
+        self.target = target
+        self._convert = convert
+        self._is_procedure = is_procedure
+        self._families: Dict[str, "asyncio.Future[Optional[_Representative]]"] = {}
+        self.stats = {"families": 0, "derived": 0, "rejected": 0}
+
+    async def convert(self, name: str, sql: str) -> Tuple[str, Optional[str]]:
+        """The converted code, and the representative it was derived from (None if converted directly)."""
+        template = fingerprint(sql, self.source)
+        family = self._families.get(template.key)
+        if family is None:
+            family = self._families[template.key] = asyncio.get_running_loop().create_future()
+            self.stats["families"] += 1
+            try:
+                converted = await self._convert(sql)
+            except BaseException:
+                family.set_result(None)
+                raise
+            family.set_result(_Representative(name, sql, template, converted))
+            return converted, None
+        representative = await asyncio.shield(family)
+        if representative is not None:
+            code, problems = derive(
+                representative.template, representative.converted, template, self.target,
+                bool(self._is_procedure(sql)),
+            )
+            if not problems:
+                self.stats["derived"] += 1
+                return code, representative.name
+            self.stats["rejected"] += 1
+        return await self._convert(sql), None
+
+def group_families(routines: Iterable, dialect: str) -> List[List]:
+    """Routines (anything with a ``sql`` attribute) grouped by fingerprint, largest family first."""
+    families: Dict[str, List] = {}
+    for routine in routines:
+        families.setdefault(fingerprint(routine.sql, dialect).key, []).append(routine)
+    return sorted(families.values(), key=len, reverse=True)
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+if __name__ == "__main__":
+    from main import is_procedure_or_function
+    from migrate import DIALECTS, iter_routines, open_dump
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dump", help="schema dump file")
+    parser.add_argument("--source", choices=DIALECTS, required=True)
+    parser.add_argument("--json", action="store_true", help="print every family and its members as JSON")
+    args = parser.parse_args()
+    with open_dump(args.dump) as handle:
+        families = group_families(iter_routines(handle, args.source, is_procedure_or_function), args.source)
+    routines = sum(len(family) for family in families)
+    if args.json:
+        print(json.dumps([[routine.name for routine in family] for family in families], indent=2))
+    else:
+        for family in families:
+            if len(family) > 1:
+                print(f"{len(family):5d}  {family[0].name} (+{len(family) - 1} more)")
+    print(f"{routines} routines in {len(families)} families: "
+          f"{len(families)} model calls instead of {routines}", file=sys.stderr)
@@ -0,0 +1,136 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# =============================================================================
+# Few-Shot Example Library
+# =============================================================================
+#
+# Each example is a directory holding the same routine in one or more
+# dialects (``postgresql.sql``, ``sqlserver.sql``, ``mysql.sql``). Any two
+# dialects of one example form a verified conversion pair.
+
+DIALECTS = ("sqlserver", "postgresql", "mysql")
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+def sql_terms(sql: str) -> List[str]:
+    """Lowercased words, with dialect quoting and sigils (@, [], ``) ignored."""
+    return [word.lower() for word in _WORD.findall(sql)]
+
+@dataclass
+class Example:
+    name: str
+    versions: Dict[str, str] = field(default_factory=dict)
+
+@dataclass
+class SelectedExample:
+    example: Example
+    target_code: str
+    source_code: Optional[str] = None
+
+class ExampleIndex:
+    """TF-IDF index over the example library, for picking prompt examples.
+
+    Every dialect version is a document; an example is scored by its version
+    in the request's source dialect, or by its best version if it has none.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.examples: List[Example] = []
+        self._vectors: List[Dict[str, Dict[str, float]]] = []
+        self._idf: Dict[str, float] = {}
+        self.fingerprint = ""
+        self._load()
+
+    def _load(self) -> None:
+        digest = hashlib.sha256()
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                folder = os.path.join(self.directory, name)
+                if not os.path.isdir(folder):
+                    continue
+                example = Example(name=name)
+                for dialect in DIALECTS:
+                    path = os.path.join(folder, f"{dialect}.sql")
+                    if os.path.isfile(path):
+                        with open(path, encoding="utf-8") as handle:
+                            example.versions[dialect] = handle.read().strip()
+                        digest.update(f"{name}/{dialect}\0{example.versions[dialect]}\0".encode("utf-8"))
+                if example.versions:
+                    self.examples.append(example)
+        self.fingerprint = digest.hexdigest()[:16]
+
+        counts = [
+            {dialect: Counter(sql_terms(code)) for dialect, code in example.versions.items()}
+            for example in self.examples
+        ]
+        documents = [terms for versions in counts for terms in versions.values()]
+        frequency: Counter = Counter()
+        for terms in documents:
+            frequency.update(terms.keys())
+        self._idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in frequency.items()}
+        self._vectors = [
+            {dialect: self._weigh(terms) for dialect, terms in versions.items()}
+            for versions in counts
+        ]
+
+    def _weigh(self, terms: Counter) -> Dict[str, float]:
+        vector = {term: (1 + math.log(count)) * self._idf.get(term, 0.0) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items() if weight}
+
+    def nearest(self, sql: str, source_type: str, target_type: str) -> List[Tuple[float, Example]]:
+        """Examples that have a ``target_type`` version, most similar first."""
+        query = self._weigh(Counter(sql_terms(sql)))
+        scored = []
+        for example, vectors in zip(self.examples, self._vectors):
+            if target_type not in example.versions:
+                continue
+            candidates = [vectors[source_type]] if source_type in vectors else list(vectors.values())
+            score = max(
+                sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                for vector in candidates
+            )
+            scored.append((score, example))
+        scored.sort(key=lambda item: (-item[0], item[1].name))
+        return scored
+
+    def select(
+        self, sql: str, source_type: str, target_type: str, max_examples: int, token_budget: int,
+        min_similarity: float = 0.0,
+    ) -> List[SelectedExample]:
+        """Pick up to ``max_examples`` nearest examples within ``token_budget``.
+
+        A pair (source and target version) is preferred; if it does not fit,
+        the target version alone is used when that fits. The nearest example
+        is always considered as a style reference; further ones only when
+        they score at least ``min_similarity``. Once an example does not fit
+        at all, selection stops: a less similar one never takes its place.
+        """
+        selected: List[SelectedExample] = []
+        remaining = token_budget
+        for score, example in self.nearest(sql, source_type, target_type):
+            if len(selected) >= max_examples or (selected and score < min_similarity):
+                break
+            target_code = example.versions[target_type]
+            source_code = example.versions.get(source_type)
+            pair_cost = estimate_tokens(target_code) + (estimate_tokens(source_code) if source_code else 0)
+            if source_code and pair_cost <= remaining:
+                selected.append(SelectedExample(example, target_code, source_code))
+                remaining -= pair_cost
+            elif estimate_tokens(target_code) <= remaining:
+                selected.append(SelectedExample(example, target_code))
+                remaining -= estimate_tokens(target_code)
+            else:
+                break
+        return selected
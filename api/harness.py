@@ -0,0 +1,631 @@
+"""Check converted or optimized queries for equivalence and speed on synthetic data.
+
+Builds the FactSales star schema the built-in examples query (FactSales,
+DimProduct, DimBrand, DimDate, DimStore, DimRegion, DimChannel) in a local
+SQLite database, from a few thousand up to tens of millions of fact rows,
+then runs the source and rewritten query bodies against it, diffs the
+result sets and reports timings:
+
+    python harness.py generate --db star.sqlite3 --rows 10000000
+    python harness.py compare original.sql optimized.sql --source postgresql --db star.sqlite3 \\
+        --param year=2023 --param 'months=[1,2,3]' --repeat 5
+    python harness.py compare proc.sql converted.sql --source mysql --target postgresql \\
+        --param v_year=2023 --param year=2023 --rows 200000
+
+Procedures are reduced to their result-set queries (see segmenter), so
+variables those queries reference have to be bound with --param. Values are
+JSON; arrays bind as JSON for ``= ANY(var)`` and as comma-separated text
+elsewhere (e.g. FIND_IN_SET). Dialect features SQLite lacks are shimmed with
+rewrites and user-defined functions; anything else fails with the engine's
+own error message.
+"""
+import argparse
+import json
+import math
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from segmenter import _mask, segment_procedure
+from transpiler import Token, UnsupportedConstruct, tokenize
+
+# =============================================================================
+# Star Schema
+# =============================================================================
+
+SCHEMA = [
+    "CREATE TABLE DimBrand (BrandId INTEGER PRIMARY KEY, BrandName TEXT NOT NULL)",
+    "CREATE TABLE DimProduct (ProductID INTEGER PRIMARY KEY, ProductName TEXT NOT NULL,"
+    " BrandId INTEGER NOT NULL, UnitPrice REAL NOT NULL)",
+    "CREATE TABLE DimDate (Calendar TEXT PRIMARY KEY, CalendarYear INTEGER NOT NULL,"
+    " MonthNumber INTEGER NOT NULL, FinancialYear INTEGER NOT NULL)",
+    "CREATE TABLE DimRegion (RegionID INTEGER PRIMARY KEY, Level1Value TEXT NOT NULL,"
+    " Level2Value TEXT NOT NULL, Level3Value TEXT NOT NULL)",
+    "CREATE TABLE DimStore (StoreID INTEGER PRIMARY KEY, StoreName TEXT NOT NULL, RegionID INTEGER NOT NULL)",
+    "CREATE TABLE DimChannel (ChannelID INTEGER PRIMARY KEY, ChannelName TEXT NOT NULL)",
+    "CREATE TABLE FactSales (SalesID INTEGER PRIMARY KEY, OrderDate TEXT NOT NULL, ProductID INTEGER NOT NULL,"
+    " StoreID INTEGER NOT NULL, ChannelID INTEGER NOT NULL, Quantity INTEGER NOT NULL, SalesAmount REAL NOT NULL)",
+]
+
+# Created after loading, which is several times faster than maintaining them per row.
+INDEXES = [
+    "CREATE INDEX FactSales_OrderDate ON FactSales (OrderDate)",
+    "CREATE INDEX FactSales_ProductID ON FactSales (ProductID)",
+    "CREATE INDEX FactSales_StoreID ON FactSales (StoreID)",
+    "CREATE INDEX FactSales_ChannelID ON FactSales (ChannelID)",
+    "CREATE INDEX DimProduct_BrandId ON DimProduct (BrandId)",
+    "CREATE INDEX DimStore_RegionID ON DimStore (RegionID)",
+    "CREATE INDEX DimDate_FinancialYear ON DimDate (FinancialYear)",
+]
+
+STATES = (
+    "AL AK AZ AR CA CO CT DE FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO "
+    "MT NE NV NH NJ NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY"
+).split()
+AREAS = ["Northeast", "South", "Midwest", "West"]
+CHANNELS = ["Online", "Retail", "Wholesale", "Partner"]
+FIRST_DAY, LAST_DAY = date(2019, 1, 1), date(2024, 12, 31)
+
+@dataclass
+class Scale:
+    rows: int
+    brands: int
+    products: int
+    stores: int
+
+    @classmethod
+    def for_rows(cls, rows: int) -> "Scale":
+        """Dimension sizes that grow with the fact table, as they do in production."""
+        clamp = lambda value, low, high: max(low, min(value, high))
+        return cls(rows, clamp(rows // 20000, 20, 1000), clamp(rows // 500, 100, 60000), clamp(rows // 2000, 20, 20000))
+
+def _hash(column: str, multiplier: int, seed: int) -> str:
+    """Deterministic pseudo-random 16-bit value per row, computed inside the engine."""
+    return f"((({column} * {multiplier} + {seed * 7919 + multiplier}) % 4294967296) / 65536)"
+
+def _sequence(start: int, stop: int) -> str:
+    return f"WITH RECURSIVE seq(i) AS (SELECT {start} UNION ALL SELECT i + 1 FROM seq WHERE i < {stop}) "
+
+def generate(conn: sqlite3.Connection, rows: int, seed: int = 42, chunk: int = 1_000_000,
+             progress: Optional[Callable[[int], None]] = None) -> Scale:
+    """Create and fill the star schema with ``rows`` fact rows; the same seed gives the same data.
+
+    Rows are produced by the engine itself in chunks, so memory use does not
+    grow with the table size.
+    """
+    scale = Scale.for_rows(rows)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    conn.execute(
+        _sequence(1, scale.brands)
+        + "INSERT INTO DimBrand SELECT i, 'Brand ' || printf('%04d', i) FROM seq"
+    )
+    conn.execute(
+        _sequence(1, scale.products)
+        + f"INSERT INTO DimProduct SELECT i, 'Product ' || printf('%05d', i), 1 + {_hash('i', 40503, seed)} % {scale.brands},"
+        f" 2 + ({_hash('i', 2246822519, seed)} % 19800) / 100.0 FROM seq"
+    )
+    conn.executemany(
+        "INSERT INTO DimRegion VALUES (?, 'US', ?, ?)",
+        [(index, AREAS[index % len(AREAS)], state) for index, state in enumerate(STATES, start=1)],
+    )
+    conn.execute(
+        _sequence(1, scale.stores)
+        + f"INSERT INTO DimStore SELECT i, 'Store ' || printf('%05d', i), 1 + {_hash('i', 3266489917, seed)} % {len(STATES)} FROM seq"
+    )
+    conn.executemany("INSERT INTO DimChannel VALUES (?, ?)", list(enumerate(CHANNELS, start=1)))
+    days = (LAST_DAY - FIRST_DAY).days + 1
+    # Financial years run July to June and are named after the year they end in.
+    conn.execute(
+        _sequence(0, days - 1)
+        + "INSERT INTO DimDate SELECT d, CAST(strftime('%Y', d) AS INTEGER), CAST(strftime('%m', d) AS INTEGER),"
+        " CAST(strftime('%Y', d) AS INTEGER) + (CAST(strftime('%m', d) AS INTEGER) >= 7)"
+        f" FROM (SELECT date('{FIRST_DAY.isoformat()}', '+' || i || ' days') AS d FROM seq)"
+    )
+
+    for start in range(1, rows + 1, chunk):
+        stop = min(start + chunk - 1, rows)
+        conn.execute(
+            _sequence(start, stop)
+            + "INSERT INTO FactSales SELECT s.i, s.order_date, s.product, s.store, s.channel, s.quantity,"
+            " ROUND(s.quantity * p.UnitPrice, 2)"
+            " FROM (SELECT i,"
+            f" date('{FIRST_DAY.isoformat()}', '+' || ({_hash('i', 2654435761, seed)} % {days}) || ' days') AS order_date,"
+            f" 1 + {_hash('i', 2246822519, seed)} % {scale.products} AS product,"
+            f" 1 + {_hash('i', 3266489917, seed)} % {scale.stores} AS store,"
+            f" 1 + {_hash('i', 668265263, seed)} % {len(CHANNELS)} AS channel,"
+            f" 1 + {_hash('i', 374761393, seed)} % 10 AS quantity FROM seq) AS s"
+            " JOIN DimProduct p ON p.ProductID = s.product"
+        )
+        conn.commit()
+        if progress is not None:
+            progress(stop)
+
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return scale
+
+# =============================================================================
+# Local Engine Shims
+# =============================================================================
+#
+# Query bodies are lexed in their own dialect and re-rendered for SQLite.
+# Only what the examples and typical rewrites use is translated; the rest is
+# passed through and fails loudly in the engine rather than being guessed.
+
+_TABLE_HINTS = {"NOLOCK", "READUNCOMMITTED", "READPAST", "ROWLOCK", "PAGLOCK", "TABLOCK", "UPDLOCK", "HOLDLOCK"}
+
+_CAST_TYPES = {
+    "TEXT": "TEXT", "VARCHAR": "TEXT", "NVARCHAR": "TEXT", "CHAR": "TEXT", "NCHAR": "TEXT", "CHARACTER": "TEXT",
+    "JSON": "TEXT", "JSONB": "TEXT", "DATE": "TEXT", "INT": "INTEGER", "INTEGER": "INTEGER", "BIGINT": "INTEGER",
+    "SMALLINT": "INTEGER", "INT4": "INTEGER", "INT8": "INTEGER", "NUMERIC": "REAL", "DECIMAL": "REAL",
+    "REAL": "REAL", "FLOAT": "REAL", "DOUBLE": "REAL", "MONEY": "REAL",
+}
+
+# Functions whose name or semantics differ from SQLite's, per source dialect.
+_RENAMES = {
+    "sqlserver": {"ISNULL": "IFNULL", "LEN": "LENGTH", "FORMAT": "tsql_format", "CONCAT": "concat_ws_null"},
+    "postgresql": {"CONCAT": "concat_ws_null"},
+    "mysql": {"CHAR_LENGTH": "LENGTH", "FORMAT": "mysql_format", "CONCAT": "concat_strict"},
+}
+
+def _date_part(unit: str, value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    day = date.fromisoformat(str(value)[:10])
+    unit = unit.lower()
+    if unit == "quarter":
+        return (day.month - 1) // 3 + 1
+    if unit == "dow":
+        return day.isoweekday() % 7
+    return getattr(day, unit)
+
+def _find_in_set(needle: Any, haystack: Optional[str]) -> Optional[int]:
+    if needle is None or haystack is None:
+        return None
+    items = str(haystack).split(",")
+    needle = str(needle)
+    return items.index(needle) + 1 if needle in items else 0
+
+def _number_format(value: Any, decimals: int) -> Optional[str]:
+    return None if value is None else f"{float(value):,.{int(decimals)}f}"
+
+def _tsql_format(value: Any, spec: str) -> Optional[str]:
+    """The standard (N2, C2, F0) and scaled custom (``$0,,.00M``) formats the examples use."""
+    if value is None:
+        return None
+    standard = re.fullmatch(r"([NnCcFf])(\d*)", spec)
+    if standard:
+        kind, decimals = standard.group(1).upper(), int(standard.group(2) or 2)
+        text = f"{float(value):,.{decimals}f}" if kind != "F" else f"{float(value):.{decimals}f}"
+        return "$" + text if kind == "C" else text
+    custom = re.fullmatch(r"([^0#]*)([0#,]*)(?:\.(0*))?(.*)", spec)
+    prefix, digits, decimals, suffix = custom.groups()
+    scaled = float(value) / 1000 ** (len(digits) - len(digits.rstrip(",")))
+    grouping = "," if "," in digits.rstrip(",") else ""
+    return f"{prefix}{scaled:{grouping}.{len(decimals or '')}f}{suffix}"
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    for unit in ("YEAR", "MONTH", "DAY"):
+        conn.create_function(unit, 1, lambda value, unit=unit: _date_part(unit, value), deterministic=True)
+    conn.create_function("DATE_PART", 2, _date_part, deterministic=True)
+    conn.create_function("FIND_IN_SET", 2, _find_in_set, deterministic=True)
+    conn.create_function("mysql_format", 2, _number_format, deterministic=True)
+    conn.create_function("tsql_format", 2, _tsql_format, deterministic=True)
+    # MySQL's CONCAT is NULL if any argument is; SQL Server and PostgreSQL skip NULLs.
+    conn.create_function(
+        "concat_strict", -1, lambda *args: None if None in args else "".join(map(str, args)), deterministic=True
+    )
+    conn.create_function(
+        "concat_ws_null", -1, lambda *args: "".join(str(arg) for arg in args if arg is not None), deterministic=True
+    )
+    for name in ("GETDATE", "NOW"):
+        conn.create_function(name, 0, lambda: datetime.now().isoformat(sep=" ", timespec="seconds"))
+
+def connect(path: str = ":memory:") -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    register_functions(conn)
+    return conn
+
+def _significant(tokens: Sequence[Token], index: int, step: int) -> Optional[int]:
+    index += step
+    while 0 <= index < len(tokens):
+        if tokens[index].kind not in ("ws", "comment"):
+            return index
+        index += step
+    return None
+
+def _matching(tokens: Sequence[Token], index: int) -> int:
+    """Index of the bracket closing the one at ``index`` (searching backwards for a closing one)."""
+    opening, closing = tokens[index].text, {"(": ")", ")": "(", "[": "]"}[tokens[index].text]
+    step = -1 if opening == ")" else 1
+    depth = 0
+    while 0 <= index < len(tokens):
+        if tokens[index].text == opening and tokens[index].kind == "punct":
+            depth += 1
+        elif tokens[index].text == closing and tokens[index].kind == "punct":
+            depth -= 1
+            if depth == 0:
+                return index
+        index += step
+    raise UnsupportedConstruct("Unbalanced parentheses")
+
+def _render(tokens: Sequence[Token]) -> str:
+    parts = []
+    for token in tokens:
+        if token.kind == "string":
+            parts.append("'" + token.text.replace("'", "''") + "'")
+        elif token.kind == "ident":
+            parts.append('"' + token.text.replace('"', '""') + '"')
+        elif token.kind == "comment":
+            parts.append(" ")
+        else:
+            parts.append(token.text)
+    return "".join(parts)
+
+class _SqliteRewriter:
+    def __init__(self, dialect: str, params: Dict[str, Any]):
+        self.dialect = dialect
+        self.params = {name.lower(): value for name, value in params.items()}
+        self.bindings: Dict[str, Any] = {}
+        self.renames = _RENAMES[dialect]
+
+    def bind(self, name: str, as_array: bool = False) -> Token:
+        name = name.lower()
+        if name not in self.params:
+            raise UnsupportedConstruct(f"Variable {name} is not bound; pass --param {name}=...")
+        value = self.params[name]
+        key = f"{name}__array" if as_array else name
+        if isinstance(value, list):
+            value = json.dumps(value) if as_array else ",".join(map(str, value))
+        elif as_array and value is not None:
+            raise UnsupportedConstruct(f"Variable {name} is used as an array; bind a JSON list")
+        self.bindings[key] = value
+        return Token("param", f":{key}")
+
+    def is_variable(self, tokens: Sequence[Token], index: int) -> bool:
+        token = tokens[index]
+        if token.kind == "param":
+            return True
+        if token.kind != "word" or token.text.lower() not in self.params or self.dialect == "sqlserver":
+            return False
+        before, after = _significant(tokens, index, -1), _significant(tokens, index, 1)
+        if before is not None and (tokens[before].text == "." or tokens[before].text.upper() == "AS"):
+            return False
+        return after is None or tokens[after].text not in ("(", ".")
+
+    def run(self, sql: str) -> str:
+        tokens = tokenize(sql.strip().rstrip(";").rstrip(), self.dialect)
+        out: List[Token] = []
+        limit: Optional[Token] = None
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            upper = token.text.upper() if token.kind == "word" else ""
+            nxt = _significant(tokens, i, 1)
+
+            if upper == "WITH" and nxt is not None and tokens[nxt].text == "(":
+                close = _matching(tokens, nxt)
+                hints = [t.text.upper() for t in tokens[nxt + 1:close] if t.kind == "word"]
+                if hints and all(hint in _TABLE_HINTS for hint in hints):
+                    i = close + 1
+                    continue
+            if token.kind == "word" and token.text.lower() == "dbo" and nxt is not None and tokens[nxt].text == ".":
+                i = nxt + 1
+                continue
+            if upper == "TOP" and self.dialect == "sqlserver":
+                if limit is not None:
+                    raise UnsupportedConstruct("More than one TOP")
+                value = nxt
+                if value is not None and tokens[value].text == "(":
+                    value, nxt = _significant(tokens, value, 1), _matching(tokens, value)
+                limit = tokens[value]
+                i = nxt + 1
+                continue
+            if upper == "EXTRACT" and nxt is not None and tokens[nxt].text == "(":
+                unit, keyword = _significant(tokens, nxt, 1), None
+                if unit is not None:
+                    keyword = _significant(tokens, unit, 1)
+                if keyword is None or tokens[keyword].text.upper() != "FROM":
+                    raise UnsupportedConstruct("Unsupported EXTRACT")
+                out += [Token("word", "DATE_PART"), Token("punct", "("), Token("string", tokens[unit].text), Token("punct", ",")]
+                i = keyword + 1
+                continue
+            if token.kind == "op" and token.text == "::":
+                i = self._cast(tokens, nxt, out)
+                continue
+            if token.kind == "op" and token.text in ("=", "<>", "!=") and nxt is not None \
+                    and tokens[nxt].text.upper() in ("ANY", "ALL", "SOME"):
+                i = self._quantified(tokens, i, nxt, out)
+                continue
+            if token.kind == "op" and token.text == "+" and self.dialect == "sqlserver":
+                before = _significant(out, len(out), -1)
+                if (before is not None and out[before].kind == "string") or (nxt is not None and tokens[nxt].kind == "string"):
+                    token = Token("op", "||")
+            if self.is_variable(tokens, i):
+                out.append(self.bind(token.text.lstrip("@")))
+                i += 1
+                continue
+            if upper in self.renames and nxt is not None and tokens[nxt].text == "(":
+                token = Token("word", self.renames[upper])
+            elif upper == "ILIKE":
+                token = Token("word", "LIKE")
+            out.append(token)
+            i += 1
+        if limit is not None:
+            out += [Token("ws", " "), Token("word", "LIMIT"), Token("ws", " "), limit]
+        return _render(out)
+
+    def _cast(self, tokens: Sequence[Token], type_index: Optional[int], out: List[Token]) -> int:
+        """Rewrite ``operand::type`` as ``CAST(operand AS type)``."""
+        if type_index is None or tokens[type_index].kind != "word":
+            raise UnsupportedConstruct("Malformed :: cast")
+        end = type_index + 1
+        after = _significant(tokens, type_index, 1)
+        if after is not None and tokens[after].text == "(":
+            end = _matching(tokens, after) + 1
+        after = _significant(tokens, end - 1, 1)
+        if after is not None and tokens[after].text == "[":
+            raise UnsupportedConstruct("Array casts")
+        sql_type = _CAST_TYPES.get(tokens[type_index].text.upper())
+        if sql_type is None:
+            raise UnsupportedConstruct(f"Cast to {tokens[type_index].text}")
+
+        start = _significant(out, len(out), -1)
+        if start is None:
+            raise UnsupportedConstruct("Malformed :: cast")
+        if out[start].text == ")":
+            start = _matching(out, start)
+            name = _significant(out, start, -1)
+            if name is not None and out[name].kind == "word":
+                start = name
+        while True:
+            dot = _significant(out, start, -1)
+            if dot is None or out[dot].text != ".":
+                break
+            start = _significant(out, dot, -1)
+        operand = out[start:]
+        del out[start:]
+        out += [Token("word", "CAST"), Token("punct", "("), *operand, Token("word", f" AS {sql_type}"), Token("punct", ")")]
+        return end
+
+    def _quantified(self, tokens: Sequence[Token], op: int, word: int, out: List[Token]) -> int:
+        """``x = ANY(array)`` becomes ``x IN (...)``; arrays bound as JSON are unnested with json_each."""
+        operator, quantifier = tokens[op].text, tokens[word].text.upper()
+        negated = operator in ("<>", "!=")
+        if negated != (quantifier == "ALL"):
+            raise UnsupportedConstruct(f"{operator} {quantifier} has no IN equivalent")
+        paren = _significant(tokens, word, 1)
+        if paren is None or tokens[paren].text != "(":
+            raise UnsupportedConstruct("Malformed quantified comparison")
+        close = _matching(tokens, paren)
+        inner = [index for index in range(paren + 1, close) if tokens[index].kind not in ("ws", "comment")]
+        keyword = Token("word", "NOT IN" if negated else "IN")
+        if len(inner) == 1 and self.is_variable(tokens, inner[0]):
+            array = self.bind(tokens[inner[0]].text.lstrip("@"), as_array=True)
+            out += [keyword, Token("ws", " "), Token("punct", "("), Token("word", "SELECT value FROM json_each("),
+                    array, Token("punct", ")"), Token("punct", ")")]
+        elif inner and tokens[inner[0]].text.upper() == "ARRAY" and tokens[inner[1]].text == "[":
+            items = tokens[inner[1] + 1:_matching(tokens, inner[1])]
+            out += [keyword, Token("ws", " "), Token("punct", "("), *items, Token("punct", ")")]
+        elif inner and tokens[inner[0]].text.upper() in ("SELECT", "WITH"):
+            out += [keyword, Token("ws", " "), *tokens[paren:close + 1]]
+        else:
+            raise UnsupportedConstruct(f"{quantifier} over an expression")
+        return close + 1
+
+def to_sqlite(sql: str, dialect: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Render a query body for SQLite; returns the SQL and its named bindings."""
+    rewriter = _SqliteRewriter(dialect, params)
+    return rewriter.run(sql), rewriter.bindings
+
+# =============================================================================
+# Query Extraction
+# =============================================================================
+
+_ROUTINE = re.compile(r"\bCREATE\b(?:\s+OR\s+REPLACE)?\s+(?:PROCEDURE|FUNCTION)\b", re.I)
+_CURSOR_OPEN = re.compile(r"^\s*OPEN\s+\w+\s+FOR\s+", re.I)
+_CURSOR_RETURN = re.compile(r";?\s*RETURN\s+NEXT\s+\w+\s*;?\s*$", re.I)
+
+def query_bodies(code: str, dialect: str) -> List[str]:
+    """The result-set queries of a procedure, or the code itself if it is a plain query."""
+    if not _ROUTINE.search(_mask(code, dialect)):
+        return [code]
+    segments = segment_procedure(code, dialect)
+    if segments is None:
+        return [code]
+    if dialect == "sqlserver" and segments.blocks:
+        raise UnsupportedConstruct(
+            "SQL Server result sets are built as dynamic SQL; pass the query text that sp_executesql runs"
+        )
+    return [_CURSOR_RETURN.sub("", _CURSOR_OPEN.sub("", block)).strip() for block in segments.blocks]
+
+# =============================================================================
+# Comparison
+# =============================================================================
+
+@dataclass
+class Run:
+    sql: str
+    columns: List[str] = field(default_factory=list)
+    rows: List[tuple] = field(default_factory=list)
+    seconds: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def median(self) -> Optional[float]:
+        return statistics.median(self.seconds) if self.seconds else None
+
+def _normalize(value: Any) -> Any:
+    """Make values from different spellings of a query comparable (float noise, int vs real)."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        rounded = float(f"{value:.10g}")
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+def execute(conn: sqlite3.Connection, sql: str, bindings: Dict[str, Any], repeat: int) -> Run:
+    """Run a query once to warm the page cache, then ``repeat`` timed times."""
+    run = Run(sql)
+    try:
+        cursor = conn.execute(sql, bindings)
+        run.rows = cursor.fetchall()
+        run.columns = [column[0] for column in cursor.description or []]
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, bindings).fetchall()
+            run.seconds.append(time.perf_counter() - started)
+    except sqlite3.Error as e:
+        run.error = str(e)
+    return run
+
+def diff(source: Run, target: Run, ordered: bool = False, sample: int = 5) -> Dict[str, Any]:
+    """Multiset comparison of two result sets, plus row order when ``ordered``."""
+    left = [tuple(map(_normalize, row)) for row in source.rows]
+    right = [tuple(map(_normalize, row)) for row in target.rows]
+    left_counts, right_counts = Counter(left), Counter(right)
+    missing = list((left_counts - right_counts).elements())
+    extra = list((right_counts - left_counts).elements())
+    report = {
+        "equivalent": not missing and not extra and len(source.columns) == len(target.columns),
+        "rows": [len(left), len(right)],
+        "columns_match": [c.lower() for c in source.columns] == [c.lower() for c in target.columns],
+        # Which columns disagree, e.g. only a differently formatted label.
+        "differing_columns": [
+            name for index, name in enumerate(source.columns)
+            if Counter(row[index] for row in left) != Counter(row[index] for row in right if index < len(row))
+        ],
+        "only_in_source": [list(row) for row in missing[:sample]],
+        "only_in_target": [list(row) for row in extra[:sample]],
+    }
+    if ordered:
+        report["same_order"] = left == right
+        report["equivalent"] = report["equivalent"] and report["same_order"]
+    return report
+
+_ORDER_BY = re.compile(r"\bORDER\s+BY\b[^()]*$", re.I | re.S)
+
+def compare(conn: sqlite3.Connection, source: str, source_type: str, target: str, target_type: str,
+            params: Dict[str, Any], target_params: Optional[Dict[str, Any]] = None,
+            repeat: int = 3) -> Dict[str, Any]:
+    """Run both versions' result-set queries and report equivalence and speed per result set.
+
+    Row order only has to match when both queries end in an ORDER BY; ties
+    can still be ordered differently, so such a mismatch is worth a look
+    rather than an automatic rejection.
+    """
+    source_queries = query_bodies(source, source_type)
+    target_queries = query_bodies(target, target_type)
+    report: Dict[str, Any] = {"engine": f"sqlite {sqlite3.sqlite_version}", "result_sets": []}
+    if len(source_queries) != len(target_queries):
+        report["equivalent"] = False
+        report["error"] = f"{len(source_queries)} result sets in the source, {len(target_queries)} in the target"
+        return report
+
+    for index, (left_sql, right_sql) in enumerate(zip(source_queries, target_queries), start=1):
+        entry: Dict[str, Any] = {"index": index}
+        runs = []
+        for side, sql, dialect, bound in (
+            ("source", left_sql, source_type, params),
+            ("target", right_sql, target_type, target_params if target_params is not None else params),
+        ):
+            try:
+                rendered, bindings = to_sqlite(sql, dialect, bound)
+            except UnsupportedConstruct as e:
+                run = Run(sql, error=str(e))
+            else:
+                run = execute(conn, rendered, bindings, repeat)
+            runs.append(run)
+            entry[side] = {
+                "sql": run.sql,
+                "rows": len(run.rows),
+                "median_ms": round(run.median * 1000, 3) if run.median is not None else None,
+                "error": run.error,
+            }
+        if any(run.error for run in runs):
+            entry["equivalent"] = False
+        else:
+            ordered = all(_ORDER_BY.search(sql) for sql in (left_sql, right_sql))
+            entry.update(diff(*runs, ordered=ordered))
+            if runs[1].median:
+                entry["speedup"] = round(runs[0].median / runs[1].median, 2)
+        report["result_sets"].append(entry)
+    report["equivalent"] = all(entry["equivalent"] for entry in report["result_sets"])
+    return report
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+DIALECTS = ["sqlserver", "postgresql", "mysql"]
+
+def parse_param(text: str) -> Tuple[str, Any]:
+    name, _, value = text.partition("=")
+    if not name or not _:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text!r}")
+    try:
+        return name.lstrip("@"), json.loads(value)
+    except ValueError:
+        return name.lstrip("@"), value
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("generate", help="build a synthetic star-schema database")
+    build.add_argument("--db", required=True, help="SQLite file to create")
+    build.add_argument("--rows", type=int, default=1_000_000, help="FactSales rows")
+    build.add_argument("--seed", type=int, default=42)
+
+    check = commands.add_parser("compare", help="diff and time a source query against its rewrite")
+    check.add_argument("source_file")
+    check.add_argument("target_file")
+    check.add_argument("--source", choices=DIALECTS, required=True, help="dialect of source_file")
+    check.add_argument("--target", choices=DIALECTS, help="dialect of target_file (default: --source)")
+    check.add_argument("--db", help="database from 'generate' (default: build one in memory)")
+    check.add_argument("--rows", type=int, default=100_000, help="fact rows for the in-memory database")
+    check.add_argument("--seed", type=int, default=42)
+    check.add_argument("--param", type=parse_param, action="append", default=[], metavar="NAME=JSON",
+                       help="bind a variable in both queries (repeatable)")
+    check.add_argument("--target-param", type=parse_param, action="append", metavar="NAME=JSON",
+                       help="bind variables in the target query only, when its names differ")
+    check.add_argument("--repeat", type=int, default=3, help="timed runs per query")
+    return parser.parse_args()
+
+def _progress(done: int) -> None:
+    print(f"{done:>12,} fact rows", file=sys.stderr)
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    if args.command == "generate":
+        scale = generate(connect(args.db), args.rows, args.seed, progress=_progress)
+        print(json.dumps({**vars(scale), "db": args.db, "seconds": round(time.perf_counter() - started, 2)}, indent=2))
+        sys.exit(0)
+
+    if args.db:
+        conn = connect(args.db)
+    else:
+        conn = connect()
+        generate(conn, args.rows, args.seed)
+    with open(args.source_file, encoding="utf-8") as handle:
+        source_sql = handle.read()
+    with open(args.target_file, encoding="utf-8") as handle:
+        target_sql = handle.read()
+    result = compare(
+        conn, source_sql, args.source, target_sql, args.target or args.source, dict(args.param),
+        {**dict(args.param), **dict(args.target_param)} if args.target_param else None, max(args.repeat, 1),
+    )
+    print(json.dumps(result, indent=2, default=str))
+    sys.exit(0 if result["equivalent"] else 1)
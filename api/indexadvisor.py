@@ -0,0 +1,590 @@
+"""Recommend indexes for a whole workload of routines from the columns they join, filter and sort on.
+
+Every routine is scanned statically for join keys, filter predicates and
+GROUP BY / ORDER BY columns per table. Usage is weighted by how many routines
+rely on it, then folded into a few composite, covering indexes, each listing
+the routines it helps and its DDL in every target dialect:
+
+    python indexadvisor.py procedures/ --target sqlserver --target postgresql
+    python indexadvisor.py schema.sql more.sql --max-indexes 5 --json
+
+Directories are searched for *.sql files, and dumps holding many routines are
+split the way migrate.py splits them. A file's dialect is detected unless
+--dialect is given. Existing indexes are not known to the advisor, so skip any
+recommendation that an existing index (or the primary key) already leads with.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from antipatterns import _NAME, _blank_comments, _unquote, _variables
+
+# =============================================================================
+# Routine Scanning
+# =============================================================================
+
+_STRING = re.compile(r"'((?:[^']|'')*)'", re.S)
+# Literals that read like SQL are dynamic queries and get scanned too.
+_SQL_LITERAL = re.compile(r"\b(?:SELECT|FROM|JOIN|WHERE|AND|GROUP\s+BY|ORDER\s+BY)\b|\w\.\w", re.I)
+
+_TOKEN = re.compile(
+    rf"[@#]*{_NAME}(?:\s*\.\s*{_NAME})*|<=|>=|<>|!=|=|<|>|::|[(),]"
+)
+_PUNCTUATION = {"(": "open", ")": "close", ",": "comma", "::": "cast"}
+_CLAUSE_WORDS = {
+    "SELECT", "FROM", "JOIN", "ON", "WHERE", "HAVING", "UPDATE", "UNION", "EXCEPT", "INTERSECT", "LIMIT", "OFFSET",
+    "FETCH", "SET", "VALUES", "INTO", "RETURNING", "OUTPUT", "USING", "WINDOW",
+}
+_OPERATOR_WORDS = {"IN", "BETWEEN", "LIKE", "ILIKE"}
+
+_CLAUSES = {
+    "SELECT": "select", "FROM": "from", "JOIN": "from", "UPDATE": "from", "ON": "on",
+    "WHERE": "where", "HAVING": "where", "GROUPBY": "group", "PARTITIONBY": "group", "ORDERBY": "order",
+}
+_OPERATORS = {
+    "=": "equality", "=ANY": "equality", "IN": "equality",
+    "<": "range", ">": "range", "<=": "range", ">=": "range", "BETWEEN": "range", "LIKE": "range", "ILIKE": "range",
+}
+# A column inside one of these still uses its index once /analyze's rewrite is applied.
+_FUNCTIONS = {
+    "FIND_IN_SET": "equality", "CAST": "equality", "CONVERT": "equality",
+    "YEAR": "range", "MONTH": "range", "DAY": "range", "DATEPART": "range", "DATE_PART": "range",
+    "EXTRACT": "range", "DATE": "range", "DATE_TRUNC": "range",
+}
+_NOT_ALIASES = {
+    "AS", "WITH", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "OUTER", "NATURAL", "STRAIGHT_JOIN", "LATERAL",
+    "FOR", "USE", "FORCE", "IGNORE", "TABLESAMPLE", "GROUP", "ORDER",
+}
+_RESERVED = {
+    "NULL", "AND", "OR", "NOT", "IS", "ASC", "DESC", "NULLS", "FIRST", "LAST", "TRUE", "FALSE", "CASE", "WHEN",
+    "THEN", "ELSE", "END", "EXISTS", "DISTINCT", "ALL", "ANY", "AS", "CURRENT_DATE", "CURRENT_TIMESTAMP",
+}
+
+USAGES = ("equality", "range", "join", "group", "order", "select")
+
+# Per table: usage kind -> column keys. Keys are unquoted and lowercased.
+Profile = Dict[str, Dict[str, Set[str]]]
+
+@lru_cache(maxsize=65536)
+def _word(text: str) -> str:
+    return "".join(text.split()).upper()
+
+@lru_cache(maxsize=65536)
+def _key(name: str) -> str:
+    return _unquote(name)
+
+@lru_cache(maxsize=65536)
+def _parts(name: str) -> Tuple[str, ...]:
+    return tuple(part.strip() for part in name.split("."))
+
+@lru_cache(maxsize=65536)
+def _spelling(part: str) -> str:
+    return re.sub(r"[\"\[\]`]", "", part)
+
+def _streams(code: str) -> List[str]:
+    """The code with literals blanked, then the dynamic SQL held in its literals."""
+    literals: List[str] = []
+
+    def blank(match: re.Match) -> str:
+        text = match.group(1).replace("''", "'")
+        if _SQL_LITERAL.search(text):
+            literals.append(_STRING.sub(lambda m: " " * len(m.group()), text))
+        return " " * len(match.group())
+
+    outer = _STRING.sub(blank, _blank_comments(code))
+    return [outer, "\n".join(literals)]
+
+_QUERY = re.compile(r"\b(?:FROM|UPDATE)\b", re.I)
+
+def _tokens(statement: str) -> List[Tuple[str, str]]:
+    """(kind, text) pairs; keywords are told apart from names after matching, which keeps the pattern fast."""
+    tokens: List[Tuple[str, str]] = []
+    for text in _TOKEN.findall(statement):
+        kind = _PUNCTUATION.get(text)
+        if kind is None:
+            if text[0] in "<>=!":
+                kind = "operator"
+            else:
+                word = text.upper()
+                previous = tokens[-1] if tokens else ("", "")
+                if word == "BY" and previous[1].upper() in ("GROUP", "ORDER", "PARTITION"):
+                    tokens[-1] = ("clause", f"{previous[1]} BY")
+                    continue
+                if word == "ANY" and previous == ("operator", "="):
+                    tokens[-1] = ("operator", "= ANY")
+                    continue
+                if word in _OPERATOR_WORDS and previous[1].upper() == "NOT":
+                    tokens[-1] = ("operator", f"NOT {word}")
+                    continue
+                kind = "clause" if word in _CLAUSE_WORDS else "operator" if word in _OPERATOR_WORDS else "name"
+        tokens.append((kind, text))
+    return tokens
+
+def _statements(text: str) -> Iterator[List[Tuple[str, str]]]:
+    """Tokens of each statement that reads a table; assignments, IFs and the like are skipped untokenized."""
+    for statement in text.split(";"):
+        if _QUERY.search(statement):
+            yield _tokens(statement)
+
+class _Scanner:
+    """Collects one routine's per-table column usage, and how names are spelled."""
+
+    def __init__(self, variables: Set[str], spellings: Dict[str, Counter]):
+        self.variables = variables
+        self.spellings = spellings
+        self.profile: Profile = defaultdict(lambda: defaultdict(set))
+
+    def scan(self, text: str) -> None:
+        statements = [(tokens, self._clauses(tokens)) for tokens in _statements(text)]
+        declared = [self._declarations(tokens, clauses) for tokens, clauses in statements]
+        everywhere: Dict[str, str] = {}
+        for aliases in declared:
+            everywhere.update(aliases)
+        for (tokens, clauses), aliases in zip(statements, declared):
+            self._usage(tokens, clauses, {**everywhere, **aliases}, set(aliases.values()))
+
+    def _declarations(self, tokens: List[Tuple[str, str]], clauses: List[Tuple[Optional[str], bool]]) -> Dict[str, str]:
+        """alias (and table name) -> table key for FROM, JOIN, UPDATE and comma-joined tables."""
+        ctes = {
+            _key(tokens[i][1])
+            for i in range(len(tokens) - 2)
+            if tokens[i][0] == "name" and tokens[i + 1][1].upper() == "AS" and tokens[i + 2][0] == "open"
+        }
+        aliases: Dict[str, str] = {}
+        for i, clause in enumerate(clauses):
+            kind, text = tokens[i]
+            declares = (kind == "clause" and _word(text) in ("FROM", "JOIN", "UPDATE")) or (
+                kind == "comma" and clause == ("from", True)
+            )
+            if not declares or i + 1 >= len(tokens):
+                continue
+            kind, name = tokens[i + 1]
+            following = tokens[i + 2] if i + 2 < len(tokens) else ("", "")
+            if kind != "name" or name[0] in "@#" or following[0] in ("open", "operator"):
+                continue
+            table = _parts(name)[-1]
+            key = _key(table)
+            if key in ctes:
+                continue
+            self.spellings[key][_spelling(table)] += 1
+            aliases[key] = key
+            alias = following
+            if alias[1].upper() == "AS" and i + 3 < len(tokens):
+                alias = tokens[i + 3]
+            if alias[0] == "name" and alias[1].upper() not in _NOT_ALIASES:
+                aliases[_key(alias[1])] = key
+        return aliases
+
+    @staticmethod
+    def _clauses(tokens: List[Tuple[str, str]]) -> List[Tuple[Optional[str], bool]]:
+        """Each token's clause, and whether it is the clause's own level rather than a nested group."""
+        stack: List[Tuple[Optional[str], bool]] = [(None, True)]
+        result = []
+        for kind, text in tokens:
+            if kind == "open":
+                result.append(stack[-1])
+                stack.append((stack[-1][0], False))
+                continue
+            if kind == "close":
+                if len(stack) > 1:
+                    stack.pop()
+            elif kind == "clause":
+                stack[-1] = (_CLAUSES.get(_word(text)), True)
+            result.append(stack[-1])
+        return result
+
+    def _usage(
+        self,
+        tokens: List[Tuple[str, str]],
+        clauses: List[Tuple[Optional[str], bool]],
+        aliases: Dict[str, str],
+        tables: Set[str],
+    ) -> None:
+        only = next(iter(tables)) if len(tables) == 1 else None
+        for i, (clause, _) in enumerate(clauses):
+            kind, text = tokens[i]
+            if kind != "name" or clause is None or clause == "from" or text[0] in "@#":
+                continue
+            parts = _parts(text)
+            if len(parts) > 1:
+                table = aliases.get(_key(parts[-2]))
+            elif only is not None and clause != "select" and self._bare_column(tokens, i, aliases):
+                table = only
+            else:
+                continue
+            if table is None:
+                continue
+            usage = self._classify(tokens, i, clause, aliases)
+            if usage is None:
+                continue
+            column = parts[-1]
+            self.spellings[f"{table}.{_key(column)}"][_spelling(column)] += 1
+            self.profile[table][usage].add(_key(column))
+
+    def _bare_column(self, tokens: List[Tuple[str, str]], i: int, aliases: Dict[str, str]) -> bool:
+        text = tokens[i][1]
+        previous = tokens[i - 1][1].upper() if i else ""
+        following = tokens[i + 1][0] if i + 1 < len(tokens) else ""
+        return (
+            text.upper() not in _RESERVED
+            and _key(text) not in self.variables
+            and _key(text) not in aliases
+            and following != "open"
+            and previous != "AS"
+        )
+
+    def _classify(self, tokens: List[Tuple[str, str]], i: int, clause: str, aliases: Dict[str, str]) -> Optional[str]:
+        if clause == "select":
+            return "select"
+        function = self._enclosing_function(tokens, i)
+        if clause in ("group", "order"):
+            # ``ORDER BY SUM(fs.SalesAmount)`` reads the column rather than sorting on it.
+            return "select" if function and function not in _FUNCTIONS else clause
+        after = i + 1
+        if after + 1 < len(tokens) and tokens[after][0] == "cast":
+            after += 2
+        if after < len(tokens) and tokens[after][0] == "operator":
+            return self._comparison(tokens[after][1], tokens[after + 1] if after + 1 < len(tokens) else None, aliases)
+        if i >= 1 and tokens[i - 1][0] == "operator":
+            return self._comparison(tokens[i - 1][1], tokens[i - 2] if i >= 2 else None, aliases)
+        return _FUNCTIONS.get(function) if function else None
+
+    @staticmethod
+    def _comparison(operator: str, other: Optional[Tuple[str, str]], aliases: Dict[str, str]) -> Optional[str]:
+        if other and other[0] == "name" and "." in other[1] and _key(_parts(other[1])[-2]) in aliases:
+            return "join"
+        return _OPERATORS.get(_word(operator))
+
+    @staticmethod
+    def _enclosing_function(tokens: List[Tuple[str, str]], i: int) -> Optional[str]:
+        depth = 0
+        for j in range(i - 1, 0, -1):
+            kind = tokens[j][0]
+            if kind == "close":
+                depth += 1
+            elif kind == "open":
+                if depth == 0:
+                    return _word(tokens[j - 1][1]) if tokens[j - 1][0] == "name" else None
+                depth -= 1
+            elif kind in ("clause", "operator") and depth == 0:
+                return None
+        return None
+
+def scan_routine(code: str, spellings: Optional[Dict[str, Counter]] = None) -> Profile:
+    """Which columns of which tables one routine joins, filters, groups, sorts on and reads."""
+    scanner = _Scanner(_variables(_blank_comments(code)), spellings if spellings is not None else defaultdict(Counter))
+    for text in _streams(code):
+        scanner.scan(text)
+    return scanner.profile
+
+# =============================================================================
+# Recommendation
+# =============================================================================
+
+# How much an index helps a routine that uses a column this way.
+WEIGHTS = {"equality": 3, "range": 2, "join": 2, "group": 1, "order": 1, "select": 0}
+MAX_KEY_COLUMNS = 4
+MAX_INCLUDE_COLUMNS = 6
+MAX_PER_TABLE = 3
+
+@dataclass
+class IndexRecommendation:
+    table: str
+    key_columns: List[str]
+    include_columns: List[str]
+    score: int
+    routines: List[str]
+    reason: str
+    ddl: Dict[str, str]
+
+@dataclass
+class ColumnUsage:
+    table: str
+    column: str
+    weight: int
+    routines: int
+    equality: int
+    range: int
+    join: int
+    group: int
+    order: int
+    select: int
+
+@dataclass
+class WorkloadAdvice:
+    routines: int
+    dialects: Dict[str, int]
+    recommendations: List[IndexRecommendation]
+    columns: List[ColumnUsage]
+    seconds: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+@dataclass
+class _Candidate:
+    table: str
+    key: Tuple[str, ...]
+    score: int = 0
+    routines: Set[int] = field(default_factory=set)
+    covering: Counter = field(default_factory=Counter)
+    usage: Dict[str, str] = field(default_factory=dict)
+
+def _primary_key(table: str, column: str) -> bool:
+    """Conventional surrogate keys (``id``, ``ProductID`` on ``DimProduct``) are already indexed."""
+    base = re.sub(r"^(?:dim|fact|tbl)_?", "", table)
+    return column in ("id", f"{table}id", f"{base}id", f"{table}_id", f"{base}_id")
+
+class _Workload:
+    """Column usage across every routine, and the candidate indexes it suggests."""
+
+    def __init__(self):
+        self.usage: Dict[Tuple[str, str], Dict[str, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        self.profiles: List[Profile] = []
+
+    def add(self, profile: Profile) -> None:
+        number = len(self.profiles)
+        self.profiles.append(profile)
+        for table, kinds in profile.items():
+            for kind, columns in kinds.items():
+                for column in columns:
+                    self.usage[(table, column)][kind].add(number)
+
+    def weight(self, table: str, column: str) -> int:
+        return sum(WEIGHTS[kind] * len(routines) for kind, routines in self.usage[(table, column)].items())
+
+    def _ranked(self, table: str, columns: Iterable[str]) -> List[str]:
+        return sorted(columns, key=lambda column: (-self.weight(table, column), column))
+
+    def candidates(self) -> List[_Candidate]:
+        merged: Dict[Tuple[str, Tuple[str, ...]], _Candidate] = {}
+        for number, profile in enumerate(self.profiles):
+            for table, kinds in profile.items():
+                for key, score, usage in self._wanted(table, kinds):
+                    if _primary_key(table, key[0]):
+                        continue
+                    candidate = merged.setdefault((table, key), _Candidate(table, key))
+                    candidate.score += score
+                    candidate.routines.add(number)
+                    for column in usage:
+                        candidate.usage.setdefault(column, usage[column])
+                    reads = set().union(*kinds.values()) - set(key)
+                    candidate.covering.update(reads)
+        return self._fold(list(merged.values()))
+
+    def _wanted(self, table: str, kinds: Dict[str, Set[str]]) -> Iterator[Tuple[Tuple[str, ...], int, Dict[str, str]]]:
+        """Index keys that would serve one routine's use of ``table``: equality columns, then one range column."""
+        # A column also compared by range (optional filters often do both) goes last with the ranges.
+        ranged = kinds.get("range", set())
+        equality = self._ranked(table, kinds.get("equality", set()) - ranged)[:MAX_KEY_COLUMNS - 1]
+        ranges = self._ranked(table, ranged)
+        if equality or ranges:
+            key = tuple(equality + ranges[:1])
+            usage = {column: "equality" for column in equality}
+            usage.update({column: "range" for column in ranges[:1]})
+            yield key, sum(WEIGHTS[usage[column]] for column in key), usage
+            return
+        # Joined but not filtered: an index on the join key lets the other side drive a nested loop.
+        for column in self._ranked(table, kinds.get("join", ())):
+            yield (column,), WEIGHTS["join"] // 2, {column: "join"}
+
+    @staticmethod
+    def _fold(candidates: List[_Candidate]) -> List[_Candidate]:
+        """Fold an index into a longer one with the same leading columns, which serves it as well."""
+        candidates.sort(key=lambda candidate: (len(candidate.key), candidate.table, candidate.key))
+        kept: List[_Candidate] = []
+        for position, candidate in enumerate(candidates):
+            wider = [
+                other for other in candidates[position + 1:]
+                if other.table == candidate.table and len(other.key) > len(candidate.key)
+                and other.key[:len(candidate.key)] == candidate.key
+            ]
+            if not wider:
+                kept.append(candidate)
+                continue
+            target = max(wider, key=lambda other: (other.score, other.key))
+            target.score += candidate.score
+            target.routines |= candidate.routines
+            target.covering.update(candidate.covering)
+            for column, usage in candidate.usage.items():
+                target.usage.setdefault(column, usage)
+        return kept
+
+    def columns(self) -> List[ColumnUsage]:
+        rows = []
+        for (table, column), kinds in self.usage.items():
+            counts = {kind: len(kinds.get(kind, ())) for kind in USAGES}
+            routines = len(set().union(*kinds.values()))
+            rows.append(ColumnUsage(table, column, self.weight(table, column), routines, **counts))
+        return sorted(rows, key=lambda row: (-row.weight, row.table, row.column))
+
+def _reason(candidate: _Candidate, names: Dict[str, str]) -> str:
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for column in candidate.key:
+        groups[candidate.usage.get(column, "join")].append(names[column])
+    described = [
+        f"{label} on {', '.join(groups[usage])}"
+        for usage, label in (("equality", "equality"), ("range", "range"), ("join", "join"))
+        if groups[usage]
+    ]
+    count = len(candidate.routines)
+    summary = " and ".join(described)
+    return f"{summary[:1].upper()}{summary[1:]} in {count} routine{'s' if count != 1 else ''}"
+
+# =============================================================================
+# DDL
+# =============================================================================
+
+DIALECTS = ["sqlserver", "postgresql", "mysql"]
+
+def _index_name(table: str, key: List[str], dialect: str) -> str:
+    name = re.sub(r"\W", "_", "_".join(["IX", table, *key]))
+    if len(name) > 60:
+        name = f"{name[:51]}_{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+    return name.lower() if dialect == "postgresql" else name
+
+def index_ddl(table: str, key: List[str], include: List[str], dialect: str) -> str:
+    """CREATE INDEX for one dialect. MySQL has no INCLUDE, so covering columns trail the key there."""
+    name = _index_name(table, key, dialect)
+    if dialect == "sqlserver":
+        statement = f"CREATE NONCLUSTERED INDEX {name} ON dbo.{table} ({', '.join(key)})"
+        return statement + (f" INCLUDE ({', '.join(include)});" if include else ";")
+    if dialect == "postgresql":
+        table, key, include = table.lower(), [c.lower() for c in key], [c.lower() for c in include]
+        statement = f"CREATE INDEX {name} ON {table} ({', '.join(key)})"
+        return statement + (f" INCLUDE ({', '.join(include)});" if include else ";")
+    return f"CREATE INDEX {name} ON {table} ({', '.join(key + include)});"
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def advise(
+    routines: Iterable[Tuple[str, str, Optional[str]]],
+    targets: Optional[List[str]] = None,
+    max_indexes: int = 10,
+) -> WorkloadAdvice:
+    """Recommend up to ``max_indexes`` indexes for ``(name, code, dialect)`` routines.
+
+    DDL is given for ``targets``, defaulting to the dialects found in the workload.
+    """
+    started = time.perf_counter()
+    workload = _Workload()
+    spellings: Dict[str, Counter] = defaultdict(Counter)
+    names: List[str] = []
+    dialects: Counter = Counter()
+    for name, code, dialect in routines:
+        names.append(name)
+        dialects[dialect or "unknown"] += 1
+        workload.add(scan_routine(code, spellings))
+
+    def spelled(key: str) -> str:
+        return spellings[key].most_common(1)[0][0] if spellings.get(key) else key
+
+    targets = targets or [dialect for dialect in DIALECTS if dialect in dialects] or DIALECTS
+    per_table: Counter = Counter()
+    recommendations = []
+    ranked = sorted(workload.candidates(), key=lambda c: (-c.score, -len(c.routines), c.table, c.key))
+    for candidate in ranked:
+        if len(recommendations) >= max_indexes:
+            break
+        if per_table[candidate.table] >= MAX_PER_TABLE:
+            continue
+        per_table[candidate.table] += 1
+        table = candidate.table
+        columns = {column: spelled(f"{table}.{column}") for column in set(candidate.key) | set(candidate.covering)}
+        key = [columns[column] for column in candidate.key]
+        covering = sorted(
+            (column for column in candidate.covering if column not in candidate.key),
+            key=lambda column: (-candidate.covering[column], -workload.weight(table, column), column),
+        )
+        include = [columns[column] for column in covering[:MAX_INCLUDE_COLUMNS]]
+        recommendations.append(IndexRecommendation(
+            table=spelled(table),
+            key_columns=key,
+            include_columns=include,
+            score=candidate.score,
+            routines=sorted({names[number] for number in candidate.routines}),
+            reason=_reason(candidate, columns),
+            ddl={dialect: index_ddl(spelled(table), key, include, dialect) for dialect in targets},
+        ))
+    columns = workload.columns()
+    for row in columns:
+        row.column = spelled(f"{row.table}.{row.column}")
+        row.table = spelled(row.table)
+    return WorkloadAdvice(
+        routines=len(names),
+        dialects=dict(dialects),
+        recommendations=recommendations,
+        columns=columns,
+        seconds=round(time.perf_counter() - started, 3),
+    )
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+def sql_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".sql"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def load_workload(paths: List[str], dialect: Optional[str] = None) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """``(name, code, dialect)`` for every routine in the files; a file without routines counts as one."""
+    from main import detect_dialect, is_procedure_or_function
+    from migrate import iter_routines, open_dump
+
+    for path in sql_files(paths):
+        with open_dump(path) as handle:
+            source = dialect or detect_dialect(handle.read(65536))
+            handle.seek(0)
+            found = False
+            if source:
+                for routine in iter_routines(handle, source, is_procedure_or_function):
+                    found = True
+                    yield routine.name, routine.sql, source
+            if not found:
+                handle.seek(0)
+                yield os.path.splitext(os.path.basename(path))[0], handle.read(), source
+
+def print_advice(advice: WorkloadAdvice) -> None:
+    dialects = ", ".join(f"{count} {dialect}" for dialect, count in sorted(advice.dialects.items()))
+    print(f"{advice.routines} routines ({dialects}) analyzed in {advice.seconds:.2f}s")
+    if not advice.recommendations:
+        print("No index recommendations.")
+    for number, recommendation in enumerate(advice.recommendations, start=1):
+        print(f"\n{number}. {recommendation.table} ({', '.join(recommendation.key_columns)})"
+              f" score {recommendation.score}: {recommendation.reason}")
+        if recommendation.include_columns:
+            print(f"   Covers: {', '.join(recommendation.include_columns)}")
+        print(f"   Helps: {', '.join(recommendation.routines)}")
+        for ddl in recommendation.ddl.values():
+            print(f"   {ddl}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="SQL files, dumps or directories of .sql files")
+    parser.add_argument("--dialect", choices=DIALECTS, help="source dialect (detected per file by default)")
+    parser.add_argument("--target", choices=DIALECTS, action="append", help="dialect to write DDL for (repeatable)")
+    parser.add_argument("--max-indexes", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print the full advice as JSON")
+    args = parser.parse_args()
+    result = advise(load_workload(args.paths, args.dialect), args.target, args.max_indexes)
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+    else:
+        print_advice(result)
+    sys.exit(0)
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+# =============================================================================
+# Persistent Job Queue
+# =============================================================================
+#
+# Jobs and their items live in SQLite, so queued work survives a restart.
+# Several processes (uvicorn --workers, a rolling restart) may share one
+# database: a claimed item is leased to its process, which renews the lease
+# while it works on it. Only items whose lease expired, because their process
+# died, go back to the queue. Transient failures (rate limits, timeouts) are
+# queued again with a backoff. An item is given up after ``max_attempts`` tries.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class TransientError(Exception):
+    """A failure worth retrying later (upstream rate limit, overload or timeout)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class JobStore:
+    """SQLite-backed jobs and per-item state. All methods are blocking."""
+
+    def __init__(self, db_path: str, max_attempts: int = 3, lease_seconds: float = 60.0):
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        # Identifies this process's leases.
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        if db_path != ":memory:":
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: claims use explicit BEGIN IMMEDIATE transactions.
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " total INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            " job_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " source_code TEXT NOT NULL,"
+            " source_type TEXT NOT NULL,"
+            " target_type TEXT NOT NULL,"
+            " bypass_cache INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT,"
+            " error TEXT,"
+            " queued_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " owner TEXT,"
+            " lease_until REAL NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (job_id, idx))"
+        )
+        self._add_missing_columns()
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status, queued_at)")
+
+    def _add_missing_columns(self) -> None:
+        """Upgrade a database created before leases existed; its running items count as expired."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(job_items)")}
+            for column, definition in (
+                ("owner", "TEXT"), ("lease_until", "REAL NOT NULL DEFAULT 0"), ("available_at", "REAL NOT NULL DEFAULT 0"),
+            ):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE job_items ADD COLUMN {column} {definition}")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def create(self, items: Sequence[Dict[str, Any]]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO jobs (id, total, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (job_id, len(items), now, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO job_items (job_id, idx, source_code, source_type, target_type, bypass_cache,"
+                    " status, queued_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (job_id, index, item["source_code"], item["source_type"], item["target_type"],
+                         int(bool(item.get("bypass_cache"))), QUEUED, now, now)
+                        for index, item in enumerate(items)
+                    ],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def _requeue_expired(self, now: float) -> int:
+        cursor = self._db.execute(
+            "UPDATE job_items SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND lease_until < ?",
+            (QUEUED, now, RUNNING, now),
+        )
+        return max(cursor.rowcount, 0)
+
+    def requeue_interrupted(self) -> int:
+        """Put items whose process died (their lease expired) back on the queue."""
+        with self._lock:
+            return self._requeue_expired(time.time())
+
+    def renew_leases(self) -> int:
+        """Extend the leases on every item this process is working on."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE job_items SET lease_until = ? WHERE owner = ? AND status = ?",
+                (now + self.lease_seconds, self.owner, RUNNING),
+            )
+        return max(cursor.rowcount, 0)
+
+    def release(self) -> int:
+        """Requeue this process's items on shutdown, without counting the attempt."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE job_items SET status = ?, owner = NULL, lease_until = 0, attempts = MAX(attempts - 1, 0),"
+                " updated_at = ? WHERE owner = ? AND status = ?",
+                (QUEUED, time.time(), self.owner, RUNNING),
+            )
+        return max(cursor.rowcount, 0)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued item, or None if the queue is empty."""
+        claimed = None
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._requeue_expired(now)
+                while True:
+                    row = self._db.execute(
+                        "SELECT * FROM job_items WHERE status = ? AND available_at <= ?"
+                        " ORDER BY queued_at, job_id, idx LIMIT 1",
+                        (QUEUED, now),
+                    ).fetchone()
+                    if row is None:
+                        break
+                    attempts = row["attempts"] + 1
+                    if attempts <= self.max_attempts:
+                        self._db.execute(
+                            "UPDATE job_items SET status = ?, attempts = ?, owner = ?, lease_until = ?, updated_at = ?"
+                            " WHERE job_id = ? AND idx = ?",
+                            (RUNNING, attempts, self.owner, now + self.lease_seconds, now, row["job_id"], row["idx"]),
+                        )
+                        claimed = {**dict(row), "status": RUNNING, "attempts": attempts, "owner": self.owner}
+                        break
+                    # Interrupted too many times (e.g. it keeps crashing the process): give up on it.
+                    self._db.execute(
+                        "UPDATE job_items SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND idx = ?",
+                        (FAILED, "Gave up after repeated interruptions", now, row["job_id"], row["idx"]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def finish(self, job_id: str, index: int, result: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """Record an item's outcome; False if its lease was lost to another process meanwhile."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, owner = NULL, updated_at = ?"
+                " WHERE job_id = ? AND idx = ? AND owner = ? AND status = ?",
+                (FAILED if error is not None else DONE, result, error, now, job_id, index, self.owner, RUNNING),
+            )
+            self._db.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+        return cursor.rowcount > 0
+
+    def retry(self, job_id: str, index: int, error: str, delay: float) -> bool:
+        """Queue an item again after ``delay`` seconds, keeping the error until it succeeds."""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE job_items SET status = ?, error = ?, owner = NULL, available_at = ?, updated_at = ?"
+                " WHERE job_id = ? AND idx = ? AND owner = ? AND status = ?",
+                (QUEUED, error, now + delay, now, job_id, index, self.owner, RUNNING),
+            )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str, include_items: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            items = []
+            if include_items:
+                items = [dict(row) for row in self._db.execute(
+                    "SELECT idx, source_type, target_type, status, attempts, result, error"
+                    " FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)
+                )]
+        finished = counts.get(DONE, 0) + counts.get(FAILED, 0)
+        if finished == job["total"]:
+            status = DONE
+        elif finished or counts.get(RUNNING):
+            status = RUNNING
+        else:
+            status = QUEUED
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": job["total"],
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "succeeded": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "items": items,
+        }
+
+# =============================================================================
+# Worker Pool
+# =============================================================================
+
+class JobRunner:
+    """A fixed pool of workers draining the job store in the background.
+
+    The pool is kept smaller than the LLM concurrency limit so interactive
+    requests always find upstream capacity while batch items drain.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict[str, Any]], Awaitable[str]], workers: int,
+                 poll_interval: float = 1.0, retry_base_seconds: float = 5.0, retry_max_seconds: float = 300.0):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> int:
+        requeued = self.store.requeue_interrupted()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._heartbeat()))
+        return requeued
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand unfinished items straight back instead of waiting for their leases to expire.
+        await asyncio.to_thread(self.store.release)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            await asyncio.to_thread(self.store.renew_leases)
+
+    def notify(self) -> None:
+        """Wake idle workers after new items were queued."""
+        self._wakeup.set()
+
+    def retry_delay(self, attempts: int, retry_after: Optional[float]) -> float:
+        """Jittered exponential backoff, never shorter than the provider's Retry-After."""
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        return max(delay * random.uniform(0.5, 1.0), retry_after or 0.0)
+
+    async def _work(self) -> None:
+        while True:
+            item = await asyncio.to_thread(self.store.claim)
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                result = await self.handler(item)
+            except asyncio.CancelledError:
+                # Shutting down: stop() releases the item back to the queue.
+                raise
+            except TransientError as e:
+                error = str(e) or type(e).__name__
+                if item["attempts"] < self.store.max_attempts:
+                    delay = self.retry_delay(item["attempts"], e.retry_after)
+                    await asyncio.to_thread(self.store.retry, item["job_id"], item["idx"], error, delay)
+                else:
+                    await asyncio.to_thread(self.store.finish, item["job_id"], item["idx"], None, error)
+            except Exception as e:
+                await asyncio.to_thread(self.store.finish, item["job_id"], item["idx"], None, str(e) or type(e).__name__)
+            else:
+                await asyncio.to_thread(self.store.finish, item["job_id"], item["idx"], result, None)
@@ -0,0 +1,229 @@
+import asyncio
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Mapping, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+# =============================================================================
+# Backend Interface
+# =============================================================================
+
+@dataclass
+class Completion:
+    text: str
+    usage: Dict[str, int] = field(default_factory=dict)
+
+class RateLimited(Exception):
+    """The provider rejected a call for rate or capacity reasons (HTTP 429/503)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` or ``retry-after`` (seconds or an HTTP date)."""
+    headers = {key.lower(): value for key, value in headers.items()}
+    try:
+        if "retry-after-ms" in headers:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+class LLMBackend:
+    """A chat model the API can send prompts to."""
+
+    name = "base"
+    model_name = ""
+
+    async def complete(self, messages: List["BaseMessage"]) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, messages: List["BaseMessage"]) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+# =============================================================================
+# OpenAI Backend
+# =============================================================================
+
+class OpenAIBackend(LLMBackend):
+    """ChatOpenAI through LangChain's async interface."""
+
+    name = "openai"
+
+    def __init__(self, model_name: str, api_key: str, temperature: float = 0):
+        self.model_name = model_name
+        # Deferred: importing the OpenAI integration costs most of a second.
+        from langchain.chat_models import ChatOpenAI
+        # Retries are left to the scheduler, which backs off without holding a slot.
+        self.llm = ChatOpenAI(temperature=temperature, model_name=model_name, openai_api_key=api_key, max_retries=0)
+
+    @staticmethod
+    def _rate_limit_error(error: Exception) -> Optional[RateLimited]:
+        response = getattr(error, "response", None)
+        status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+        if status not in (429, 503):
+            return None
+        return RateLimited(str(error), parse_retry_after(getattr(response, "headers", None) or {}))
+
+    async def complete(self, messages: List["BaseMessage"]) -> Completion:
+        try:
+            result = await self.llm.agenerate([messages])
+        except Exception as e:
+            limited = self._rate_limit_error(e)
+            if limited is None:
+                raise
+            raise limited from e
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        return Completion(text=result.generations[0][0].message.content, usage=dict(usage))
+
+    async def stream(self, messages: List["BaseMessage"]) -> AsyncIterator[str]:
+        try:
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            limited = self._rate_limit_error(e)
+            if limited is None:
+                raise
+            raise limited from e
+
+# =============================================================================
+# Mock Backend
+# =============================================================================
+
+_MOCK_OUTPUTS = {
+    "postgresql": (
+        "CREATE OR REPLACE FUNCTION public.mock_conversion()\n"
+        "    RETURNS SETOF refcursor\n"
+        "    LANGUAGE 'plpgsql'\n"
+        "AS $BODY$\n"
+        "DECLARE\n"
+        "    cursor1 refcursor := 'main';\n"
+        "BEGIN\n"
+        "    OPEN cursor1 FOR SELECT 1;\n"
+        "    RETURN NEXT cursor1;\n"
+        "END;\n"
+        "$BODY$;"
+    ),
+    "sqlserver": (
+        "CREATE PROCEDURE [dbo].[MockConversion]\n"
+        "AS\n"
+        "BEGIN\n"
+        "    SET NOCOUNT ON;\n"
+        "    DECLARE @Sql NVARCHAR(MAX) = N'SELECT 1';\n"
+        "    EXEC sp_executesql @Sql;\n"
+        "END"
+    ),
+    "mysql": (
+        "DELIMITER $$\n"
+        "CREATE PROCEDURE `MockConversion`()\n"
+        "BEGIN\n"
+        "    SELECT 1;\n"
+        "END$$\n"
+        "DELIMITER ;"
+    ),
+}
+
+_MOCK_BLOCKS = {
+    "postgresql": "OPEN cursor{index} FOR SELECT {index} AS result_set;\nRETURN NEXT cursor{index};",
+    "sqlserver": (
+        "DECLARE @Sql{index} NVARCHAR(MAX) = N'SELECT {index} AS result_set';\n"
+        "EXEC sp_executesql @Sql{index};"
+    ),
+    "mysql": "SELECT {index} AS result_set;",
+}
+
+_TARGET = re.compile(r"\b(?:to|into)\s+(?:an?\s+)?(PostgreSQL|SQL\s?Server|MySQL)\b", re.I)
+_OPTIMIZE = re.compile(r"\bOptimize this\b")
+_BLOCK_INDEX = re.compile(r"for result set (\d+)")
+
+class MockBackend(LLMBackend):
+    """Offline stand-in returning canned output with realistic timing.
+
+    Each call waits a log-normally distributed time to first token, then
+    emits the completion at ``tokens_per_second``. Placeholders from
+    segmented prompts are echoed back so stitching still works. With
+    ``rate_limit_rpm`` set, calls over that many in a sliding minute are
+    rejected with a Retry-After, like the real provider.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self, latency_ms: float = 800, jitter: float = 0.3, tokens_per_second: float = 80, seed=None,
+        model_name: str = "mock", rate_limit_rpm: int = 0,
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_rpm = rate_limit_rpm
+        self.rejected = 0
+        self._calls: deque = deque()
+        self._random = random.Random(seed)
+
+    def _check_rate_limit(self) -> None:
+        if not self.rate_limit_rpm:
+            return
+        now = time.monotonic()
+        while self._calls and now - self._calls[0] >= 60:
+            self._calls.popleft()
+        if len(self._calls) >= self.rate_limit_rpm:
+            self.rejected += 1
+            raise RateLimited("mock rate limit exceeded", retry_after=60 - (now - self._calls[0]))
+        self._calls.append(now)
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def _respond(self, messages: List["BaseMessage"]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        placeholders = re.findall(r"--\s*<<RESULT SET \d+>>", prompt)
+        if placeholders and "placeholder comment of the form" in prompt:
+            unique = list(dict.fromkeys(placeholders))
+            return "BEGIN\n" + "\n".join(f"    {p}" for p in unique) + "\nEND"
+        target = _TARGET.search(prompt)
+        if target is None or _OPTIMIZE.search(prompt):
+            return "-- optimized by mock backend\nSELECT 1;"
+        dialect = target.group(1).lower().replace(" ", "")
+        block = _BLOCK_INDEX.search(prompt)
+        if block:
+            return _MOCK_BLOCKS[dialect].format(index=block.group(1))
+        return _MOCK_OUTPUTS[dialect]
+
+    def _first_token_delay(self) -> float:
+        return self.latency_ms / 1000 * self._random.lognormvariate(0, self.jitter)
+
+    async def complete(self, messages: List["BaseMessage"]) -> Completion:
+        self._check_rate_limit()
+        text = self._respond(messages)
+        completion_tokens = self._estimate_tokens(text)
+        await asyncio.sleep(self._first_token_delay() + completion_tokens / self.tokens_per_second)
+        prompt_tokens = sum(self._estimate_tokens(str(message.content)) for message in messages)
+        return Completion(text=text, usage={
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+
+    async def stream(self, messages: List["BaseMessage"]) -> AsyncIterator[str]:
+        self._check_rate_limit()
+        text = self._respond(messages)
+        await asyncio.sleep(self._first_token_delay())
+        for token in re.findall(r"\s*\S{1,4}", text):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield token
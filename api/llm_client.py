@@ -0,0 +1,163 @@
+import asyncio
+import random
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage
+from config import config
+from llm_backends import LLMBackend, MockBackend, OpenAIBackend, RateLimited
+from prompts import count_tokens
+from scheduler import RateLimitScheduler
+import metrics
+
+# =============================================================================
+# LLM Backend
+# =============================================================================
+
+_backends: Dict[str, LLMBackend] = {}
+_backend_lock = threading.Lock()
+
+def create_backend(name: str, model: str) -> LLMBackend:
+    if name == "mock":
+        return MockBackend(
+            latency_ms=config.MOCK_LLM_LATENCY_MS,
+            jitter=config.MOCK_LLM_JITTER,
+            tokens_per_second=config.MOCK_LLM_TOKENS_PER_SECOND,
+            model_name=model,
+            rate_limit_rpm=config.MOCK_LLM_RATE_LIMIT_RPM,
+        )
+    return OpenAIBackend(model_name=model, api_key=config.get_openai_key())
+
+def get_backend(model: Optional[str] = None) -> LLMBackend:
+    """Backend for ``model``, the smallest tier by default."""
+    model = model or config.LLM_MODEL_TIERS[0]
+    backend = _backends.get(model)
+    if backend is None:
+        with _backend_lock:
+            backend = _backends.get(model)
+            if backend is None:
+                backend = _backends[model] = create_backend(config.LLM_BACKEND, model)
+    return backend
+
+def set_backend(backend: LLMBackend, model: Optional[str] = None) -> None:
+    """Swap the backend for one model tier, e.g. for a mock in benchmarks."""
+    _backends[model or config.LLM_MODEL_TIERS[0]] = backend
+
+def backend_ready() -> bool:
+    return all(model in _backends for model in config.LLM_MODEL_TIERS)
+
+async def warmup() -> List[LLMBackend]:
+    """Build every tier's backend off the event loop so imports don't stall requests."""
+    return [await asyncio.to_thread(get_backend, model) for model in config.LLM_MODEL_TIERS]
+
+# =============================================================================
+# Upstream Calls
+# =============================================================================
+
+# Every upstream call goes through one scheduler: it caps concurrency, keeps
+# the API key within its RPM/TPM limits and lets interactive requests ahead
+# of batch work.
+scheduler = RateLimitScheduler(
+    config.LLM_MAX_CONCURRENCY,
+    rpm=config.LLM_RPM_LIMIT,
+    tpm=config.LLM_TPM_LIMIT,
+    burst_seconds=config.LLM_RATE_BURST_SECONDS,
+)
+
+def estimate_tokens(messages: List[BaseMessage]) -> Tuple[int, int]:
+    """(prompt, completion) tokens to reserve for a call.
+
+    The last message carries the code, and conversions come back roughly the
+    same size. The reservation is corrected once the real usage is known.
+    """
+    counts = [count_tokens(str(message.content)) + 4 for message in messages]
+    return sum(counts), (counts[-1] if counts else 0)
+
+def retry_delay(attempt: int, retry_after: Optional[float]) -> float:
+    """Backoff before retry ``attempt``: Retry-After when given, else capped exponential, both jittered."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, config.LLM_RETRY_BASE_SECONDS)
+    delay = min(config.LLM_RETRY_BASE_SECONDS * 2 ** attempt, config.LLM_RETRY_MAX_SECONDS)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _back_off(error: RateLimited, attempt: int, model: str) -> float:
+    delay = retry_delay(attempt, error.retry_after)
+    # Hold everyone back, not just this caller: the whole key is over its limit.
+    scheduler.pause(delay)
+    metrics.upstream_retries_total.inc({**metrics.request_labels(), "model": model})
+    return delay
+
+def _count_cancelled(model: str, tokens_saved: int) -> None:
+    labels = {**metrics.request_labels(), "model": model}
+    metrics.cancelled_calls_total.inc(labels)
+    metrics.cancelled_tokens_saved_total.inc(labels, max(tokens_saved, 0))
+
+async def call_llm(messages: List[BaseMessage], model: Optional[str] = None) -> str:
+    """Run one chat completion without blocking the event loop.
+
+    Calls wait for the scheduler (by priority, then arrival) and are retried
+    on rate-limit responses, up to ``LLM_MAX_RETRIES`` times. Cancelling the
+    caller aborts the upstream request and frees its slot and reservation.
+    """
+    backend = get_backend(model)
+    prompt, completion_estimate = estimate_tokens(messages)
+    reserved = prompt + completion_estimate
+    attempt = 0
+    while True:
+        saved = reserved
+        try:
+            async with metrics.track_upstream(backend.model_name) as usage:
+                async with scheduler.slot(reserved) as reservation:
+                    # Once sent, the prompt is billed; only the completion can still be saved.
+                    saved = completion_estimate
+                    reservation["tokens"] = prompt
+                    completion = await backend.complete(messages)
+                    reservation["tokens"] = completion.usage.get("total_tokens", reserved)
+                usage.update(completion.usage)
+            return completion.text.strip()
+        except asyncio.CancelledError:
+            _count_cancelled(backend.model_name, saved)
+            raise
+        except RateLimited as e:
+            if attempt >= config.LLM_MAX_RETRIES:
+                raise
+            await asyncio.sleep(_back_off(e, attempt, backend.model_name))
+            attempt += 1
+
+async def stream_llm(messages: List[BaseMessage], model: Optional[str] = None) -> AsyncIterator[str]:
+    """Yield completion tokens as the model produces them.
+
+    The scheduler slot is held until the stream is exhausted or closed; closing
+    it early aborts the upstream request. A rate-limited stream is retried
+    only if no token has been sent yet.
+    """
+    backend = get_backend(model)
+    prompt, completion_estimate = estimate_tokens(messages)
+    reserved = prompt + completion_estimate
+    attempt = 0
+    while True:
+        started = False
+        saved = reserved
+        try:
+            async with metrics.track_upstream(backend.model_name) as usage:
+                async with scheduler.slot(reserved) as reservation:
+                    # Streamed responses carry no usage block: record the prompt
+                    # estimate and count one completion token per chunk.
+                    usage["prompt_tokens"] = prompt
+                    usage["completion_tokens"] = 0
+                    try:
+                        async for chunk in backend.stream(messages):
+                            started = True
+                            usage["completion_tokens"] += 1
+                            yield chunk
+                    finally:
+                        reservation["tokens"] = prompt + usage["completion_tokens"]
+                        saved = completion_estimate - usage["completion_tokens"]
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            _count_cancelled(backend.model_name, saved)
+            raise
+        except RateLimited as e:
+            if started or attempt >= config.LLM_MAX_RETRIES:
+                raise
+            await asyncio.sleep(_back_off(e, attempt, backend.model_name))
+            attempt += 1
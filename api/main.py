@@ -1,18 +1,59 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+import asyncio
+import hashlib
+import json
 import os
 import re
-from typing import Literal
+import textwrap
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, AsyncIterator, Callable, Dict, List, Literal, Optional, Sequence, Tuple, TypeVar
 from config import config
+from cache import ConversionCache, cache_key, normalize_sql, prompt_version
+from transpiler import UnsupportedConstruct, transpile
+from singleflight import SingleFlight
+import metrics
+from segmenter import PLACEHOLDER, PLACEHOLDER_PATTERN, ProcedureSegments, routine_name, segment_procedure, stitch
+from fewshot import ExampleIndex
+from prompts import PromptRegistry
+from complexity import Complexity, score_complexity, select_tier
+from validation import apply_local_fixes, find_issues, splice
+from jobs import JobRunner, JobStore, TransientError
+from llm_backends import RateLimited
+from scheduler import set_priority
+from antipatterns import RULES_FINGERPRINT, Finding, find_antipatterns, render_findings
+from indexadvisor import advise
+from dynamicsql import has_dynamic_sql, unroll_dynamic_sql
+from families import FamilyConverter
 
 # =============================================================================
 # FastAPI App Configuration
 # =============================================================================
 
-app = FastAPI(title="SQL Converter API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Don't hold up startup: the app can serve liveness probes and local
+    # conversions while the LLM client is being built.
+    task = asyncio.ensure_future(warm_up()) if config.WARMUP_ENABLED and config_error is None else None
+    # Items whose process died (expired leases) are requeued before workers start.
+    requeued = job_runner.start()
+    if requeued:
+        print(f"Resumed {requeued} interrupted job item(s)")
+    yield
+    await job_runner.stop()
+    if task is not None and not task.done():
+        task.cancel()
+
+app = FastAPI(title="SQL Converter API", version="2.0.0", lifespan=lifespan)
 
 # CORS setup
 app.add_middleware(
@@ -27,271 +68,43 @@ app.add_middleware(
 # Environment Configuration
 # =============================================================================
 
-# Validate configuration on startup
+# Validate configuration on startup. A bad configuration is reported by
+# /readyz instead of killing the process before probes can see it.
+config_error: Optional[str] = None
 try:
     config.validate_config()
 except ValueError as e:
+    config_error = str(e)
     print(f"Configuration Error: {e}")
     print("Please create a .env file in the 'api' directory with your OpenAI API key.")
     print("Example: skj-XXXXXXXXXXXXX")
-    exit(1)
 
 # =============================================================================
-# Example Code Templates
+# Few-Shot Examples
 # =============================================================================
 
-example_pg_function = """
-CREATE OR REPLACE FUNCTION public.sales_summary_brands_by_sales_filters(
-    year integer,
-    month json,
-    store json,
-    state json,
-    channel json,
-    fromdate date,
-    todate date)
-    RETURNS SETOF refcursor 
-    LANGUAGE 'plpgsql'
-    COST 100
-    VOLATILE PARALLEL UNSAFE
-    ROWS 1000
-AS $BODY$
-DECLARE 
-    query1 refcursor := 'main';
-    months integer[];
-    stores text[];
-    states text[];
-    channels text[];
-BEGIN
-    -- Parse JSON arrays
-    IF month IS NULL OR month::jsonb = '["all"]'::jsonb THEN 
-        months := NULL;
-    ELSE
-        months := ARRAY(SELECT json_array_elements_text(month)::text);
-    END IF;
-    
-    IF store IS NULL OR store::jsonb = '["all"]'::jsonb THEN 
-        stores := NULL;
-    ELSE
-        stores := ARRAY(SELECT json_array_elements_text(store)::text);
-    END IF;
-    
-    IF state IS NULL OR state::jsonb = '["all"]'::jsonb THEN 
-        states := NULL;
-    ELSE
-        states := ARRAY(SELECT json_array_elements_text(state)::text);
-    END IF;
-    
-    IF channel IS NULL OR channel::jsonb = '["all"]'::jsonb THEN 
-        channels := NULL;
-    ELSE
-        channels := ARRAY(SELECT json_array_elements_text(channel)::text);
-    END IF;
-    
-    -- Override filters if date range provided
-    IF fromdate IS NOT NULL OR todate IS NOT NULL THEN
-        year := NULL;
-        months := NULL;
-    END IF;
-    
-    -- Main query
-    OPEN query1 FOR 
-    SELECT 
-        db.brandname AS y,
-        SUM(fs.salesamount) AS x,
-        currency_convert(SUM(fs.salesamount)) AS text,
-        db.brandid AS id,
-        'bar' AS type, 
-        'h' AS orientation
-    FROM factsales fs
-    INNER JOIN DimProduct dp ON fs.productid = dp.productid 
-    INNER JOIN DimBrand db ON db.brandid = dp.brandid
-    INNER JOIN dimdate dd ON fs.OrderDate = dd.calendar
-    INNER JOIN dimstore ds ON fs.storeid = ds.storeid
-    INNER JOIN dimregion dr ON dr.regionid = ds.regionid 
-    INNER JOIN dimchannel dc ON dc.channelid = fs.channelid
-    WHERE (year IS NULL OR dd.financialyear = year)
-        AND (months IS NULL OR date_part('MONTH', fs.OrderDate) = ANY(months))
-        AND (states IS NULL OR dr.level3value = ANY(states))
-        AND (stores IS NULL OR fs.storeid::text = ANY(stores))
-        AND (channels IS NULL OR fs.channelid::text = ANY(channels))
-        AND (fromdate IS NULL OR fs.OrderDate BETWEEN fromdate AND todate)
-    GROUP BY db.brandname, db.brandid 
-    ORDER BY x ASC;
-
-    RETURN NEXT query1;
-END;
-$BODY$;
-"""
+# Verified conversions live in api/examples/; prompts include only the
+# nearest one or two under a token budget instead of a fixed template.
+example_index = ExampleIndex(config.FEWSHOT_EXAMPLES_DIR)
 
-example_ssms_procedure = """
-CREATE PROCEDURE [dbo].[SALES_SUMMARY_BRANDS_BY_SALES_FILTERS](
-    @year INT = NULL, 
-    @month NVARCHAR(MAX) = NULL,
-    @fromdate DATE = NULL,
-    @todate DATE = NULL,
-    @store NVARCHAR(MAX) = NULL,
-    @state NVARCHAR(MAX) = NULL,
-    @channel NVARCHAR(MAX) = NULL,
-    @date DATE = NULL
-)
-AS
-BEGIN
-    SET NOCOUNT ON;
-
-    DECLARE @months NVARCHAR(MAX);
-    DECLARE @stores NVARCHAR(MAX);
-    DECLARE @states NVARCHAR(MAX);
-    DECLARE @channels NVARCHAR(MAX);
-    
-    -- Parse JSON-like strings
-    SET @months = REPLACE(REPLACE(REPLACE(@month, '"', ''), '[', ''), ']', '');
-    IF @months = 'all' SET @months = '0';
-    
-    SET @stores = REPLACE(REPLACE(REPLACE(@store, '"', ''''), '[', ''), ']', '');
-    IF @stores = '''all''' SET @stores = '0';
-    
-    SET @states = REPLACE(REPLACE(REPLACE(@state, '"', ''''), '[', ''), ']', '');
-    IF @states = '''all''' SET @states = '0';
-    
-    SET @channels = REPLACE(REPLACE(REPLACE(@channel, '"', ''), '[', ''), ']', '');
-    IF @channels = 'all' SET @channels = '0';
-    
-    -- Override filters if date range provided
-    IF @fromdate IS NOT NULL OR @todate IS NOT NULL OR @date IS NOT NULL
-    BEGIN
-        SET @year = '0';
-        SET @months = '0';
-    END;
-    
-    -- Dynamic SQL construction
-    DECLARE @Sql NVARCHAR(MAX) = N'
-    SELECT 
-        db.BrandName AS y,
-        SUM(fs.SalesAmount) AS x,
-        CASE 
-            WHEN SUM(fs.SalesAmount) < 99999 THEN ''$'' + FORMAT(SUM(fs.SalesAmount) / 1000, ''N2'') + ''K''
-            ELSE FORMAT(SUM(fs.SalesAmount), ''$0,,.00M'')
-        END AS text,
-        db.BrandId AS id,
-        ''bar'' AS type, 
-        ''h'' AS orientation
-    FROM FactSales fs WITH(NOLOCK)
-    INNER JOIN DimProduct dp WITH(NOLOCK) ON fs.ProductID = dp.ProductID
-    INNER JOIN DimBrand db WITH(NOLOCK) ON db.BrandId = dp.BrandId
-    INNER JOIN DimDate dd WITH(NOLOCK) ON dd.Calendar = fs.OrderDate
-    INNER JOIN DimStore ds WITH(NOLOCK) ON fs.StoreID = ds.StoreID
-    INNER JOIN DimRegion dr WITH(NOLOCK) ON dr.RegionID = ds.RegionID
-    INNER JOIN DimChannel dc WITH(NOLOCK) ON dc.ChannelID = fs.ChannelID
-    WHERE 1=1';
-    
-    -- Add conditional filters
-    IF @year IS NOT NULL AND @year != '0'
-        SET @Sql = @Sql + N' AND dd.FinancialYear = @year';
-    
-    IF @months IS NOT NULL AND @months != '0'
-        SET @Sql = @Sql + N' AND MONTH(fs.OrderDate) IN (' + @months + ')';
-    
-    IF @fromdate IS NOT NULL AND @todate IS NOT NULL
-        SET @Sql = @Sql + N' AND fs.OrderDate BETWEEN @fromdate AND @todate';
-    
-    IF @date IS NOT NULL
-        SET @Sql = @Sql + N' AND fs.OrderDate = @date';
-    
-    IF @states IS NOT NULL AND @states != '''0'''
-        SET @Sql = @Sql + N' AND dr.Level3Value IN (' + @states + ')';
-    
-    IF @stores IS NOT NULL AND @stores != '''0'''
-        SET @Sql = @Sql + N' AND ds.StoreID IN (' + @stores + ')';
-    
-    IF @channels IS NOT NULL AND @channels != '0'
-        SET @Sql = @Sql + N' AND fs.ChannelID IN (' + @channels + ')';
-    
-    SET @Sql = @Sql + N' GROUP BY db.BrandName, db.BrandId ORDER BY x ASC';
-    
-    -- Execute dynamic SQL
-    DECLARE @params NVARCHAR(MAX) = N'@year INT, @fromdate DATE, @todate DATE, @date DATE';
-    EXEC sp_executesql @Sql, @params, @year, @fromdate, @todate, @date;
-END
-"""
-
-example_mysql_procedure = """
-DELIMITER $$
-CREATE DEFINER=`mysql_sai_charan`@`%` PROCEDURE `SALES_SUMMARY_SALES_BY_PRODUCT_BEST_RANK_FILTERS`(
-IN year int , 
-IN month nvarchar(255) ,
-IN store nvarchar(4000),
-IN state nvarchar(4000),
-IN channel nvarchar(4000),
-IN product nvarchar(4000),
-IN fromdate date ,
-IN todate date 
-)
-BEGIN
-	DECLARE latestdate date;
-    DECLARE maxdate date;
-    DECLARE latestmonth date;
-	DECLARE length int;
-    DECLARE lastyear date;
-	DECLARE FinancialYearStart date;
-        
-	SET month = REPLACE(REPLACE(REPLACE(REPLACE(month, '"', ''), '[', ''), ']', ''),'''','');
-    IF month = 'all' THEN
-		SET month = REPLACE(month, 'all', null);
-	END IF;
-    
-	SET store = REPLACE(REPLACE(REPLACE(store, '"', ''), '[', ''), ']', '');
-    IF store = 'all' THEN
-		SET store = REPLACE(store, 'all', null);
-	END IF;
-    
-    SET state = REPLACE(REPLACE(REPLACE(state, '"', ''), '[', ''), ']', '');
-    IF state = 'all' THEN
-		SET state = REPLACE(state, 'all', null);
-	END IF;
-    
-    SET channel = REPLACE(REPLACE(REPLACE(channel, '"', ''), '[', ''), ']', '');
-    IF channel = 'all' THEN
-		SET channel = REPLACE(channel, 'all', null);
-	END IF; 
-
-	SET product = REPLACE(REPLACE(REPLACE(product, '"', ''), '[', ''), ']', '');
-    IF product = 'all' THEN
-		SET product = REPLACE(product, 'all', null);
-	END IF; 
-
-    
-    if fromdate is not null or todate is not null then
-			set year = null;
-			set month = null;
-	end if;
-
-	
-
-	with cte as
-	(
-		SELECT dp.ProductID as ProductID,
-		DENSE_RANK() OVER (ORDER BY sum(fs.Salesamount) DESC) AS SalesByYear
-		FROM FactSales fs
-		inner join DimStore ds on fs.StoreID = ds.StoreID
-		inner join DimRegion dr on dr.RegionID = ds.RegionID
-		inner join DimChannel dc on dc.ChannelID = fs.ChannelID
-		inner join DimDate dd on dd.Calendar = fs.OrderDate
-		inner join DimProduct dp on dp.ProductID = fs.ProductID
-		where (dd.FinancialYear = year OR year IS NULL)
-			and (FIND_IN_SET(MONTH(fs.OrderDate), month) OR month IS NULL)
-    		and (FIND_IN_SET(ds.StoreID, store) OR store IS NULL)
-    		and (FIND_IN_SET(dr.Level3Value, state) OR state IS NULL)
-    	and (FIND_IN_SET(fs.ChannelID, channel) OR channel IS NULL)
-    	and (fs.OrderDate BETWEEN fromdate AND todate OR fromdate IS NULL OR todate IS NULL)
-		GROUP BY dp.ProductID,dp.ProductName
-	)
-		SELECT SalesByYear as 'Best Ranking Till Date' from cte
-		where (FIND_IN_SET(ProductID, product) OR product IS NULL);
-
-
-END$$
-DELIMITER ;
-"""
+def render_examples(source_code: str, source_type: str, target_type: str) -> str:
+    """Reference conversions most similar to ``source_code``, formatted for a prompt."""
+    selected = example_index.select(
+        source_code, source_type, target_type,
+        config.FEWSHOT_MAX_EXAMPLES, config.FEWSHOT_TOKEN_BUDGET, config.FEWSHOT_MIN_SIMILARITY,
+    )
+    if not selected:
+        return ""
+    source_name, target_name = DIALECT_NAMES[source_type], DIALECT_NAMES[target_type]
+    parts = [f"Use these reference conversions to {target_name} as a guide for structure and style:"]
+    for number, item in enumerate(selected, start=1):
+        if item.source_code:
+            parts.append(f"--------------------------- EXAMPLE {number} {source_name.upper()} INPUT ---------------------------")
+            parts.append(item.source_code)
+        parts.append(f"--------------------------- EXAMPLE {number} {target_name.upper()} OUTPUT ---------------------------")
+        parts.append(item.target_code)
+    parts.append("--------------------------- EXAMPLES END -----------------------------")
+    return "\n".join(parts)
 
 # =============================================================================
 # Pydantic Models
@@ -301,29 +114,483 @@ class ConversionRequest(BaseModel):
     source_code: str
     source_type: Literal['sqlserver', 'postgresql', 'mysql']
     target_type: Literal['sqlserver', 'postgresql', 'mysql']
+    bypass_cache: bool = False
 
 class ConversionResponse(BaseModel):
     converted_code: str
     source_type: str
     target_type: str
 
+class BatchConversionRequest(BaseModel):
+    items: List[ConversionRequest]
+    max_parallelism: Optional[int] = None
+
+class BatchItemResult(BaseModel):
+    index: int
+    source_type: str
+    target_type: str
+    converted_code: Optional[str] = None
+    error: Optional[str] = None
+    # Index of the item whose conversion this one was derived from, if any (see families.py).
+    derived_from: Optional[int] = None
+
+class BatchConversionResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+class JobRequest(BaseModel):
+    items: List[ConversionRequest]
+
+class JobCreated(BaseModel):
+    job_id: str
+    total: int
+    status_url: str
+
+class JobItemStatus(BaseModel):
+    index: int
+    source_type: str
+    target_type: str
+    status: str
+    attempts: int
+    converted_code: Optional[str] = None
+    error: Optional[str] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    queued: int
+    running: int
+    succeeded: int
+    failed: int
+    created_at: float
+    updated_at: float
+    items: List[JobItemStatus] = []
+
+class FanoutRequest(BaseModel):
+    source_code: str
+    source_type: Literal['sqlserver', 'postgresql', 'mysql']
+    # Defaults to every other supported dialect.
+    target_types: Optional[List[Literal['sqlserver', 'postgresql', 'mysql']]] = None
+    bypass_cache: bool = False
+
+class FanoutTarget(BaseModel):
+    target_type: str
+    converted_code: Optional[str] = None
+    error: Optional[str] = None
+
+class SourceSummary(BaseModel):
+    routine_name: Optional[str] = None
+    is_procedure: bool
+    complexity_score: float
+    result_sets: int
+    cursors: int
+    dynamic_sql: int
+    model: str
+
+class FanoutResponse(BaseModel):
+    source_type: str
+    analysis: SourceSummary
+    results: List[FanoutTarget]
+    succeeded: int
+    failed: int
+
 class OptimizationRequest(BaseModel):
     sql_code: str
     sql_type: Literal['sqlserver', 'postgresql', 'mysql']
+    bypass_cache: bool = False
+    # 'unroll_dynamic_sql' parameterizes sp_executesql statements locally instead of calling the model.
+    mode: Literal['model', 'unroll_dynamic_sql'] = 'model'
+
+class AntiPattern(BaseModel):
+    rule: str
+    message: str
+    line: int
+    column: int
+    code: str
+    rewrite: str
+
+class QueryShapeModel(BaseModel):
+    conditions: List[str]
+    sql: str
+    parameters: List[str]
 
 class OptimizationResponse(BaseModel):
     optimized_code: str
+    findings: List[AntiPattern] = []
+    # Filled in by the 'unroll_dynamic_sql' mode.
+    query_shapes: List[QueryShapeModel] = []
+    shape_count: Optional[int] = None
+    changes: List[str] = []
+    notes: List[str] = []
+
+class AnalysisRequest(BaseModel):
+    sql_code: str
+    sql_type: Literal['sqlserver', 'postgresql', 'mysql']
+
+class AnalysisResponse(BaseModel):
+    findings: List[AntiPattern]
+
+class AdvisorRoutine(BaseModel):
+    sql_code: str
+    # Detected from the code when omitted.
+    sql_type: Optional[Literal['sqlserver', 'postgresql', 'mysql']] = None
+    name: Optional[str] = None
+
+class IndexAdviceRequest(BaseModel):
+    routines: List[AdvisorRoutine]
+    # Defaults to the dialects found among the routines.
+    target_types: Optional[List[Literal['sqlserver', 'postgresql', 'mysql']]] = None
+    max_indexes: int = 10
+
+class RecommendedIndex(BaseModel):
+    table: str
+    key_columns: List[str]
+    include_columns: List[str]
+    score: int
+    routines: List[str]
+    reason: str
+    ddl: Dict[str, str]
+
+class ColumnUsage(BaseModel):
+    table: str
+    column: str
+    weight: int
+    routines: int
+    equality: int
+    range: int
+    join: int
+    group: int
+    order: int
+    select: int
+
+class IndexAdviceResponse(BaseModel):
+    routines: int
+    dialects: Dict[str, int]
+    recommendations: List[RecommendedIndex]
+    columns: List[ColumnUsage]
+    seconds: float
 
 # =============================================================================
 # LangChain Configuration
 # =============================================================================
 
-llm = ChatOpenAI(
-    temperature=0,
-    model_name="gpt-4o-mini",
-    openai_api_key=config.get_openai_key()
+from llm_client import backend_ready, call_llm, stream_llm, warmup
+
+# =============================================================================
+# Prompt Templates
+# =============================================================================
+
+DIALECT_NAMES = {'sqlserver': 'SQL Server', 'postgresql': 'PostgreSQL', 'mysql': 'MySQL'}
+
+# Static system prompts and rules are rendered once here; per-request
+# examples and the user's SQL are appended after them at call time.
+prompt_registry = PromptRegistry()
+
+prompt_registry.register(
+    "convert_procedure:sqlserver:postgresql", 1,
+    system="You are an expert in SQL who specializes in converting SQL Server stored procedures to PostgreSQL functions. Provide only the converted code without any explanations.",
+    instructions="""
+    Convert the SQL Server stored procedure given at the end of this conversation into a PostgreSQL function using the rules below.
+
+    1. Use `CREATE OR REPLACE FUNCTION` syntax.
+    2. The PostgreSQL function **must define the same number of input parameters** as the SQL Server stored procedure. 
+       - Each parameter from SQL Server (e.g., `@year`, `@store`) should have a corresponding parameter in the PostgreSQL function.
+       - If SQL Server uses multiple individual parameters, do **not** collapse them into a single JSON input — keep one parameter per input as in the original.
+    3. Parse any array inputs (e.g., year, month) from JSON arrays using `json_array_elements_text(...)::INT` and aggregate them into PostgreSQL arrays using `ARRAY_AGG(...)`.
+    4. Treat `"all"` values as special: if a JSON input contains `"all"`, set the corresponding array to `NULL` to disable filtering.
+    5. If `fromdate` or `todate` is non-null, override `year` and `month` filters by setting those arrays to `NULL`.
+    6. Return `SETOF refcursor`. For each result set:
+       - Declare a cursor variable (e.g., `cursor1`, `cursor2`, etc.).
+       - Use `OPEN cursorX FOR SELECT ...` to assign the result.
+       - Use `RETURN NEXT cursorX;` to yield each result.
+    7. **Do NOT use `RETURN NEXT SELECT ...` — this is invalid syntax in PL/pgSQL. Always use `OPEN cursorX FOR ...` followed by `RETURN NEXT cursorX`.**
+    8. CTE Scope in Cursor Blocks:
+       PostgreSQL CTEs (e.g., cte1, cte2, cte4, etc.) are scoped only to the query in which they are defined.
+       If a CTE is used in multiple cursors (e.g., cte2 in both cursor1 and cursor2), then:
+       - You must duplicate the full CTE definition in each OPEN cursorX FOR block where it's needed.
+       - Do not exclude or skip any OPEN cursorX FOR queries. All declared cursors must remain and execute.
+       - Each cursor query must be fully self-contained. Never refer to a CTE from a previous cursor block.
+       - You are allowed (and expected) to repeat CTE definitions if multiple cursor queries use the same logic.
+    9. Replace SQL Server-specific syntax with PostgreSQL equivalents:
+       - Use `date_part('month', fs."OrderDate")` instead of `MONTH(fs.OrderDate)`.
+       - Use `= ANY(array_variable)` instead of `IN (...)`.
+       - Remove all `WITH (NOLOCK)` or other T-SQL-only constructs.
+    10. Do not use dynamic SQL (no `EXEC` or `sp_executesql`). Embed all logic inline.
+    11. When selecting multiple values into variables, use a **single `SELECT ... INTO var1, var2, ...`** — do not use multiple `INTO` clauses.
+    12. Add `LANGUAGE plpgsql VOLATILE COST 100 ROWS 1000` to the function signature.
+    13. Remove or replace any `dbo.` schema references — PostgreSQL does not use this convention.
+    14. All table names and column names in the PostgreSQL function must be in lowercase and Do not use double quotes if the names are already lowercase and contain no special characters or reserved words.
+    15. When converting JSON array parameters (e.g., month, year, etc.) into PostgreSQL arrays, use the simple := ARRAY(...) syntax with SELECT json_array_elements_text(...) instead of SELECT ARRAY_AGG(...) INTO ....
+
+    ### Output:
+    Return only the converted PostgreSQL function in clean, fully formatted PL/pgSQL. Ensure the function structure and behavior mirror the original procedure exactly.
+    """,
+    request="""
+    Now convert the following SQL Server stored procedure:
+
+    {code}
+    """,
+)
+
+prompt_registry.register(
+    "convert_procedure:postgresql:sqlserver", 1,
+    system="You are an expert in SQL who specializes in converting PostgreSQL functions to SQL Server stored procedures. Provide only the converted code without any explanations.",
+    instructions="""
+    Convert the PostgreSQL function given at the end of this conversation to a SQL Server stored procedure using these conversion rules:
+
+    1. Function to Procedure:
+    - Convert `CREATE OR REPLACE FUNCTION` to `CREATE PROCEDURE`.
+    - Replace `RETURNS SETOF refcursor` (used for returning multiple result sets) with dynamic scripting using `sp_executesql` in SQL Server.
+    - Do not use cursors in SQL Server — return the final result set via dynamic SELECT inside the procedure.
+
+    2. Parameter Conversion:
+    - Convert PostgreSQL `json` parameters to `nvarchar(max)` in SQL Server.
+    - Replace `json_array_elements_text(...)` with `REPLACE()`-based logic to clean the array-like JSON strings (remove brackets and quotes).
+    - Treat `"all"` as `'0'`, and use it to skip filtering (e.g., use `1=1`).
+
+    3. Array Handling:
+    - Convert `= ANY(array)` in PostgreSQL to `IN (...)` clause in SQL Server dynamic SQL.
+    - Use cleaned string lists (e.g., `'101','102'`) inside `IN (...)`.
+
+    4. Conditional Logic:
+    - Use `CASE WHEN ... THEN '1=1' ELSE actual condition` to simulate PostgreSQL's null and "all" checks.
+    - For dates:
+        - If `@fromdate` or `@todate` is NULL or empty, skip filtering.
+        - Otherwise, apply `OrderDate BETWEEN @fromdate AND @todate`.
+
+    5. Dynamic SQL:
+    - Construct the full SQL inside an `@sql` variable using string concatenation.
+    - Use `sp_executesql` with proper parameter declarations and values to execute the query securely.
+
+    6. Currency Formatting:
+    - Replace `currency_convert(sum(...))` in PostgreSQL with:
+        ```
+        CASE 
+        WHEN SUM(...) < 99999 THEN '$' + FORMAT(SUM(...)/1000, 'N2') + 'K'
+        ELSE FORMAT(SUM(...), '$0,,.00M')
+        END
+        ```
+    7. Output Handling:
+    - PostgreSQL refcursors (`OPEN query1 FOR ...; RETURN NEXT query1;`) should be replaced with just one dynamic query result in SQL Server.
+    - Do not declare or use cursors in SQL Server for this — all data should be returned as the result of the `sp_executesql` execution.
+
+    8. Boilerplate:
+    - Include `SET ANSI_NULLS ON`, `SET QUOTED_IDENTIFIER ON`, and `SET NOCOUNT ON`.
+    - Declare all variables at the top.
+
+    ### Output:
+    Return only the converted SQL Server stored procedure in clean, fully formatted T-SQL. Ensure the procedure structure and behavior mirror the original function exactly.
+    """,
+    request="""
+    Now convert the following PostgreSQL function:
+
+    {code}
+    """,
+)
+
+MYSQL_CONVERSION_RULES = """
+## MySQL Conversion Rules:
+
+1. Always include `DROP PROCEDURE IF EXISTS procedure_name;` before `CREATE PROCEDURE`.
+
+2. Use `DELIMITER $$` to wrap the procedure definition, and reset to `DELIMITER ;` at the end.
+
+3. Procedure parameters:
+- Convert SQL Server `@param` or PostgreSQL `param` to MySQL `IN p_param`
+- Use MySQL data types: `INT`, `DECIMAL`, `DATE`, `JSON`, etc.
+
+4. Variable declarations:
+- Use `DECLARE var_name TYPE DEFAULT value;`
+- All `DECLARE` statements (variables, cursors, handlers) must be placed at the **top of the BEGIN block**, before any logic.
+
+5. Avoid `SELECT ... INTO var` if the query may return multiple rows.
+- Use `LIMIT 1` if one row is expected, or use a `CURSOR` only if row-by-row logic is truly needed.
+- For multiple rows, use `SELECT` directly to return the result set.
+
+6. JSON Handling:
+- Use `JSON_EXTRACT(json_column, '$.key')` or `JSON_UNQUOTE()` for accessing values.
+
+7. Arrays:
+- Simulate arrays using JSON parameters and `IN (SELECT ...)` pattern.
+
+8. Date logic:
+- Use MySQL-compatible functions: `YEAR()`, `MONTH()`, `CURDATE()`, `DATE_SUB()`, `BETWEEN ... AND ...`
+
+9. String formatting:
+- Use `FORMAT(number, 2)` and `CONCAT()` for percentages, currencies, etc.
+
+10. Error handling:
+    - If needed, use `DECLARE EXIT HANDLER FOR SQLEXCEPTION` for basic exception capture.
+
+11. Replace unsupported syntax:
+    - Remove `RETURN`, `RETURN QUERY`, `LANGUAGE plpgsql`, `refcursor`, `PERFORM`, etc.
+    - Replace `RAISE NOTICE` with `SELECT 'message';`
+
+12. Multiple result sets:
+    - Use multiple `SELECT` statements in sequence to simulate multiple cursors or result sets.
+
+13. Use MySQL conventions:
+    - Use PascalCase or camelCase for procedure names and identifiers.
+
+14. End the procedure with:
+    ```sql
+    END$$
+    DELIMITER ;
+    ```
+
+15. Final Requirements:
+    - Return a complete, syntactically correct MySQL stored procedure compatible with MySQL 8+.
+    - The output must be **clean, executable, and reflect the intent of the original procedure.**
+    - Avoid session-level variables like `@var`. Prefer local variables with `DECLARE`.
+
+### Output:
+Return only the fully formatted, converted MySQL stored procedure. No comments, explanations, or mixed formatting.
+"""
+
+def _register_mysql_target_prompts() -> None:
+    for source_type in ('sqlserver', 'postgresql'):
+        prompt_registry.register(
+            f"convert_procedure:{source_type}:mysql", 1,
+            system="You are an expert in SQL who specializes in converting SQL Server and PostgreSQL stored procedures into MySQL stored procedures. Provide only the converted code without any explanations.",
+            instructions=f"Convert the {source_type} code given at the end of this conversation into a MySQL stored procedure using the rules below.\n{MYSQL_CONVERSION_RULES}",
+            request=f"""
+            Now convert the following {source_type} code:
+
+            {{code}}
+            """,
+        )
+
+_register_mysql_target_prompts()
+
+prompt_registry.register(
+    "convert_procedure:mysql:sqlserver", 1,
+    system="You are an expert in SQL who specializes in converting MySQL stored procedures to SQL Server stored procedures. Provide only the converted code without any explanations.",
+    instructions="""
+    Key conversion rules for converting a MySQL stored procedure to SQL Server:
+    1. Remove DELIMITER syntax
+    2. Convert IN/OUT parameters to @parameters
+    3. Replace JSON functions with string manipulation
+    4. Use dynamic SQL with sp_executesql
+    5. Add SET NOCOUNT ON
+    6. Use PascalCase naming
+    7. Replace MySQL date functions with SQL Server equivalents
+
+    Return only the converted SQL Server stored procedure.
+    """,
+    request="""
+    Convert the following MySQL stored procedure to SQL Server:
+
+    {code}
+    """,
 )
 
+prompt_registry.register(
+    "convert_procedure:mysql:postgresql", 1,
+    system="You are an expert in SQL who specializes in converting MySQL stored procedures to PostgreSQL functions. Provide only the converted code without any explanations.",
+    instructions="""
+    Key conversion rules for converting a MySQL stored procedure to a PostgreSQL function:
+    1. Use CREATE OR REPLACE FUNCTION
+    2. Convert IN/OUT parameters to function parameters
+    3. Replace JSON functions with json_array_elements_text()
+    4. Use = ANY(array) for array operations
+    5. Replace MySQL date functions with PostgreSQL equivalents
+    6. Add LANGUAGE plpgsql VOLATILE COST 100 ROWS 1000
+    7. Use lowercase naming
+
+    Return only the converted PostgreSQL function.
+    """,
+    request="""
+    Convert the following MySQL stored procedure to PostgreSQL function:
+
+    {code}
+    """,
+)
+
+SEGMENT_BLOCK_RULES = {
+    'postgresql': (
+        "Open the result set with `OPEN cursor{index} FOR <query>;` followed by `RETURN NEXT cursor{index};`. "
+        "Use `date_part('month', ...)` instead of `MONTH(...)` and `= ANY(array_variable)` instead of `IN (...)`. "
+        "Do not use dynamic SQL. Use lowercase table and column names."
+    ),
+    'sqlserver': (
+        "Build the query in a local `NVARCHAR(MAX)` variable named `@Sql{index}` (declare it in the fragment) "
+        "and run it with `EXEC sp_executesql`, passing parameters through a `@Params{index}` declaration. "
+        "Use `IN (...)` instead of `= ANY(...)` and add `WITH(NOLOCK)` to every table."
+    ),
+    'mysql': (
+        "Emit the query as a plain `SELECT` statement terminated by `;`. "
+        "Use `FIND_IN_SET(...)` for comma-separated list filters and MySQL date functions."
+    ),
+}
+
+def _register_pair_prompts() -> None:
+    """Plain-query, result-set block and optimization prompts for every dialect."""
+    for source_type, source_name in DIALECT_NAMES.items():
+        for target_type, target_name in DIALECT_NAMES.items():
+            if source_type == target_type:
+                continue
+            prompt_registry.register(
+                f"convert_query:{source_type}:{target_type}", 1,
+                system=f"You are an expert in SQL conversion. Convert the following {source_type} SQL query to {target_type} SQL. Return only the converted query, do not wrap it in a procedure or function.",
+            )
+            prompt_registry.register(
+                f"convert_block:{source_type}:{target_type}", 1,
+                system=f"You are an expert in SQL who specializes in converting {source_name} stored procedure fragments to {target_name}. Provide only the converted code without any explanations.",
+                instructions=f"""
+                You will be shown an already converted {target_name} procedure whose result sets are still placeholders,
+                then the {source_name} code for one result set N, which replaces the line `{PLACEHOLDER.format(index='N')}`.
+
+                Rules:
+                1. Use the parameter and variable names exactly as they are declared in the converted procedure.
+                2. {SEGMENT_BLOCK_RULES[target_type].format(index='N')} (N is the result set number.)
+                3. Keep the filters, grouping and ordering of the original query.
+
+                Return only the converted fragment, not the surrounding procedure.
+                """,
+                request=f"""
+                Convert the following {source_name} code for result set {{index}}. It replaces the line `{{placeholder}}`:
+
+                {{code}}
+                """,
+            )
+        prompt_registry.register(
+            f"repair:{source_type}", 1,
+            system=f"You are an expert in {source_name}. Fix the SQL fragment you are given without any explanations.",
+            instructions=f"""
+            You will be shown a {source_name} routine for context, then one statement from it that failed validation,
+            with the problems found. Return only the corrected statement as a drop-in replacement: keep its variable,
+            cursor and column names, and do not repeat the rest of the routine.
+            """,
+            request="""
+            Problems found:
+            {problems}
+
+            Statement to fix:
+
+            {code}
+            """,
+        )
+        prompt_registry.register(
+            f"optimize:{source_type}", 2,
+            system=f"You are an expert in {source_type.upper()} optimization.",
+            instructions="""
+            Rewrite the code for better performance without changing its results, parameters or result sets.
+            When a static analysis of the code is included, apply its suggested rewrites where they keep the
+            results identical and fix any similar problems it missed.
+
+            Return only the optimized code with brief inline comments explaining key optimizations.
+            """,
+            request=f"""
+            Optimize this {source_type} code for better performance:
+
+            {{code}}
+            """,
+        )
+
+_register_pair_prompts()
+
 # =============================================================================
 # Conversion Functions
 # =============================================================================
@@ -340,355 +607,903 @@ def is_procedure_or_function(sql: str) -> bool:
         re.match(r"^create\s+(or\s+replace\s+)?function", sql)
     )
 
-def convert_sql_code(source_code: str, source_type: str, target_type: str) -> str:
-    """Convert SQL code between different database types."""
+_DIALECT_MARKERS = {
+    "sqlserver": [
+        r"@\w+", r"^\s*GO\s*$", r"\bWITH\s*\(\s*NOLOCK\b", r"\[dbo\]", r"\bN?VARCHAR\s*\(\s*MAX\b",
+        r"\bsp_executesql\b", r"\bSET\s+NOCOUNT\b", r"\bTOP\s*\(?\s*\d", r"\b(?:ISNULL|GETDATE|DATEADD)\s*\(",
+    ],
+    "postgresql": [
+        r"\$\w*\$", r"\bplpgsql\b", r"\brefcursor\b", r"::\s*\w", r"\bRETURNS\s+(?:SETOF|TABLE)\b",
+        r"\bCREATE\s+OR\s+REPLACE\s+FUNCTION\b", r":=", r"\bRAISE\b", r"\bILIKE\b",
+    ],
+    "mysql": [
+        r"^\s*DELIMITER\b", r"`\w+`", r"\bFIND_IN_SET\s*\(", r"\bIFNULL\s*\(", r"\bIN\s+p_\w+",
+        r"\bON\s+DUPLICATE\s+KEY\b", r"\bSIGNAL\s+SQLSTATE\b", r"\bENGINE\s*=", r"\bAUTO_INCREMENT\b",
+    ],
+}
+
+def detect_dialect(sql: str) -> Optional[str]:
+    """Best guess at the dialect of SQL code from its distinctive syntax; None without any evidence."""
+    scores = {
+        dialect: sum(1 for marker in markers if re.search(marker, sql, re.I | re.M))
+        for dialect, markers in _DIALECT_MARKERS.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] else None
+
+def transpile_locally(source_code: str, source_type: str, target_type: str) -> Optional[str]:
+    """Translate a plain query without the LLM, or return None to fall back to it."""
+    if not config.LOCAL_TRANSPILER_ENABLED or is_procedure_or_function(source_code):
+        return None
+    try:
+        return transpile(source_code, source_type, target_type)
+    except UnsupportedConstruct:
+        return None
+
+def prepare_source(source_code: str, source_type: str) -> str:
+    """Parameterize SQL Server dynamic SQL before conversion, so it converts as plain statements."""
+    if not config.DYNAMIC_SQL_UNROLL_ENABLED or source_type != "sqlserver" or not has_dynamic_sql(source_code):
+        return source_code
+    try:
+        return unroll_dynamic_sql(source_code, max_shapes=0).code
+    except UnsupportedConstruct:
+        return source_code
+
+def unroll_for_optimization(request: "OptimizationRequest") -> OptimizationResponse:
+    """Answer an 'unroll_dynamic_sql' optimization without the model."""
+    if request.sql_type != "sqlserver":
+        raise HTTPException(status_code=400, detail="Dynamic SQL unrolling supports sqlserver only")
+    try:
+        result = unroll_dynamic_sql(request.sql_code)
+    except UnsupportedConstruct as e:
+        raise HTTPException(status_code=400, detail=f"Cannot unroll dynamic SQL: {e}")
+    findings = [AntiPattern(**finding.to_dict()) for finding in find_antipatterns(result.code, request.sql_type)]
+    return OptimizationResponse(
+        optimized_code=result.code,
+        findings=findings,
+        query_shapes=[QueryShapeModel(**shape.to_dict()) for shape in result.shapes],
+        shape_count=result.shape_count,
+        changes=result.changes,
+        notes=result.notes,
+    )
+
+def build_conversion_messages(
+    source_code: str, source_type: str, target_type: str, notes: Sequence[str] = ()
+) -> List[BaseMessage]:
+    """Build the chat messages for converting SQL code between database types.
+
+    ``notes`` are extra instructions placed after the examples, before the SQL.
+    """
+    # Detect if input is a procedure/function or a plain query
+    if not is_procedure_or_function(source_code):
+        return prompt_registry.render(f"convert_query:{source_type}:{target_type}", source_code)
+
+    name = f"convert_procedure:{source_type}:{target_type}"
+    if name not in prompt_registry:
+        raise ValueError(f"Unsupported conversion: {source_type} to {target_type}")
+    examples = render_examples(source_code, source_type, target_type)
+    return prompt_registry.render(name, source_code, context=[examples, *notes])
+
+def build_skeleton_messages(segments: ProcedureSegments, source_type: str, target_type: str) -> List[BaseMessage]:
+    """Build messages converting a procedure whose result-set queries are placeholders."""
+    cursor_rule = ""
+    if target_type == 'postgresql':
+        names = ", ".join(f"cursor{i}" for i in range(1, len(segments.blocks) + 1))
+        cursor_rule = f"Declare one refcursor variable per placeholder, named {names}. "
+    note = f"""
+        In the procedure below, each result-set query has been replaced by a placeholder comment of the form
+        `{PLACEHOLDER.format(index='N')}`. Those queries are converted separately.
+        Keep every placeholder comment exactly once, on its own line, at the point where that result set is produced.
+        Do not write queries for the placeholders. {cursor_rule}Return only the converted {DIALECT_NAMES[target_type]} code.
+        """
+    return build_conversion_messages(segments.skeleton, source_type, target_type, notes=[textwrap.dedent(note).strip()])
+
+def build_block_messages(block: str, index: int, converted_skeleton: str, source_type: str, target_type: str) -> List[BaseMessage]:
+    """Build messages converting one result-set block to fit a converted skeleton."""
+    procedure = (
+        f"This is the already converted {DIALECT_NAMES[target_type]} procedure. Result sets are still placeholders:\n\n"
+        "--------------------------- PROCEDURE START ---------------------------\n"
+        f"{converted_skeleton}\n"
+        "--------------------------- PROCEDURE END -----------------------------"
+    )
+    return prompt_registry.render(
+        f"convert_block:{source_type}:{target_type}", block, context=[procedure],
+        index=index, placeholder=PLACEHOLDER.format(index=index),
+    )
+
+def tier_for(complexity: Complexity) -> int:
+    """Model tier for a complexity score (0 is the smallest model)."""
+    if not config.MODEL_ROUTING_ENABLED:
+        return 0
+    tier = select_tier(complexity.score, config.COMPLEXITY_TIER_THRESHOLDS)
+    return min(tier, len(config.LLM_MODEL_TIERS) - 1)
+
+def route_model(sql: str) -> int:
+    """Model tier for ``sql`` by local complexity score (0 is the smallest model)."""
+    return tier_for(score_complexity(sql, bool(is_procedure_or_function(sql))))
+
+@dataclass
+class SourceAnalysis:
+    """Everything about a source routine that does not depend on the target dialect."""
+    # The source as sent to the model, with SQL Server dynamic SQL unrolled.
+    source_code: str
+    is_procedure: bool
+    name: Optional[str]
+    complexity: Complexity
+    tier: int
+    result_sets: int = 0
+    # Result-set segmentation, when the procedure has enough blocks to convert separately.
+    segments: Optional[ProcedureSegments] = None
+    skeleton_tier: int = 0
+    block_tiers: List[int] = field(default_factory=list)
+
+def analyze_source(source_code: str, source_type: str) -> SourceAnalysis:
+    """Detect, score and segment the source once, for any number of targets.
+
+    CPU-bound; callers on the event loop run it in a thread, and only on a cache miss.
+    """
+    source_code = prepare_source(source_code, source_type)
+    is_procedure = bool(is_procedure_or_function(source_code))
+    complexity = score_complexity(source_code, is_procedure)
+    analysis = SourceAnalysis(
+        source_code=source_code,
+        is_procedure=is_procedure,
+        name=routine_name(source_code) if is_procedure else None,
+        complexity=complexity,
+        tier=tier_for(complexity),
+    )
+    if config.SEGMENTED_CONVERSION_ENABLED and is_procedure:
+        segments = segment_procedure(source_code, source_type)
+        analysis.result_sets = len(segments.blocks) if segments is not None else 0
+        if analysis.result_sets >= config.SEGMENT_MIN_BLOCKS:
+            analysis.segments = segments
+            analysis.skeleton_tier = route_model(segments.skeleton)
+            analysis.block_tiers = [route_model(block) for block in segments.blocks]
+    return analysis
+
+def build_repair_messages(code: str, fragment: str, problems: List[str], dialect: str) -> List[BaseMessage]:
+    """Build messages repairing one failing statement of ``code``."""
+    routine = (
+        "--------------------------- ROUTINE START ---------------------------\n"
+        f"{code}\n"
+        "--------------------------- ROUTINE END -----------------------------"
+    )
+    return prompt_registry.render(
+        f"repair:{dialect}", fragment, context=[routine],
+        problems="\n".join(f"- {problem}" for problem in problems),
+    )
+
+async def repair_output(code: str, dialect: str, is_procedure: bool, model: str) -> Tuple[str, List[str]]:
+    """Validate ``code`` and send only the failing statements back for repair.
+
+    Returns the (possibly repaired) code and the problems that remain.
+    """
+    code = apply_local_fixes(code, dialect)
+    issues = find_issues(code, dialect, is_procedure)
+    if not issues:
+        return code, []
+    rounds = config.REPAIR_MAX_ROUNDS if config.REPAIR_ENABLED else 0
+    for _ in range(rounds):
+        # Whole-routine problems cannot be fixed fragment by fragment; leave them to escalation.
+        if any(issue.span is None for issue in issues):
+            break
+        problems: Dict[Tuple[int, int], List[str]] = {}
+        for issue in issues:
+            problems.setdefault(issue.span, []).append(issue.message)
+        if len(problems) > config.REPAIR_MAX_FRAGMENTS:
+            break
+        repaired = await asyncio.gather(*(
+            call_llm(build_repair_messages(code, code[start:end], messages, dialect), model=model)
+            for (start, end), messages in problems.items()
+        ))
+        metrics.repaired_fragments_total.inc(metrics.request_labels(), len(problems))
+        code = splice(code, list(zip(problems, repaired)))
+        issues = find_issues(code, dialect, is_procedure)
+        if not issues:
+            metrics.repairs_total.inc({**metrics.request_labels(), "outcome": "repaired"})
+            return code, []
+    metrics.repairs_total.inc({**metrics.request_labels(), "outcome": "unrepaired"})
+    return code, [issue.message for issue in issues]
+
+async def call_routed(messages: List[BaseMessage], tier: int, dialect: str, is_procedure: bool) -> str:
+    """Call the model for ``tier``, repairing failing statements, and move up a tier if that is not enough."""
+    while True:
+        model = config.LLM_MODEL_TIERS[tier]
+        output = await call_llm(messages, model=model)
+        output, problems = await repair_output(output, dialect, is_procedure, model)
+        if not problems or not config.MODEL_ESCALATION_ENABLED or tier + 1 >= len(config.LLM_MODEL_TIERS):
+            return output
+        tier += 1
+        metrics.escalations_total.inc(
+            {**metrics.request_labels(), "from_model": model, "to_model": config.LLM_MODEL_TIERS[tier]}
+        )
+
+def _digest(sql: str) -> str:
+    # Whitespace and comment edits do not count as changes.
+    return hashlib.sha256(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+def skeleton_digest(segments: ProcedureSegments) -> str:
+    # Placeholders are comments, which normalization drops; keep their positions.
+    return _digest(PLACEHOLDER_PATTERN.sub(lambda m: f"<<RESULT SET {m.group(1)}>>", segments.skeleton))
+
+def block_map_key(name: Optional[str], source_type: str, target_type: str) -> Optional[str]:
+    """Key of the block map for the last conversion of this procedure and dialect pair."""
+    if name is None:
+        return None
+    return cache_key("block_map", name.lower(), source_type, target_type, PROMPT_VERSION)
+
+async def convert_segmented(
+    analysis: SourceAnalysis, source_type: str, target_type: str, previous: Optional[dict] = None
+) -> Optional[Tuple[str, dict]]:
+    """Convert the skeleton, then every result-set block concurrently, and stitch them.
+
+    With the block map of a previous conversion of the same procedure, an
+    unchanged skeleton is reused and only blocks whose source changed are
+    sent to the model. Any skeleton change converts everything again, since
+    each block is converted against the converted skeleton.
+
+    Returns the code and the new block map, or None if the model dropped or
+    duplicated a placeholder.
+    """
+    segments = analysis.segments
+    skeleton = skeleton_digest(segments)
+    if previous is not None and previous.get("skeleton") == skeleton:
+        converted_skeleton = previous["converted_skeleton"]
+        reusable = {(index, digest): code for index, digest, code in previous["blocks"]}
+    else:
+        converted_skeleton = await call_routed(
+            build_skeleton_messages(segments, source_type, target_type),
+            analysis.skeleton_tier, target_type, is_procedure=True,
+        )
+        reusable = {}
+
+    async def convert_block(index: int, block: str, digest: str) -> str:
+        code = reusable.get((index, digest))
+        metrics.segment_blocks_total.inc({**metrics.request_labels(), "outcome": "reused" if code else "converted"})
+        if code is not None:
+            return code
+        return await call_routed(
+            build_block_messages(block, index, converted_skeleton, source_type, target_type),
+            analysis.block_tiers[index - 1], target_type, is_procedure=False,
+        )
+
+    digests = [_digest(block) for block in segments.blocks]
+    converted_blocks = await asyncio.gather(*(
+        convert_block(index, block, digest)
+        for index, (block, digest) in enumerate(zip(segments.blocks, digests), start=1)
+    ))
+    converted_code = stitch(converted_skeleton, list(converted_blocks))
+    if converted_code is None:
+        return None
+    block_map = {
+        "skeleton": skeleton,
+        "converted_skeleton": converted_skeleton,
+        "blocks": [[index, digest, code] for index, (digest, code) in enumerate(zip(digests, converted_blocks), start=1)],
+    }
+    return converted_code, block_map
+
+async def generate_conversion(
+    key: str, source_code: str, source_type: str, target_type: str, reuse_blocks: bool = True,
+    analysis: Optional[SourceAnalysis] = None,
+) -> str:
+    """Run the model for a conversion cache miss and store the result.
+
+    Segmented procedures also store a block map under the procedure's name,
+    so the next edit of the same procedure only re-converts changed blocks.
+    """
+    analysis = analysis or await asyncio.to_thread(analyze_source, source_code, source_type)
+    converted_code = None
+    if analysis.segments is not None:
+        map_key = None
+        if config.INCREMENTAL_CONVERSION_ENABLED:
+            map_key = block_map_key(analysis.name, source_type, target_type)
+        previous = None
+        if map_key is not None:
+            stored = await conversion_cache.get(map_key, bypass=not reuse_blocks)
+            previous = json.loads(stored) if stored else None
+        result = await convert_segmented(analysis, source_type, target_type, previous)
+        if result is not None:
+            converted_code, block_map = result
+            if map_key is not None:
+                await conversion_cache.put(map_key, json.dumps(block_map))
+    if converted_code is None:
+        messages = build_conversion_messages(analysis.source_code, source_type, target_type)
+        converted_code = await call_routed(messages, analysis.tier, target_type, analysis.is_procedure)
+    await conversion_cache.put(key, converted_code)
+    return converted_code
+
+def rate_limited_error(action: str, error: RateLimited) -> HTTPException:
+    """429 for a call still rate-limited after every retry, passing on the provider's Retry-After."""
+    retry_after = max(int(error.retry_after or config.LLM_RETRY_BASE_SECONDS) + 1, 1)
+    return HTTPException(
+        status_code=429,
+        detail=f"{action} failed: upstream rate limit exceeded, retry later",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+async def convert_sql_code(
+    source_code: str, source_type: str, target_type: str, bypass_cache: bool = False,
+    analysis: Optional[SourceAnalysis] = None,
+) -> str:
+    """Convert SQL code between different database types.
+
+    Results are served from the conversion cache unless ``bypass_cache`` is set,
+    in which case the model is always called and the cached entry refreshed.
+    ``analysis`` lets callers converting one source to several targets share it.
+    """
     try:
         if source_type == target_type:
+            metrics.set_path("local")
             return source_code
 
-        # Detect if input is a procedure/function or a plain query
-        if not is_procedure_or_function(source_code):
-            # Plain query: use a simple prompt
-            messages = [
-                SystemMessage(
-                    content=f"You are an expert in SQL conversion. Convert the following {source_type} SQL query to {target_type} SQL. Return only the converted query, do not wrap it in a procedure or function."
-                ),
-                HumanMessage(
-                    content=source_code
-                )
-            ]
-            response = llm(messages)
-            return response.content.strip()
-
-        # Define conversion prompts based on source and target
-        if source_type == 'sqlserver' and target_type == 'postgresql':
-            messages = [
-                SystemMessage(
-                    content="You are an expert in SQL who specializes in converting SQL Server stored procedures to PostgreSQL functions. Provide only the converted code without any explanations."
-                ),
-                HumanMessage(
-                    content=f"""
-                    Convert the following SQL Server stored procedure into a PostgreSQL function using the rules below.
-                    
-                    Use this example PostgreSQL function as a reference for structure and style:
-                    
-                    --------------------------- EXAMPLE START ---------------------------
-                    {example_pg_function}
-                    --------------------------- EXAMPLE END -----------------------------
-                    
-                    Now convert the following SQL Server stored procedure:
-                    
-                    {source_code}
-
-                    1. Use `CREATE OR REPLACE FUNCTION` syntax.
-                    2. The PostgreSQL function **must define the same number of input parameters** as the SQL Server stored procedure. 
-                       - Each parameter from SQL Server (e.g., `@year`, `@store`) should have a corresponding parameter in the PostgreSQL function.
-                       - If SQL Server uses multiple individual parameters, do **not** collapse them into a single JSON input — keep one parameter per input as in the original.
-                    3. Parse any array inputs (e.g., year, month) from JSON arrays using `json_array_elements_text(...)::INT` and aggregate them into PostgreSQL arrays using `ARRAY_AGG(...)`.
-                    4. Treat `"all"` values as special: if a JSON input contains `"all"`, set the corresponding array to `NULL` to disable filtering.
-                    5. If `fromdate` or `todate` is non-null, override `year` and `month` filters by setting those arrays to `NULL`.
-                    6. Return `SETOF refcursor`. For each result set:
-                       - Declare a cursor variable (e.g., `cursor1`, `cursor2`, etc.).
-                       - Use `OPEN cursorX FOR SELECT ...` to assign the result.
-                       - Use `RETURN NEXT cursorX;` to yield each result.
-                    7. **Do NOT use `RETURN NEXT SELECT ...` — this is invalid syntax in PL/pgSQL. Always use `OPEN cursorX FOR ...` followed by `RETURN NEXT cursorX`.**
-                    8. CTE Scope in Cursor Blocks:
-                       PostgreSQL CTEs (e.g., cte1, cte2, cte4, etc.) are scoped only to the query in which they are defined.
-                       If a CTE is used in multiple cursors (e.g., cte2 in both cursor1 and cursor2), then:
-                       - You must duplicate the full CTE definition in each OPEN cursorX FOR block where it's needed.
-                       - Do not exclude or skip any OPEN cursorX FOR queries. All declared cursors must remain and execute.
-                       - Each cursor query must be fully self-contained. Never refer to a CTE from a previous cursor block.
-                       - You are allowed (and expected) to repeat CTE definitions if multiple cursor queries use the same logic.
-                    9. Replace SQL Server-specific syntax with PostgreSQL equivalents:
-                       - Use `date_part('month', fs."OrderDate")` instead of `MONTH(fs.OrderDate)`.
-                       - Use `= ANY(array_variable)` instead of `IN (...)`.
-                       - Remove all `WITH (NOLOCK)` or other T-SQL-only constructs.
-                    10. Do not use dynamic SQL (no `EXEC` or `sp_executesql`). Embed all logic inline.
-                    11. When selecting multiple values into variables, use a **single `SELECT ... INTO var1, var2, ...`** — do not use multiple `INTO` clauses.
-                    12. Add `LANGUAGE plpgsql VOLATILE COST 100 ROWS 1000` to the function signature.
-                    13. Remove or replace any `dbo.` schema references — PostgreSQL does not use this convention.
-                    14. All table names and column names in the PostgreSQL function must be in lowercase and Do not use double quotes if the names are already lowercase and contain no special characters or reserved words.
-                    15. When converting JSON array parameters (e.g., month, year, etc.) into PostgreSQL arrays, use the simple := ARRAY(...) syntax with SELECT json_array_elements_text(...) instead of SELECT ARRAY_AGG(...) INTO ....
-
-                    ### Output:
-                    Return only the converted PostgreSQL function in clean, fully formatted PL/pgSQL. Ensure the function structure and behavior mirror the original procedure exactly.
-                    """
-                )
-            ]
-        elif source_type == 'postgresql' and target_type == 'sqlserver':
-            messages = [
-                SystemMessage(
-                    content="You are an expert in SQL who specializes in converting PostgreSQL functions to SQL Server stored procedures. Provide only the converted code without any explanations."
-                ),
-                HumanMessage(
-                    content=f"""
-                    Convert the following PostgreSQL function to a SQL Server stored procedure using these conversion rules:
-
-                    Use this example SQL Server stored procedure as a reference for structure and style:
-
-                    --------------------------- EXAMPLE START ---------------------------
-                    {example_ssms_procedure}
-                    --------------------------- EXAMPLE END -----------------------------
-
-                    Now convert the following PostgreSQL function:
-
-                    {source_code}
-
-                    1. Function to Procedure:
-                    - Convert `CREATE OR REPLACE FUNCTION` to `CREATE PROCEDURE`.
-                    - Replace `RETURNS SETOF refcursor` (used for returning multiple result sets) with dynamic scripting using `sp_executesql` in SQL Server.
-                    - Do not use cursors in SQL Server — return the final result set via dynamic SELECT inside the procedure.
-
-                    2. Parameter Conversion:
-                    - Convert PostgreSQL `json` parameters to `nvarchar(max)` in SQL Server.
-                    - Replace `json_array_elements_text(...)` with `REPLACE()`-based logic to clean the array-like JSON strings (remove brackets and quotes).
-                    - Treat `"all"` as `'0'`, and use it to skip filtering (e.g., use `1=1`).
-
-                    3. Array Handling:
-                    - Convert `= ANY(array)` in PostgreSQL to `IN (...)` clause in SQL Server dynamic SQL.
-                    - Use cleaned string lists (e.g., `'101','102'`) inside `IN (...)`.
-
-                    4. Conditional Logic:
-                    - Use `CASE WHEN ... THEN '1=1' ELSE actual condition` to simulate PostgreSQL's null and "all" checks.
-                    - For dates:
-                        - If `@fromdate` or `@todate` is NULL or empty, skip filtering.
-                        - Otherwise, apply `OrderDate BETWEEN @fromdate AND @todate`.
-
-                    5. Dynamic SQL:
-                    - Construct the full SQL inside an `@sql` variable using string concatenation.
-                    - Use `sp_executesql` with proper parameter declarations and values to execute the query securely.
-
-                    6. Currency Formatting:
-                    - Replace `currency_convert(sum(...))` in PostgreSQL with:
-                        ```
-                        CASE 
-                        WHEN SUM(...) < 99999 THEN '$' + FORMAT(SUM(...)/1000, 'N2') + 'K'
-                        ELSE FORMAT(SUM(...), '$0,,.00M')
-                        END
-                        ```
-                    7. Output Handling:
-                    - PostgreSQL refcursors (`OPEN query1 FOR ...; RETURN NEXT query1;`) should be replaced with just one dynamic query result in SQL Server.
-                    - Do not declare or use cursors in SQL Server for this — all data should be returned as the result of the `sp_executesql` execution.
-
-                    8. Boilerplate:
-                    - Include `SET ANSI_NULLS ON`, `SET QUOTED_IDENTIFIER ON`, and `SET NOCOUNT ON`.
-                    - Declare all variables at the top.
-
-                    ### Output:
-                    Return only the converted SQL Server stored procedure in clean, fully formatted T-SQL. Ensure the procedure structure and behavior mirror the original function exactly.
-                    """
-                )
-            ]
-        elif target_type == 'mysql':
-            messages = [
-                SystemMessage(
-                    content="You are an expert in SQL who specializes in converting SQL Server and PostgreSQL stored procedures into MySQL stored procedures. Provide only the converted code without any explanations."
-                ),
-                HumanMessage(
-                    content=f"""
-                Convert the following {source_type} code into a MySQL stored procedure using the rules below.
-
-                Use this example MySQL stored procedure as a reference for structure and style:
-
-                --------------------------- EXAMPLE START ---------------------------
-                {example_mysql_procedure}
-                --------------------------- EXAMPLE END -----------------------------
-
-                Now convert the following {source_type} code:
-
-                {source_code}
-
-                ## MySQL Conversion Rules:
-
-                1. Always include `DROP PROCEDURE IF EXISTS procedure_name;` before `CREATE PROCEDURE`.
-
-                2. Use `DELIMITER $$` to wrap the procedure definition, and reset to `DELIMITER ;` at the end.
-
-                3. Procedure parameters:
-                - Convert SQL Server `@param` or PostgreSQL `param` to MySQL `IN p_param`
-                - Use MySQL data types: `INT`, `DECIMAL`, `DATE`, `JSON`, etc.
-
-                4. Variable declarations:
-                - Use `DECLARE var_name TYPE DEFAULT value;`
-                - All `DECLARE` statements (variables, cursors, handlers) must be placed at the **top of the BEGIN block**, before any logic.
-
-                5. Avoid `SELECT ... INTO var` if the query may return multiple rows.
-                - Use `LIMIT 1` if one row is expected, or use a `CURSOR` only if row-by-row logic is truly needed.
-                - For multiple rows, use `SELECT` directly to return the result set.
-
-                6. JSON Handling:
-                - Use `JSON_EXTRACT(json_column, '$.key')` or `JSON_UNQUOTE()` for accessing values.
-
-                7. Arrays:
-                - Simulate arrays using JSON parameters and `IN (SELECT ...)` pattern.
-
-                8. Date logic:
-                - Use MySQL-compatible functions: `YEAR()`, `MONTH()`, `CURDATE()`, `DATE_SUB()`, `BETWEEN ... AND ...`
-
-                9. String formatting:
-                - Use `FORMAT(number, 2)` and `CONCAT()` for percentages, currencies, etc.
-
-                10. Error handling:
-                    - If needed, use `DECLARE EXIT HANDLER FOR SQLEXCEPTION` for basic exception capture.
-
-                11. Replace unsupported syntax:
-                    - Remove `RETURN`, `RETURN QUERY`, `LANGUAGE plpgsql`, `refcursor`, `PERFORM`, etc.
-                    - Replace `RAISE NOTICE` with `SELECT 'message';`
-
-                12. Multiple result sets:
-                    - Use multiple `SELECT` statements in sequence to simulate multiple cursors or result sets.
-
-                13. Use MySQL conventions:
-                    - Use PascalCase or camelCase for procedure names and identifiers.
-
-                14. End the procedure with:
-                    ```sql
-                    END$$
-                    DELIMITER ;
-                    ```
-
-                15. Final Requirements:
-                    - Return a complete, syntactically correct MySQL stored procedure compatible with MySQL 8+.
-                    - The output must be **clean, executable, and reflect the intent of the original procedure.**
-                    - Avoid session-level variables like `@var`. Prefer local variables with `DECLARE`.
-
-                ### Output:
-                Return only the fully formatted, converted MySQL stored procedure. No comments, explanations, or mixed formatting.
-                   """ )    
-            ]
-        elif source_type == 'mysql':
-            # Convert MySQL to other databases
-            if target_type == 'sqlserver':
-                messages = [
-                    SystemMessage(
-                        content="You are an expert in SQL who specializes in converting MySQL stored procedures to SQL Server stored procedures. Provide only the converted code without any explanations."
-                    ),
-                    HumanMessage(
-                        content=f"""
-                        Convert the following MySQL stored procedure to SQL Server:
-                        
-                        {source_code}
-                        
-                        Use this SQL Server example as reference:
-                        {example_ssms_procedure}
-                        
-                        Key conversion rules:
-                        1. Remove DELIMITER syntax
-                        2. Convert IN/OUT parameters to @parameters
-                        3. Replace JSON functions with string manipulation
-                        4. Use dynamic SQL with sp_executesql
-                        5. Add SET NOCOUNT ON
-                        6. Use PascalCase naming
-                        7. Replace MySQL date functions with SQL Server equivalents
-                        
-                        Return only the converted SQL Server stored procedure.
-                        """
-                    )
-                ]
-            else:  # mysql to postgresql
-                messages = [
-                    SystemMessage(
-                        content="You are an expert in SQL who specializes in converting MySQL stored procedures to PostgreSQL functions. Provide only the converted code without any explanations."
-                    ),
-                    HumanMessage(
-                        content=f"""
-                        Convert the following MySQL stored procedure to PostgreSQL function:
-                        
-                        {source_code}
-                        
-                        Use this PostgreSQL example as reference:
-                        {example_pg_function}
-                        
-                        Key conversion rules:
-                        1. Use CREATE OR REPLACE FUNCTION
-                        2. Convert IN/OUT parameters to function parameters
-                        3. Replace JSON functions with json_array_elements_text()
-                        4. Use = ANY(array) for array operations
-                        5. Replace MySQL date functions with PostgreSQL equivalents
-                        6. Add LANGUAGE plpgsql VOLATILE COST 100 ROWS 1000
-                        7. Use lowercase naming
-                        
-                        Return only the converted PostgreSQL function.
-                        """
-                    )
-                ]
-        else:
-            raise ValueError(f"Unsupported conversion: {source_type} to {target_type}")
-        
-        response = llm(messages)
-        return response.content.strip()
+        local_code = transpile_locally(source_code, source_type, target_type)
+        if local_code is not None:
+            metrics.set_path("local")
+            return local_code
+
+        key = cache_key("convert", source_code, source_type, target_type, PROMPT_VERSION)
+        cached = await conversion_cache.get(key, bypass=bypass_cache)
+        if cached is not None:
+            metrics.set_path("cache")
+            return cached
+
+        # Identical requests already in flight share one upstream call.
+        return await in_flight.run(
+            key, lambda: generate_conversion(
+                key, source_code, source_type, target_type, reuse_blocks=not bypass_cache, analysis=analysis
+            )
+        )
         
+    except RateLimited as e:
+        raise rate_limited_error("Conversion", e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
 
-def optimize_sql_code(sql_code: str, sql_type: str) -> str:
-    """Optimize SQL code for the specified database type."""
+def build_optimization_messages(
+    sql_code: str, sql_type: str, findings: Optional[List[Finding]] = None
+) -> List[BaseMessage]:
+    """Build the chat messages for optimizing SQL code for a database type.
+
+    Anti-patterns found by the local analyzer go before the code, so the model
+    starts from concrete problems instead of generic advice. Callers that
+    already ran the analyzer pass its ``findings``.
+    """
+    if findings is None:
+        findings = find_antipatterns(sql_code, sql_type)
+    return prompt_registry.render(f"optimize:{sql_type}", sql_code, context=[render_findings(findings)])
+
+async def generate_optimization(
+    key: str, sql_code: str, sql_type: str, findings: Optional[List[Finding]] = None
+) -> str:
+    """Run the model for an optimization cache miss and store the result."""
+    if findings is None:
+        findings = await asyncio.to_thread(find_antipatterns, sql_code, sql_type)
+    messages = build_optimization_messages(sql_code, sql_type, findings)
+    optimized_code = await call_routed(
+        messages, route_model(sql_code), sql_type, bool(is_procedure_or_function(sql_code))
+    )
+    await conversion_cache.put(key, optimized_code)
+    return optimized_code
+
+async def optimize_sql_code(
+    sql_code: str, sql_type: str, bypass_cache: bool = False, findings: Optional[List[Finding]] = None
+) -> str:
+    """Optimize SQL code for the specified database type.
+
+    ``findings`` are the analyzer's results for ``sql_code``, when the caller already has them.
+    """
     try:
-        optimization_tips = {
-            'sqlserver': [
-                "Use SET NOCOUNT ON to reduce network overhead",
-                "Use indexed views for frequently reused logic",
-                "Use OPTION (RECOMPILE) for parameter sniffing issues",
-                "Avoid calling sp_executesql repeatedly in loops",
-                "Use TRY/CATCH for error handling"
-            ],
-            'postgresql': [
-                "Use EXPLAIN (ANALYZE, BUFFERS) to inspect query plans",
-                "Optimize JOIN order and use LATERAL joins",
-                "Use CTEs to break down complex queries",
-                "Set proper function volatility (IMMUTABLE, STABLE, VOLATILE)",
-                "Use jsonb over json for better performance"
-            ],
-            'mysql': [
-                "Use EXPLAIN FORMAT=JSON to analyze queries",
-                "Optimize JSON operations and avoid repeated JSON_EXTRACT calls",
-                "Use covering indexes on frequently filtered columns",
-                "Consider using temporary tables for complex operations",
-                "Use STRAIGHT_JOIN to enforce join order when needed"
-            ]
-        }
-        
-        tips = optimization_tips.get(sql_type, [])
-        
-        messages = [
-            SystemMessage(content=f"You are an expert in {sql_type.upper()} optimization."),
-            HumanMessage(content=f"""
-            Optimize this {sql_type} code for better performance:
-            
-            {sql_code}
-            
-            Focus on these {sql_type}-specific optimizations:
-            {chr(10).join(f"- {tip}" for tip in tips)}
-            
-            Return only the optimized code with brief inline comments explaining key optimizations.
-            """)
-        ]
-        
-        response = llm(messages)
-        return response.content.strip()
+        key = cache_key("optimize", sql_code, sql_type, sql_type, PROMPT_VERSION)
+        cached = await conversion_cache.get(key, bypass=bypass_cache)
+        if cached is not None:
+            metrics.set_path("cache")
+            return cached
+
+        return await in_flight.run(key, lambda: generate_optimization(key, sql_code, sql_type, findings))
         
+    except RateLimited as e:
+        raise rate_limited_error("Optimization", e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
 
+# =============================================================================
+# Conversion Cache
+# =============================================================================
+
+# Hashing the prompt templates, builders and examples means any prompt edit
+# starts a fresh cache generation instead of serving conversions from the old prompts.
+PROMPT_VERSION = prompt_version(
+    prompt_registry.fingerprint,
+    build_conversion_messages,
+    build_optimization_messages,
+    RULES_FINGERPRINT,
+    build_skeleton_messages,
+    build_block_messages,
+    render_examples,
+    example_index.fingerprint,
+    config.FEWSHOT_MAX_EXAMPLES,
+    config.FEWSHOT_TOKEN_BUDGET,
+    config.FEWSHOT_MIN_SIMILARITY,
+    config.LLM_MODEL_TIERS,
+    config.COMPLEXITY_TIER_THRESHOLDS,
+    config.MODEL_ROUTING_ENABLED,
+)
+
+conversion_cache = ConversionCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    db_path=config.CACHE_DB_PATH,
+    max_db_entries=config.CACHE_DB_MAX_ENTRIES,
+)
+
+# Concurrent cache misses for the same key wait on a single model call.
+in_flight = SingleFlight()
+
+# =============================================================================
+# Template Families
+# =============================================================================
+
+# Converters by (source type, target type, bypass_cache).
+FamilyConverters = Dict[Tuple[str, str, bool], FamilyConverter]
+
+async def convert_in_family(
+    families: FamilyConverters, name: str, source_code: str, source_type: str, target_type: str,
+    bypass_cache: bool = False,
+) -> Tuple[str, Optional[str]]:
+    """Convert like convert_sql_code, deriving from an earlier routine of the same family when possible.
+
+    Returns the converted code and the ``name`` it was derived from (None if
+    converted directly).
+    """
+    if not config.FAMILY_CONVERSION_ENABLED:
+        return await convert_sql_code(source_code, source_type, target_type, bypass_cache=bypass_cache), None
+    converter = families.get((source_type, target_type, bypass_cache))
+    if converter is None:
+        async def convert(sql: str) -> str:
+            return await convert_sql_code(sql, source_type, target_type, bypass_cache=bypass_cache)
+        converter = families[(source_type, target_type, bypass_cache)] = FamilyConverter(
+            source_type, target_type, convert, is_procedure_or_function
+        )
+    converted_code, derived_from = await converter.convert(name, source_code)
+    if derived_from is not None:
+        metrics.set_path("derived")
+    return converted_code, derived_from
+
+# Family converters of the jobs being worked on. Workers claim items in
+# queue order, so only a few jobs are active at once; evicting an older job
+# only costs derivations, never correctness.
+job_families: "OrderedDict[str, FamilyConverters]" = OrderedDict()
+
+def families_for_job(job_id: str) -> FamilyConverters:
+    families = job_families.pop(job_id, None)
+    job_families[job_id] = families if families is not None else {}
+    while len(job_families) > max(config.JOB_WORKERS, 1) * 2:
+        job_families.popitem(last=False)
+    return job_families[job_id]
+
+# =============================================================================
+# Background Jobs
+# =============================================================================
+
+def is_transient(error: HTTPException) -> bool:
+    """Whether a failed conversion is worth retrying: rate limits, overload and timeouts."""
+    if error.status_code in (429, 503, 504):
+        return True
+    # convert_sql_code wraps other failures in a 500; look at what it wrapped.
+    cause = error.__context__
+    if isinstance(cause, (TimeoutError, ConnectionError)):
+        return True
+    # Provider SDK errors (e.g. APITimeoutError, APIConnectionError) do not subclass the builtins.
+    return cause is not None and type(cause).__name__.endswith(("TimeoutError", "ConnectionError"))
+
+async def run_job_item(item: Dict) -> str:
+    """Convert one queued job item; transient failures are retried, others recorded on the item."""
+    set_priority("batch")
+    source_code, source_type, target_type = item["source_code"], item["source_type"], item["target_type"]
+    try:
+        async with track("job", source_code, source_type, target_type):
+            converted_code, _ = await convert_in_family(
+                families_for_job(item["job_id"]), str(item["idx"]), source_code, source_type, target_type,
+                bypass_cache=bool(item["bypass_cache"]),
+            )
+            return converted_code
+    except HTTPException as e:
+        if is_transient(e):
+            retry_after = (e.headers or {}).get("Retry-After")
+            raise TransientError(str(e.detail), float(retry_after) if retry_after else None) from None
+        raise RuntimeError(str(e.detail)) from None
+
+job_store = JobStore(
+    config.JOBS_DB_PATH or ":memory:", max_attempts=config.JOB_MAX_ATTEMPTS, lease_seconds=config.JOB_LEASE_SECONDS
+)
+job_runner = JobRunner(
+    job_store, run_job_item, workers=max(config.JOB_WORKERS, 1), poll_interval=config.JOB_POLL_INTERVAL,
+    retry_base_seconds=config.JOB_RETRY_BASE_SECONDS, retry_max_seconds=config.JOB_RETRY_MAX_SECONDS,
+)
+
+# =============================================================================
+# Streaming Helpers
+# =============================================================================
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_llm_events(
+    key: str, messages: Callable[[], Awaitable[List[BaseMessage]]], result_field: str, action: str,
+    bypass_cache: bool, tier: int = 0,
+) -> AsyncIterator[str]:
+    """Stream model tokens as SSE, ending with one event carrying the stripped result.
+
+    ``messages`` builds the prompt; it is only awaited on a cache miss.
+    Streams are routed to a model tier but cannot escalate: tokens are already sent.
+    """
+    yield sse_event("start", {})
+    cached = await conversion_cache.get(key, bypass=bypass_cache)
+    if cached is not None:
+        metrics.set_path("cache")
+        yield sse_event("done", {result_field: cached})
+        return
+
+    parts = []
+    try:
+        async for token in stream_llm(await messages(), model=config.LLM_MODEL_TIERS[tier]):
+            parts.append(token)
+            yield sse_event("token", {"text": token})
+    except Exception as e:
+        metrics.mark_failed()
+        yield sse_event("error", {"detail": f"{action} failed: {str(e)}"})
+        return
+
+    result = "".join(parts).strip()
+    await conversion_cache.put(key, result)
+    yield sse_event("done", {result_field: result})
+
+def track(endpoint: str, sql: str, source_type: str, target_type: str):
+    """Metrics context for one request, labelled by endpoint, dialect pair and kind."""
+    kind = "procedure" if is_procedure_or_function(sql) else "query"
+    return metrics.track_request(endpoint, source_type, target_type, kind)
+
+async def tracked_events(events: AsyncIterator[str], endpoint: str, sql: str, source_type: str, target_type: str) -> AsyncIterator[str]:
+    """Keep request metrics open for the whole lifetime of a stream."""
+    async with track(endpoint, sql, source_type, target_type):
+        async for event in events:
+            yield event
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# =============================================================================
+# Client Disconnects
+# =============================================================================
+
+T = TypeVar("T")
+
+class ClientDisconnected(Exception):
+    pass
+
+# Non-standard, but what nginx and most proxies log for "client closed request".
+CLIENT_CLOSED_REQUEST = 499
+
+async def cancel_on_disconnect(http_request: Request, work: Awaitable[T]) -> T:
+    """Await ``work``, cancelling it as soon as the client disconnects.
+
+    Cancellation reaches the upstream call (unless another request shares it
+    through the single-flight), which releases its scheduler slot and rate
+    reservation right away instead of generating tokens nobody will read.
+    """
+    task = asyncio.ensure_future(work)
+
+    async def wait_for_disconnect() -> None:
+        # The body has already been read, so the only message left is the disconnect.
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+    if task not in done:
+        # Let the cancellation unwind (slot release, metrics) before answering.
+        await asyncio.gather(task, return_exceptions=True)
+        metrics.mark_cancelled()
+        raise ClientDisconnected()
+    return task.result()
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request: Request, exc: ClientDisconnected) -> Response:
+    # Nobody is listening; the status only shows up in access logs.
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
 # =============================================================================
 # API Endpoints
 # =============================================================================
 
 @app.post("/convert", response_model=ConversionResponse)
-async def convert_sql(request: ConversionRequest):
+async def convert_sql(request: ConversionRequest, http_request: Request):
     """Convert SQL code between different database types."""
-    converted_code = convert_sql_code(request.source_code, request.source_type, request.target_type)
+    async with track("convert", request.source_code, request.source_type, request.target_type):
+        converted_code = await cancel_on_disconnect(http_request, convert_sql_code(
+            request.source_code, request.source_type, request.target_type, bypass_cache=request.bypass_cache
+        ))
     return ConversionResponse(
         converted_code=converted_code,
         source_type=request.source_type,
         target_type=request.target_type
     )
 
+@app.post("/convert/batch", response_model=BatchConversionResponse)
+async def convert_sql_batch(request: BatchConversionRequest):
+    """Convert many SQL items concurrently, reporting per-item results and errors."""
+    if len(request.items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.items)} items (max {config.BATCH_MAX_ITEMS})"
+        )
+
+    parallelism = min(request.max_parallelism or config.BATCH_MAX_PARALLELISM, config.BATCH_MAX_PARALLELISM)
+    semaphore = asyncio.Semaphore(max(parallelism, 1))
+    families: FamilyConverters = {}
+
+    async def convert_item(index: int, item: ConversionRequest) -> BatchItemResult:
+        # Each item runs in its own task, so this only affects batch items.
+        set_priority("batch")
+        result = BatchItemResult(index=index, source_type=item.source_type, target_type=item.target_type)
+        async with semaphore:
+            try:
+                async with track("convert_batch", item.source_code, item.source_type, item.target_type):
+                    result.converted_code, derived_from = await convert_in_family(
+                        families, str(index), item.source_code, item.source_type, item.target_type,
+                        bypass_cache=item.bypass_cache,
+                    )
+                    if derived_from is not None:
+                        result.derived_from = int(derived_from)
+            except HTTPException as e:
+                result.error = str(e.detail)
+        return result
+
+    results = await asyncio.gather(*(convert_item(i, item) for i, item in enumerate(request.items)))
+    failed = sum(1 for result in results if result.error is not None)
+    return BatchConversionResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+@app.post("/convert/fanout", response_model=FanoutResponse)
+async def convert_sql_fanout(request: FanoutRequest, http_request: Request):
+    """Convert one source into several target dialects, analyzing it once and generating concurrently."""
+    if request.target_types is None:
+        targets = [dialect for dialect in DIALECT_NAMES if dialect != request.source_type]
+    else:
+        targets = list(dict.fromkeys(request.target_types))
+    if not targets:
+        raise HTTPException(status_code=400, detail="At least one target dialect is required")
+    analysis = await asyncio.to_thread(analyze_source, request.source_code, request.source_type)
+
+    async def convert_target(target_type: str) -> FanoutTarget:
+        result = FanoutTarget(target_type=target_type)
+        try:
+            async with track("convert_fanout", request.source_code, request.source_type, target_type):
+                result.converted_code = await convert_sql_code(
+                    request.source_code, request.source_type, target_type,
+                    bypass_cache=request.bypass_cache, analysis=analysis,
+                )
+        except HTTPException as e:
+            result.error = str(e.detail)
+        return result
+
+    results = await cancel_on_disconnect(http_request, asyncio.gather(*(convert_target(t) for t in targets)))
+    failed = sum(1 for result in results if result.error is not None)
+    summary = SourceSummary(
+        routine_name=analysis.name,
+        is_procedure=analysis.is_procedure,
+        complexity_score=analysis.complexity.score,
+        result_sets=analysis.result_sets,
+        cursors=analysis.complexity.cursors,
+        dynamic_sql=analysis.complexity.dynamic_sql,
+        model=config.LLM_MODEL_TIERS[analysis.tier],
+    )
+    return FanoutResponse(
+        source_type=request.source_type, analysis=summary, results=results,
+        succeeded=len(results) - failed, failed=failed,
+    )
+
+@app.post("/convert/stream")
+async def convert_sql_stream(request: ConversionRequest):
+    """Convert SQL code, streaming tokens as server-sent events."""
+    if request.source_type == request.target_type:
+        local_code = request.source_code
+    else:
+        local_code = transpile_locally(request.source_code, request.source_type, request.target_type)
+    if local_code is not None:
+        async def local_result() -> AsyncIterator[str]:
+            metrics.set_path("local")
+            yield sse_event("done", {"converted_code": local_code})
+        events = local_result()
+    else:
+        key = cache_key("convert", request.source_code, request.source_type, request.target_type, PROMPT_VERSION)
+
+        async def messages() -> List[BaseMessage]:
+            analysis = await asyncio.to_thread(analyze_source, request.source_code, request.source_type)
+            return build_conversion_messages(analysis.source_code, request.source_type, request.target_type)
+        events = stream_llm_events(
+            key, messages, "converted_code", "Conversion", request.bypass_cache, route_model(request.source_code)
+        )
+    return event_stream_response(
+        tracked_events(events, "convert_stream", request.source_code, request.source_type, request.target_type)
+    )
+
+@app.post("/jobs", response_model=JobCreated, status_code=202)
+async def create_job(request: JobRequest):
+    """Queue one or more conversions and return a job id immediately."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="A job needs at least one item")
+    if len(request.items) > config.JOB_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Job too large: {len(request.items)} items (max {config.JOB_MAX_ITEMS})"
+        )
+    items = [
+        {"source_code": item.source_code, "source_type": item.source_type,
+         "target_type": item.target_type, "bypass_cache": item.bypass_cache}
+        for item in request.items
+    ]
+    job_id = await asyncio.to_thread(job_store.create, items)
+    job_runner.notify()
+    return JobCreated(job_id=job_id, total=len(request.items), status_url=f"/jobs/{job_id}")
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, items: bool = True):
+    """Job status with per-item progress; pass items=false for counts only."""
+    job = await asyncio.to_thread(job_store.get, job_id, items)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    job["items"] = [
+        JobItemStatus(
+            index=row["idx"],
+            source_type=row["source_type"],
+            target_type=row["target_type"],
+            status=row["status"],
+            attempts=row["attempts"],
+            converted_code=row["result"],
+            error=row["error"],
+        )
+        for row in job["items"]
+    ]
+    return JobStatus(**job)
+
 @app.post("/optimize", response_model=OptimizationResponse)
-async def optimize_sql(request: OptimizationRequest):
+async def optimize_sql(request: OptimizationRequest, http_request: Request):
     """Optimize SQL code for the specified database type."""
-    optimized_code = optimize_sql_code(request.sql_code, request.sql_type)
-    return OptimizationResponse(optimized_code=optimized_code)
+    if request.mode == "unroll_dynamic_sql":
+        async with track("optimize", request.sql_code, request.sql_type, request.sql_type):
+            metrics.set_path("local")
+            return await asyncio.to_thread(unroll_for_optimization, request)
+    # Analyzed once, off the event loop: the findings go into the prompt and the response.
+    findings = await asyncio.to_thread(find_antipatterns, request.sql_code, request.sql_type)
+    async with track("optimize", request.sql_code, request.sql_type, request.sql_type):
+        optimized_code = await cancel_on_disconnect(http_request, optimize_sql_code(
+            request.sql_code, request.sql_type, bypass_cache=request.bypass_cache, findings=findings
+        ))
+    return OptimizationResponse(
+        optimized_code=optimized_code, findings=[AntiPattern(**finding.to_dict()) for finding in findings]
+    )
+
+@app.post("/optimize/stream")
+async def optimize_sql_stream(request: OptimizationRequest):
+    """Optimize SQL code, streaming tokens as server-sent events."""
+    if request.mode == "unroll_dynamic_sql":
+        response = await asyncio.to_thread(unroll_for_optimization, request)
+
+        async def local_result() -> AsyncIterator[str]:
+            metrics.set_path("local")
+            yield sse_event("done", response.model_dump())
+        events = local_result()
+    else:
+        key = cache_key("optimize", request.sql_code, request.sql_type, request.sql_type, PROMPT_VERSION)
+
+        async def messages() -> List[BaseMessage]:
+            return await asyncio.to_thread(build_optimization_messages, request.sql_code, request.sql_type)
+        events = stream_llm_events(
+            key, messages, "optimized_code", "Optimization", request.bypass_cache, route_model(request.sql_code)
+        )
+    return event_stream_response(
+        tracked_events(events, "optimize_stream", request.sql_code, request.sql_type, request.sql_type)
+    )
+
+@app.post("/analyze", response_model=AnalysisResponse)
+async def analyze_sql(request: AnalysisRequest):
+    """Report non-sargable predicates and similar anti-patterns, with rewrites, without calling the model."""
+    findings = await asyncio.to_thread(find_antipatterns, request.sql_code, request.sql_type)
+    return AnalysisResponse(findings=[AntiPattern(**finding.to_dict()) for finding in findings])
+
+@app.post("/advise/indexes", response_model=IndexAdviceResponse)
+async def advise_workload_indexes(request: IndexAdviceRequest):
+    """Recommend composite, covering indexes for a whole workload of routines, without calling the model."""
+    if len(request.routines) > config.INDEX_ADVISOR_MAX_ROUTINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Workload too large: {len(request.routines)} routines (max {config.INDEX_ADVISOR_MAX_ROUTINES})"
+        )
+    workload = [
+        (
+            routine.name or routine_name(routine.sql_code) or f"routine_{index}",
+            routine.sql_code,
+            routine.sql_type or detect_dialect(routine.sql_code),
+        )
+        for index, routine in enumerate(request.routines)
+    ]
+    advice = await asyncio.to_thread(advise, workload, request.target_types, max(request.max_indexes, 0))
+    return IndexAdviceResponse(**advice.to_dict())
+
+# =============================================================================
+# Startup and Health
+# =============================================================================
+
+startup_state = {"import_seconds": None, "ready_seconds": None, "warmup_error": None}
+
+async def warm_up() -> None:
+    """Build the LLM client, then record how long the process took to become ready."""
+    try:
+        await warmup()
+    except Exception as e:
+        startup_state["warmup_error"] = str(e)
+        print(f"Warmup failed: {e}")
+        return
+    ready = time.perf_counter() - _import_started
+    startup_state["ready_seconds"] = round(ready, 3)
+    metrics.startup_seconds.set({"phase": "ready"}, ready)
+    if ready > config.STARTUP_BUDGET_SECONDS:
+        print(f"Startup took {ready:.2f}s, over the {config.STARTUP_BUDGET_SECONDS:.2f}s budget")
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: configuration is valid and the LLM client has been built."""
+    if config_error is not None:
+        return JSONResponse(status_code=503, content={"status": "misconfigured", "detail": config_error})
+    if startup_state["warmup_error"] is not None:
+        return JSONResponse(status_code=503, content={"status": "warmup_failed", "detail": startup_state["warmup_error"]})
+    if not backend_ready():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {
+        "status": "ready",
+        "import_seconds": startup_state["import_seconds"],
+        "ready_seconds": startup_state["ready_seconds"],
+        "startup_budget_seconds": config.STARTUP_BUDGET_SECONDS,
+    }
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Conversion cache hit/miss/eviction and request coalescing counters."""
+    return {
+        "prompt_version": PROMPT_VERSION,
+        **conversion_cache.snapshot(),
+        "upstream_calls": in_flight.stats["calls"],
+        "coalesced_calls": in_flight.stats["coalesced"],
+        "in_flight": in_flight.in_flight,
+    }
+
+@app.get("/prompts")
+async def prompt_templates():
+    """Registered prompt templates with their versions and static-prefix token counts."""
+    return {
+        "prompt_version": PROMPT_VERSION,
+        "registry_fingerprint": prompt_registry.fingerprint,
+        "templates": prompt_registry.report(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics for this worker."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -699,10 +1514,26 @@ async def root():
         "supported_databases": ["sqlserver", "postgresql", "mysql"],
         "endpoints": {
             "/convert": "Convert SQL between databases",
-            "/optimize": "Optimize SQL for specific database"
+            "/convert/batch": "Convert many SQL items in one request",
+            "/convert/stream": "Convert SQL, streaming tokens as server-sent events",
+            "/convert/fanout": "Convert one source into several target dialects at once",
+            "/jobs": "Queue conversions as a background job",
+            "/jobs/{job_id}": "Background job status and per-item progress",
+            "/optimize": "Optimize SQL for specific database (mode=unroll_dynamic_sql parameterizes sp_executesql locally)",
+            "/optimize/stream": "Optimize SQL, streaming tokens as server-sent events",
+            "/analyze": "Find anti-patterns and suggest sargable rewrites, locally",
+            "/advise/indexes": "Recommend indexes for a whole workload of routines, locally",
+            "/cache/stats": "Conversion cache and request coalescing statistics",
+            "/prompts": "Prompt templates, versions and token counts",
+            "/metrics": "Prometheus metrics",
+            "/healthz": "Liveness probe",
+            "/readyz": "Readiness probe"
         }
     }
 
+startup_state["import_seconds"] = round(time.perf_counter() - _import_started, 3)
+metrics.startup_seconds.set({"phase": "import"}, startup_state["import_seconds"])
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=config.API_HOST, port=config.API_PORT) 
\ No newline at end of file
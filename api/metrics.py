@@ -0,0 +1,279 @@
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+# =============================================================================
+# Metric Types (Prometheus text exposition format)
+# =============================================================================
+#
+# Metrics are kept per worker process; scrape every worker, or aggregate in
+# Prometheus with sum() by the labels below.
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: Dict[str, str], amount: float = 1) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: Dict[str, str], amount: float = 1) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, labels: Dict[str, str], amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: Dict[str, str], value: float) -> None:
+        self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, labels: Dict[str, str], value: float) -> None:
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._sums[key] = self._sums.get(key, 0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': repr(float(bound))})} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+# =============================================================================
+# Service Metrics
+# =============================================================================
+
+REQUEST_LABELS = ("endpoint", "source_type", "target_type", "kind")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+requests_total = Counter(
+    "sqlconv_requests_total", "Requests by outcome and serving path (local, cache, derived, llm).",
+    REQUEST_LABELS + ("path", "status"),
+)
+errors_total = Counter(
+    "sqlconv_errors_total", "Failed requests.", REQUEST_LABELS,
+)
+request_seconds = Histogram(
+    "sqlconv_request_duration_seconds", "End-to-end request latency.",
+    REQUEST_LABELS + ("path",), LATENCY_BUCKETS,
+)
+upstream_seconds = Histogram(
+    "sqlconv_upstream_duration_seconds", "Time spent waiting on the LLM, per upstream call.",
+    REQUEST_LABELS, LATENCY_BUCKETS,
+)
+local_seconds = Histogram(
+    "sqlconv_local_duration_seconds", "Request time not spent waiting on the LLM.",
+    REQUEST_LABELS + ("path",), LATENCY_BUCKETS,
+)
+prompt_tokens = Histogram(
+    "sqlconv_prompt_tokens", "Prompt tokens per upstream call.", REQUEST_LABELS, TOKEN_BUCKETS,
+)
+completion_tokens = Histogram(
+    "sqlconv_completion_tokens", "Completion tokens per upstream call.", REQUEST_LABELS, TOKEN_BUCKETS,
+)
+requests_in_flight = Gauge(
+    "sqlconv_requests_in_flight", "Requests currently being handled.", REQUEST_LABELS,
+)
+upstream_in_flight = Gauge(
+    "sqlconv_upstream_calls_in_flight", "Upstream LLM calls currently running or queued.", REQUEST_LABELS,
+)
+model_calls_total = Counter(
+    "sqlconv_model_calls_total", "Upstream calls by model tier.", REQUEST_LABELS + ("model",),
+)
+escalations_total = Counter(
+    "sqlconv_model_escalations_total", "Retries on a larger model after output failed local validation.",
+    REQUEST_LABELS + ("from_model", "to_model"),
+)
+repairs_total = Counter(
+    "sqlconv_repairs_total", "Outputs that failed local validation, by repair outcome (repaired, unrepaired).",
+    REQUEST_LABELS + ("outcome",),
+)
+repaired_fragments_total = Counter(
+    "sqlconv_repaired_fragments_total", "Statement fragments sent back to the model for repair.", REQUEST_LABELS,
+)
+segment_blocks_total = Counter(
+    "sqlconv_segment_blocks_total",
+    "Result-set blocks of segmented conversions, by outcome (converted, or reused from the previous conversion).",
+    REQUEST_LABELS + ("outcome",),
+)
+upstream_retries_total = Counter(
+    "sqlconv_upstream_retries_total", "Upstream calls retried after a rate-limit or overload response.",
+    REQUEST_LABELS + ("model",),
+)
+cancelled_calls_total = Counter(
+    "sqlconv_cancelled_upstream_calls_total", "Upstream calls abandoned because the client went away.",
+    REQUEST_LABELS + ("model",),
+)
+cancelled_tokens_saved_total = Counter(
+    "sqlconv_cancelled_tokens_saved_total", "Estimated tokens not spent thanks to cancelled upstream calls.",
+    REQUEST_LABELS + ("model",),
+)
+scheduler_wait_seconds = Histogram(
+    "sqlconv_scheduler_wait_seconds", "Time upstream calls waited for a concurrency slot and rate-limit budget.",
+    ("priority",), LATENCY_BUCKETS,
+)
+startup_seconds = Gauge(
+    "sqlconv_startup_seconds", "Seconds from module import to app import and to readiness.", ("phase",),
+)
+
+ALL_METRICS = [
+    requests_total, errors_total, request_seconds, upstream_seconds, local_seconds,
+    prompt_tokens, completion_tokens, requests_in_flight, upstream_in_flight, model_calls_total,
+    escalations_total, repairs_total, repaired_fragments_total, segment_blocks_total, upstream_retries_total,
+    cancelled_calls_total, cancelled_tokens_saved_total, scheduler_wait_seconds, startup_seconds,
+]
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# =============================================================================
+# Request Tracking
+# =============================================================================
+
+@dataclass
+class RequestContext:
+    labels: Dict[str, str]
+    path: str = "llm"
+    status: str = "ok"
+    upstream_seconds: float = 0.0
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+def request_labels() -> Dict[str, str]:
+    context = _current_request.get()
+    return context.labels if context else {name: "" for name in REQUEST_LABELS}
+
+def set_path(path: str) -> None:
+    """Record how the current request was served: local, cache, derived or llm."""
+    context = _current_request.get()
+    if context is not None:
+        context.path = path
+
+def mark_failed() -> None:
+    """Count the current request as failed without raising (e.g. streamed errors)."""
+    context = _current_request.get()
+    if context is not None:
+        context.status = "error"
+
+def mark_cancelled() -> None:
+    """Count the current request as abandoned by the client."""
+    context = _current_request.get()
+    if context is not None:
+        context.status = "cancelled"
+
+@asynccontextmanager
+async def track_request(endpoint: str, source_type: str, target_type: str, kind: str) -> AsyncIterator[RequestContext]:
+    """Time a request and attribute everything it does to its labels."""
+    context = RequestContext(
+        labels={"endpoint": endpoint, "source_type": source_type, "target_type": target_type, "kind": kind}
+    )
+    token = _current_request.set(context)
+    requests_in_flight.inc(context.labels)
+    started = time.perf_counter()
+    try:
+        yield context
+    except BaseException:
+        if context.status != "cancelled":
+            context.status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        labels = {**context.labels, "path": context.path}
+        requests_in_flight.dec(context.labels)
+        requests_total.inc({**labels, "status": context.status})
+        if context.status == "error":
+            errors_total.inc(context.labels)
+        request_seconds.observe(labels, elapsed)
+        local_seconds.observe(labels, max(elapsed - context.upstream_seconds, 0.0))
+        try:
+            _current_request.reset(token)
+        except ValueError:
+            # Streaming generators may be closed from a different context.
+            pass
+
+@asynccontextmanager
+async def track_upstream(model: str = "") -> AsyncIterator[Dict[str, int]]:
+    """Time one upstream call; the caller fills in the yielded token usage."""
+    labels = request_labels()
+    usage: Dict[str, int] = {}
+    model_calls_total.inc({**labels, "model": model})
+    upstream_in_flight.inc(labels)
+    started = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        elapsed = time.perf_counter() - started
+        upstream_in_flight.dec(labels)
+        upstream_seconds.observe(labels, elapsed)
+        context = _current_request.get()
+        if context is not None:
+            context.upstream_seconds += elapsed
+        if "prompt_tokens" in usage:
+            prompt_tokens.observe(labels, usage["prompt_tokens"])
+        if "completion_tokens" in usage:
+            completion_tokens.observe(labels, usage["completion_tokens"])
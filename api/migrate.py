@@ -0,0 +1,309 @@
+"""Convert every routine in a schema dump file, writing one file per routine.
+
+The dump is read line by line, so tens of MB never sit in memory at once.
+Understands SSMS "Generate Scripts" output (GO separators), mysqldump
+--routines (DELIMITER blocks) and pg_dump (dollar-quoted bodies):
+
+    python migrate.py schema.sql --source sqlserver --target postgresql --out migrated/
+    python migrate.py dump.sql --source mysql --target sqlserver --out out/ --parallelism 8
+    python migrate.py pg_schema.sql --source postgresql --target mysql --list
+
+Progress is checkpointed in the output directory; re-running the same command
+after an interruption skips routines that were already converted.
+
+Routines that differ only in names and literals are converted once per
+template family (see families.py); pass --no-families to send every routine
+to the model.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from families import FamilyConverter, fingerprint
+from segmenter import routine_name
+
+# =============================================================================
+# Dump Parsing
+# =============================================================================
+
+@dataclass
+class Routine:
+    ordinal: int
+    name: str
+    line: int
+    sql: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()[:16]
+
+_GO = re.compile(r"^\s*GO(?:\s+\d+)?\s*$", re.I)
+_DELIMITER = re.compile(r"^\s*DELIMITER\s+(\S+)\s*$", re.I)
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+_LEADING_COMMENTS = re.compile(r"\A(?:\s+|--[^\n]*|/\*.*?\*/)*", re.S)
+_HAS_BODY = re.compile(r"\b(?:AS|BEGIN|RETURNS?)\b", re.I)
+
+# Splitters yield (first line number, text, whether the text needs the
+# ``DELIMITER $$`` wrapper the converter expects for MySQL routines).
+
+def _sqlserver_statements(lines: Iterable[str]) -> Iterator[Tuple[int, str, bool]]:
+    """Each GO-separated batch."""
+    buffer: List[str] = []
+    start = 1
+    for number, line in enumerate(lines, start=1):
+        if _GO.match(line):
+            yield start, "".join(buffer), False
+            buffer, start = [], number + 1
+        else:
+            buffer.append(line)
+    yield start, "".join(buffer), False
+
+def _mysql_statements(lines: Iterable[str]) -> Iterator[Tuple[int, str, bool]]:
+    """Each statement, following DELIMITER changes (mysqldump uses ``;;``)."""
+    delimiter = ";"
+    buffer: List[str] = []
+    start = 1
+    for number, line in enumerate(lines, start=1):
+        match = _DELIMITER.match(line)
+        if match:
+            yield start, "".join(buffer), False
+            delimiter = match.group(1)
+            buffer, start = [], number + 1
+            continue
+        buffer.append(line)
+        stripped = line.rstrip()
+        if stripped.endswith(delimiter):
+            yield start, "".join(buffer).rstrip()[:-len(delimiter)].rstrip(), delimiter != ";"
+            buffer, start = [], number + 1
+    yield start, "".join(buffer), False
+
+def _postgresql_statements(lines: Iterable[str]) -> Iterator[Tuple[int, str, bool]]:
+    """Each statement, keeping dollar-quoted function bodies whole."""
+    open_tag: Optional[str] = None
+    buffer: List[str] = []
+    start = 1
+    for number, line in enumerate(lines, start=1):
+        buffer.append(line)
+        code = line if open_tag else line.split("--", 1)[0]
+        for tag in _DOLLAR_TAG.findall(code):
+            if open_tag is None:
+                open_tag = tag
+            elif tag == open_tag:
+                open_tag = None
+        if open_tag is None and code.rstrip().endswith(";"):
+            yield start, "".join(buffer), False
+            buffer, start = [], number + 1
+    yield start, "".join(buffer), False
+
+_SPLITTERS = {
+    "sqlserver": _sqlserver_statements,
+    "mysql": _mysql_statements,
+    "postgresql": _postgresql_statements,
+}
+
+def iter_routines(handle: TextIO, dialect: str, is_routine) -> Iterator[Routine]:
+    """Stream the routines in a dump, skipping tables, grants, SET statements and the like.
+
+    ``is_routine`` is the converter's own procedure/function detection, applied
+    after leading comments (SSMS object banners, pg_dump headers) are removed.
+    Definitions must also have a body, which rules out ``ALTER FUNCTION ... OWNER TO``.
+    """
+    ordinal = 0
+    for line, text, wrap in _SPLITTERS[dialect](handle):
+        sql = _LEADING_COMMENTS.sub("", text)
+        line += text[:len(text) - len(sql)].count("\n")
+        sql = sql.strip()
+        if wrap:
+            sql = f"DELIMITER $$\n{sql}$$\nDELIMITER ;"
+        if sql and is_routine(sql) and _HAS_BODY.search(sql):
+            yield Routine(ordinal, routine_name(sql) or "routine", line, sql)
+            ordinal += 1
+
+def open_dump(path: str) -> TextIO:
+    """Open a dump for streaming; SSMS writes UTF-16 with a byte-order mark by default."""
+    with open(path, "rb") as handle:
+        head = handle.read(4)
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        encoding = "utf-16"
+    else:
+        encoding = "utf-8-sig"
+    return open(path, encoding=encoding, errors="replace")
+
+# =============================================================================
+# Checkpointing
+# =============================================================================
+
+CHECKPOINT_FILE = ".migration-checkpoint.jsonl"
+
+class Checkpoint:
+    """Append-only record of finished routines, so a rerun skips them."""
+
+    def __init__(self, out_dir: str, fresh: bool = False):
+        self.path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self.done: Dict[str, str] = {}
+        if fresh and os.path.exists(self.path):
+            os.remove(self.path)
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a torn final line from an interrupted write
+                    if entry.get("status") == "done":
+                        self.done[entry["key"]] = entry["path"]
+                    else:
+                        self.done.pop(entry.get("key"), None)
+        self._handle = open(self.path, "a", encoding="utf-8")
+
+    def is_done(self, key: str, out_dir: str) -> bool:
+        path = self.done.get(key)
+        return path is not None and os.path.exists(os.path.join(out_dir, path))
+
+    def record(self, entry: dict) -> None:
+        self._handle.write(json.dumps(entry) + "\n")
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+
+    def close(self) -> None:
+        self._handle.close()
+
+# =============================================================================
+# Migration
+# =============================================================================
+
+def output_path(routine: Routine, seen: Dict[str, int]) -> str:
+    """Relative output path: ``schema/name.sql``, numbered for overloads and duplicates."""
+    parts = [re.sub(r"[^\w.-]", "_", part) or "_" for part in routine.name.split(".")]
+    relative = os.path.join(*parts[:-1], parts[-1]) if len(parts) > 1 else parts[0]
+    count = seen.get(relative.lower(), 0) + 1
+    seen[relative.lower()] = count
+    return f"{relative}.sql" if count == 1 else f"{relative}__{count}.sql"
+
+def write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as handle:
+        handle.write(text.rstrip() + "\n")
+    os.replace(temp, path)
+
+async def migrate(args: argparse.Namespace) -> dict:
+    import main
+
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint = Checkpoint(args.out, fresh=args.fresh)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.parallelism * 2)
+    summary = {"routines": 0, "converted": 0, "skipped": 0, "failed": 0, "errors": []}
+    started = time.perf_counter()
+
+    async def convert(sql: str) -> str:
+        return await main.convert_sql_code(sql, args.source, args.target, bypass_cache=args.bypass_cache)
+
+    families = None if args.no_families else FamilyConverter(
+        args.source, args.target, convert, main.is_procedure_or_function
+    )
+
+    async def worker() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            routine, relative, key = item
+            entry = {"key": key, "ordinal": routine.ordinal, "name": routine.name, "line": routine.line, "path": relative}
+            try:
+                if families is None:
+                    converted, derived_from = await convert(routine.sql), None
+                else:
+                    converted, derived_from = await families.convert(routine.name, routine.sql)
+                await asyncio.to_thread(write_atomic, os.path.join(args.out, relative), converted)
+            except Exception as e:
+                error = str(e.detail) if isinstance(e, main.HTTPException) else str(e)
+                summary["failed"] += 1
+                summary["errors"].append({"name": routine.name, "line": routine.line, "error": error})
+                checkpoint.record({**entry, "status": "failed", "error": error})
+                print(f"FAILED  {routine.name} (line {routine.line}): {error}", file=sys.stderr)
+                continue
+            if derived_from is not None:
+                entry["derived_from"] = derived_from
+            checkpoint.record({**entry, "status": "done"})
+            summary["converted"] += 1
+            origin = f" (derived from {derived_from})" if derived_from else ""
+            print(f"ok      {routine.name} -> {relative}{origin}", file=sys.stderr)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(args.parallelism)]
+    seen: Dict[str, int] = {}
+    try:
+        with open_dump(args.dump) as handle:
+            for routine in iter_routines(handle, args.source, main.is_procedure_or_function):
+                summary["routines"] += 1
+                relative = output_path(routine, seen)
+                key = f"{relative}:{routine.digest}"
+                if checkpoint.is_done(key, args.out):
+                    summary["skipped"] += 1
+                    continue
+                # Blocks while the workers are busy, so parsing never runs far ahead.
+                await queue.put((routine, relative, key))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        checkpoint.close()
+    if families is not None:
+        summary.update(families.stats)
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+def list_routines(args: argparse.Namespace) -> List[dict]:
+    from main import is_procedure_or_function
+
+    seen: Dict[str, int] = {}
+    with open_dump(args.dump) as handle:
+        return [
+            {
+                "name": routine.name, "line": routine.line, "path": output_path(routine, seen),
+                "chars": len(routine.sql), "family": fingerprint(routine.sql, args.source).key,
+            }
+            for routine in iter_routines(handle, args.source, is_procedure_or_function)
+        ]
+
+# =============================================================================
+# Entry Point
+# =============================================================================
+
+DIALECTS = ["sqlserver", "postgresql", "mysql"]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dump", help="schema dump file to migrate")
+    parser.add_argument("--source", choices=DIALECTS, required=True)
+    parser.add_argument("--target", choices=DIALECTS)
+    parser.add_argument("--out", help="output directory (one .sql file per routine)")
+    parser.add_argument("--parallelism", type=int, help="concurrent conversions (default BATCH_MAX_PARALLELISM)")
+    parser.add_argument("--bypass-cache", action="store_true")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint and convert everything")
+    parser.add_argument("--no-families", action="store_true",
+                        help="convert every routine with the model, even when its template family was converted")
+    parser.add_argument("--list", action="store_true", help="only list the routines found in the dump")
+    args = parser.parse_args()
+    if not args.list and not (args.target and args.out):
+        parser.error("--target and --out are required unless --list is given")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.list:
+        print(json.dumps(list_routines(args), indent=2))
+    else:
+        from config import config
+        args.parallelism = max(args.parallelism or config.BATCH_MAX_PARALLELISM, 1)
+        result = asyncio.run(migrate(args))
+        print(json.dumps(result, indent=2))
+        sys.exit(1 if result["failed"] else 0)
@@ -0,0 +1,108 @@
+import hashlib
+import textwrap
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from fewshot import estimate_tokens
+
+# =============================================================================
+# Token Counting
+# =============================================================================
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when it is installed, else an estimate."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return estimate_tokens(text)
+
+# =============================================================================
+# Prompt Registry
+# =============================================================================
+#
+# Provider-side prompt caching matches on the longest identical prefix, so
+# every prompt is laid out static-first: the system prompt and the rules are
+# rendered once into message objects that are reused verbatim, per-request
+# context (examples, a converted skeleton) follows, and the user's SQL is
+# always the last thing in the prompt.
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    version: int
+    system: str
+    instructions: str
+    # Closing instruction; ``{code}`` and any keyword fields are filled per call.
+    request: str = "{code}"
+    prefix: Tuple[BaseMessage, ...] = field(default=(), compare=False, repr=False)
+
+    @property
+    def digest(self) -> str:
+        text = "\0".join((self.name, str(self.version), self.system, self.instructions, self.request))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, version: int, system: str, instructions: str = "", request: str = "{code}") -> PromptTemplate:
+        system, instructions = _dedent(system), _dedent(instructions)
+        prefix = [SystemMessage(content=system)]
+        if instructions:
+            prefix.append(HumanMessage(content=instructions))
+        template = PromptTemplate(name, version, system, instructions, _dedent(request), tuple(prefix))
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise ValueError(f"Unknown prompt template: {name}") from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def render(self, name: str, code: str, context: Sequence[str] = (), **fields) -> List[BaseMessage]:
+        """Static prefix, then non-empty ``context`` messages, then the request with the SQL."""
+        template = self.get(name)
+        messages: List[BaseMessage] = list(template.prefix)
+        messages.extend(HumanMessage(content=text) for text in context if text)
+        messages.append(HumanMessage(content=template.request.format(code=code, **fields)))
+        return messages
+
+    @property
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for name in sorted(self._templates):
+            digest.update(f"{name}:{self._templates[name].digest}\0".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def report(self) -> List[Dict[str, object]]:
+        """Version and token counts of every template's static prefix."""
+        rows = []
+        for name in sorted(self._templates):
+            template = self._templates[name]
+            system_tokens = count_tokens(template.system)
+            instruction_tokens = count_tokens(template.instructions) if template.instructions else 0
+            rows.append({
+                "name": name,
+                "version": f"v{template.version}",
+                "digest": template.digest,
+                "system_tokens": system_tokens,
+                "instruction_tokens": instruction_tokens,
+                "prefix_tokens": system_tokens + instruction_tokens,
+            })
+        return rows
+
+def _dedent(text: str) -> str:
+    """Strip the indentation that triple-quoted prompts pick up in source."""
+    return textwrap.dedent(text).strip()
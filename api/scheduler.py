@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import metrics
+
+T = TypeVar("T")
+
+# =============================================================================
+# Request Priority
+# =============================================================================
+
+# Lower runs first. Interactive requests from the UI always overtake bulk work.
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+def set_priority(name: str) -> None:
+    """Set the upstream priority for everything the current task does."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {name}")
+    _priority.set(name)
+    _shared.set(None)
+
+def current_priority() -> str:
+    shared = _shared.get()
+    return shared.name if shared is not None else _priority.get()
+
+class SharedPriority:
+    """The priority of a call made on behalf of several callers.
+
+    It starts at the first caller's priority and rises to the highest of any
+    caller that joins later, including for upstream calls already queued.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._queued: List[Tuple["RateLimitScheduler", "_Waiter"]] = []
+
+    async def run(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await ``factory()`` with this as the priority; call inside the shared task."""
+        _shared.set(self)
+        return await factory()
+
+    def join(self, name: str) -> None:
+        if PRIORITIES[name] >= PRIORITIES[self.name]:
+            return
+        self.name = name
+        for scheduler, waiter in self._queued:
+            waiter.priority = PRIORITIES[name]
+            scheduler._reorder()
+
+_shared: ContextVar[Optional[SharedPriority]] = ContextVar("llm_shared_priority", default=None)
+
+# =============================================================================
+# Token Buckets
+# =============================================================================
+
+class TokenBucket:
+    """Continuously refilled budget for a per-minute limit.
+
+    The burst capacity (``burst_seconds`` worth of the limit) comes out of the
+    minute's budget and the rest refills evenly, so no sliding minute ever
+    admits more than ``per_minute``.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        burst_seconds = min(max(burst_seconds, 0.0), 30.0)
+        self.capacity = max(per_minute * burst_seconds / 60.0, 1.0)
+        self.rate = max(per_minute - self.capacity, 1.0) / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` can be taken; requests larger than the bucket wait for a full one."""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) once the real usage is known."""
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self) -> None:
+        self.level = min(self.level, 0.0)
+
+# =============================================================================
+# Scheduler
+# =============================================================================
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+class RateLimitScheduler:
+    """Admits upstream calls by priority within concurrency, RPM and TPM limits.
+
+    Waiters are served strictly in (priority, arrival) order: the head of the
+    queue is admitted once a concurrency slot is free and both buckets can
+    cover it, so a large batch prompt is never starved by smaller ones behind
+    it and never jumps ahead of interactive work. A limit of 0 disables that
+    bucket.
+    """
+
+    def __init__(self, concurrency: int, rpm: int = 0, tpm: int = 0, burst_seconds: float = 5.0):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.limit = concurrency
+        self.active = 0
+        self.rpm = TokenBucket(rpm, burst_seconds) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm, burst_seconds) if tpm > 0 else None
+        self._queue: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._queue if not waiter.future.done())
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delay = self._paused_until - now
+        if self.rpm is not None:
+            delay = max(delay, self.rpm.wait_time(1, now))
+        if self.tpm is not None:
+            delay = max(delay, self.tpm.wait_time(tokens, now))
+        return delay
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue and self.active < self.limit:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            delay = self._delay(waiter.tokens, now)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            if self.rpm is not None:
+                self.rpm.take(1, now)
+            if self.tpm is not None:
+                self.tpm.take(waiter.tokens, now)
+            self.active += 1
+            waiter.future.set_result(None)
+
+    def _reorder(self) -> None:
+        """Restore queue order after a queued waiter's priority was raised."""
+        heapq.heapify(self._queue)
+        self._dispatch()
+
+    async def acquire(self, tokens: int = 0, priority: Optional[str] = None) -> None:
+        shared = _shared.get() if priority is None else None
+        priority = priority or current_priority()
+        waiter = _Waiter(
+            PRIORITIES[priority], next(self._sequence), tokens, asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._queue, waiter)
+        if shared is not None:
+            shared._queued.append((self, waiter))
+        started = time.perf_counter()
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just before cancellation: give the slot and budget back.
+                self.release(tokens, 0)
+            else:
+                # The queue entry is skipped lazily; let the next waiter through now.
+                self._dispatch()
+            raise
+        finally:
+            if shared is not None:
+                shared._queued.remove((self, waiter))
+                priority = shared.name
+            metrics.scheduler_wait_seconds.observe({"priority": priority}, time.perf_counter() - started)
+
+    def release(self, reserved: int = 0, used: Optional[int] = None) -> None:
+        self.active -= 1
+        if self.tpm is not None and used is not None:
+            self.tpm.adjust(used - reserved)
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Admit nothing for ``seconds``, e.g. after the provider answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Our estimate of the remaining budget was evidently too optimistic.
+        for bucket in (self.rpm, self.tpm):
+            if bucket is not None:
+                bucket.drain()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0) -> AsyncIterator[Dict[str, int]]:
+        """Hold a slot with ``tokens`` reserved; set ``["tokens"]`` to the actual usage if known."""
+        await self.acquire(tokens)
+        reservation = {"tokens": tokens}
+        try:
+            yield reservation
+        finally:
+            self.release(tokens, reservation["tokens"])
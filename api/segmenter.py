@@ -0,0 +1,240 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# =============================================================================
+# Procedure Segmentation
+# =============================================================================
+#
+# Splits a stored procedure into its header (signature and parameters), its
+# declarations and one block per result-set query, so the blocks can be
+# converted independently and stitched back together.
+
+PLACEHOLDER = "-- <<RESULT SET {index}>>"
+PLACEHOLDER_PATTERN = re.compile(r"--\s*<<RESULT SET (\d+)>>")
+
+@dataclass
+class ProcedureSegments:
+    dialect: str
+    header: str
+    declarations: str
+    skeleton: str
+    blocks: List[str] = field(default_factory=list)
+
+# Strings, quoted identifiers and comments: skipped when looking for keywords.
+_OPAQUE_REST = (
+    r"|`[^`]*`"
+    r"|\[[^\]\n]*\]"
+    r"|--[^\n]*"
+    r"|/\*.*?\*/"
+)
+_OPAQUE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"" + _OPAQUE_REST, re.DOTALL)
+# MySQL strings also escape quotes with a backslash, as in 'it\'s'.
+_MYSQL_OPAQUE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"" + _OPAQUE_REST, re.DOTALL)
+
+def _mask(text: str, dialect: Optional[str] = None) -> str:
+    """Blank out strings and comments, keeping offsets intact."""
+    opaque = _MYSQL_OPAQUE if dialect == "mysql" else _OPAQUE
+    return opaque.sub(lambda m: " " * len(m.group()), text)
+
+def _split_statements(masked: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """Statement spans (including the trailing semicolon) between start and end."""
+    spans, depth, begin = [], 0, start
+    for i in range(start, end):
+        char = masked[i]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == ";" and depth == 0:
+            spans.append((begin, i + 1))
+            begin = i + 1
+    if masked[begin:end].strip():
+        spans.append((begin, end))
+    return spans
+
+def _leading_words(masked: str, span: Tuple[int, int], count: int = 3) -> List[str]:
+    words = re.findall(r"[A-Za-z_]\w*", masked[span[0]:span[1]])
+    return [word.upper() for word in words[:count]]
+
+_OPENERS = {"IF", "WHILE", "LOOP", "REPEAT", "BEGIN", "CASE"}
+
+def _nesting_delta(words: List[str], masked_piece: str) -> Tuple[int, int]:
+    """(change before the statement, change after it) in block nesting depth."""
+    if not words:
+        return 0, 0
+    if words[0] == "END":
+        return -1, 0
+    if words[0] in _OPENERS or (words[0] == "FOR" and re.search(r"\bLOOP\b", masked_piece, re.I)):
+        return 0, 1
+    return 0, 0
+
+def _top_level_statements(masked: str, start: int, end: int):
+    """Yield (span, leading words) for statements not nested in IF/LOOP/BEGIN blocks."""
+    depth = 0
+    for span in _split_statements(masked, start, end):
+        words = _leading_words(masked, span)
+        before, after = _nesting_delta(words, masked[span[0]:span[1]])
+        depth += before
+        if depth == 0:
+            yield span, words
+        depth += after
+
+def _trim_span(masked: str, span: Tuple[int, int]) -> Tuple[int, int]:
+    """Drop leading whitespace and comments so blocks start at the statement itself."""
+    start, end = span
+    while start < end and masked[start].isspace():
+        start += 1
+    return start, end
+
+def _last_end(masked: str, start: int, end: int) -> int:
+    """Offset of the END closing the procedure body."""
+    ends = list(re.finditer(r"\bEND\b", masked[start:end], re.I))
+    return start + ends[-1].start() if ends else end
+
+def _build(
+    dialect: str, text: str, masked: str, header_end: int, body_start: int, blocks: List[Tuple[int, int]],
+    declarations: Optional[str] = None,
+) -> ProcedureSegments:
+    if declarations is None:
+        first_block = blocks[0][0] if blocks else len(text)
+        declarations = "\n".join(
+            text[span[0]:span[1]].strip()
+            for span, words in _top_level_statements(masked, body_start, first_block)
+            if words and words[0] == "DECLARE"
+        )
+    skeleton, previous = [], 0
+    for index, (start, end) in enumerate(blocks, start=1):
+        skeleton.append(text[previous:start])
+        skeleton.append(PLACEHOLDER.format(index=index))
+        previous = end
+    skeleton.append(text[previous:])
+    return ProcedureSegments(
+        dialect=dialect,
+        header=text[:header_end].strip(),
+        declarations=declarations,
+        skeleton="".join(skeleton),
+        blocks=[text[start:end].strip() for start, end in blocks],
+    )
+
+# =============================================================================
+# Dialect Segmenters
+# =============================================================================
+
+def _segment_postgresql(text: str, masked: str) -> Optional[ProcedureSegments]:
+    delimiter = re.search(r"\bAS\s+(\$\w*\$)", masked, re.I)
+    if delimiter is None:
+        return None
+    header_end = delimiter.end()
+    body_end = masked.find(delimiter.group(1), header_end)
+    begin = re.compile(r"\bBEGIN\b", re.I).search(masked, header_end, body_end if body_end != -1 else len(masked))
+    if begin is None:
+        return None
+    body_start = begin.end()
+    last_end = _last_end(masked, body_start, body_end if body_end != -1 else len(masked))
+
+    blocks: List[Tuple[int, int]] = []
+    pending: Optional[Tuple[str, int, int]] = None
+    for span, words in _top_level_statements(masked, body_start, last_end):
+        if words[:1] == ["OPEN"] and len(words) > 1:
+            pending = (words[1], *_trim_span(masked, span))
+            blocks.append((pending[1], pending[2]))
+        elif pending and words[:2] == ["RETURN", "NEXT"] and len(words) > 2 and words[2] == pending[0]:
+            blocks[-1] = (pending[1], span[1])
+            pending = None
+        else:
+            pending = None
+    if re.search(r"\bOPEN\s+\w+\s+FOR\b", masked[body_start:last_end], re.I) and not blocks:
+        return None
+    # PL/pgSQL declarations live between the body delimiter and BEGIN.
+    declarations = text[header_end:begin.start()].strip()
+    return _build("postgresql", text, masked, header_end, body_start, blocks, declarations)
+
+def _segment_sqlserver(text: str, masked: str) -> Optional[ProcedureSegments]:
+    header = re.search(r"\bAS\b\s*(?:BEGIN\b)?", masked, re.I)
+    if header is None:
+        return None
+    header_end = header.end()
+    blocks: List[Tuple[int, int]] = []
+    previous = header_end
+    for call in re.finditer(r"\bEXEC(?:UTE)?\s+(?:sys\.)?sp_executesql\s+(@\w+)", masked, re.I):
+        variable = re.escape(call.group(1))
+        initializer = re.compile(
+            rf"^[ \t]*(?:DECLARE\s+{variable}\b[^;\n]*=|SET\s+{variable}\s*=(?!\s*{variable}\b))",
+            re.I | re.M,
+        ).search(masked, previous, call.start())
+        if initializer is None:
+            continue
+        line_end = masked.find("\n", call.end())
+        semicolon = masked.find(";", call.end(), line_end if line_end != -1 else len(masked))
+        end = semicolon + 1 if semicolon != -1 else (line_end if line_end != -1 else len(masked))
+        blocks.append(_trim_span(masked, (initializer.start(), end)))
+        previous = end
+    return _build("sqlserver", text, masked, header_end, header_end, blocks)
+
+def _segment_mysql(text: str, masked: str) -> Optional[ProcedureSegments]:
+    signature = re.search(r"\bPROCEDURE\b", masked, re.I)
+    if signature is None:
+        return None
+    begin = re.compile(r"\bBEGIN\b", re.I).search(masked, signature.end())
+    if begin is None:
+        return None
+    body_start = begin.end()
+    last_end = _last_end(masked, body_start, len(masked))
+
+    blocks = []
+    for span, words in _top_level_statements(masked, body_start, last_end):
+        if words[:1] in (["SELECT"], ["WITH"]) and not re.search(r"\bINTO\b", _flatten(masked[span[0]:span[1]]), re.I):
+            blocks.append(_trim_span(masked, span))
+    return _build("mysql", text, masked, body_start, body_start, blocks)
+
+def _flatten(masked_piece: str) -> str:
+    """Drop parenthesised sub-expressions so only top-level keywords remain."""
+    previous = None
+    while previous != masked_piece:
+        previous = masked_piece
+        masked_piece = re.sub(r"\([^()]*\)", " ", masked_piece)
+    return masked_piece
+
+_SEGMENTERS = {
+    "postgresql": _segment_postgresql,
+    "sqlserver": _segment_sqlserver,
+    "mysql": _segment_mysql,
+}
+
+def segment_procedure(sql: str, dialect: str) -> Optional[ProcedureSegments]:
+    """Split a procedure into header, declarations and result-set blocks.
+
+    Returns None when the procedure's layout is not recognised.
+    """
+    segmenter = _SEGMENTERS.get(dialect)
+    if segmenter is None:
+        return None
+    return segmenter(sql, _mask(sql, dialect))
+
+_ROUTINE_NAME = re.compile(r"(?:PROCEDURE|FUNCTION)\s+((?:[\w\[\]`\"]+\s*\.\s*)*[\w\[\]`\"]+)", re.I)
+
+def routine_name(sql: str) -> Optional[str]:
+    """Schema-qualified name of the procedure or function ``sql`` defines, without quoting."""
+    keyword = re.search(r"\b(?:PROCEDURE|FUNCTION)\b", _mask(sql), re.I)
+    match = _ROUTINE_NAME.match(sql, keyword.start()) if keyword else None
+    if match is None:
+        return None
+    return re.sub(r"[\[\]`\"\s]", "", match.group(1))
+
+def stitch(converted_skeleton: str, converted_blocks: List[str]) -> Optional[str]:
+    """Replace placeholders in a converted skeleton with the converted blocks.
+
+    Returns None unless every placeholder appears exactly once.
+    """
+    found = [int(index) for index in PLACEHOLDER_PATTERN.findall(converted_skeleton)]
+    if sorted(found) != list(range(1, len(converted_blocks) + 1)):
+        return None
+
+    def replace(match: re.Match) -> str:
+        line_start = converted_skeleton.rfind("\n", 0, match.start()) + 1
+        indent = re.match(r"[ \t]*", converted_skeleton[line_start:match.start()]).group()
+        block = converted_blocks[int(match.group(1)) - 1].strip()
+        return block.replace("\n", "\n" + indent)
+
+    return PLACEHOLDER_PATTERN.sub(replace, converted_skeleton)
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+from scheduler import SharedPriority, current_priority
+
+T = TypeVar("T")
+
+# =============================================================================
+# Request Coalescing
+# =============================================================================
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key.
+
+    The call runs in its own task, so a caller going away does not cancel
+    it for the others; it is only cancelled once every caller has gone. It
+    runs at the highest priority of the callers waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._priorities: Dict[str, SharedPriority] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "coalesced": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            priority = SharedPriority(current_priority())
+            task = asyncio.ensure_future(priority.run(factory))
+            self._calls[key] = task
+            self._waiters[key] = 0
+            self._priorities[key] = priority
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self.stats["calls"] += 1
+        else:
+            self._priorities[key].join(current_priority())
+            self.stats["coalesced"] += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if key in self._waiters:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not task.done():
+                    task.cancel()
+            raise
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+            del self._priorities[key]
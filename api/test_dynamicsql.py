@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from dynamicsql import MAX_SHAPES, unroll_dynamic_sql
+from transpiler import UnsupportedConstruct
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+def read_example(name: str) -> str:
+    with open(os.path.join(EXAMPLES, name, "sqlserver.sql"), encoding="utf-8") as handle:
+        return handle.read()
+
+def test_spliced_lists_become_json_parameters():
+    result = unroll_dynamic_sql(read_example("sales_summary_brands"))
+    assert sorted(result.changes) == [
+        "@channels -> IN (SELECT value FROM OPENJSON(@channel))",
+        "@months -> IN (SELECT value FROM OPENJSON(@month))",
+        "@states -> IN (SELECT value FROM OPENJSON(@state))",
+        "@stores -> IN (SELECT value FROM OPENJSON(@store))",
+    ]
+    assert "' + @months + '" not in result.code
+    assert "@month NVARCHAR(MAX)" in result.code
+    assert result.shape_count == 128
+    assert len(result.shapes) == 128
+    assert all("OPENJSON(@month)" in shape.sql for shape in result.shapes if "MONTH(" in shape.sql)
+
+def test_rewrite_is_idempotent():
+    once = unroll_dynamic_sql(read_example("sales_summary_brands")).code
+    twice = unroll_dynamic_sql(once)
+    assert twice.code == once
+    assert twice.changes == []
+
+def test_scalars_become_parameters_and_identifiers_stay():
+    code = """CREATE PROCEDURE dbo.Search @name NVARCHAR(100), @minQty INT, @sort SYSNAME
+AS
+BEGIN
+    DECLARE @q NVARCHAR(MAX) = N'SELECT * FROM dbo.Items WHERE Qty >= ' + CAST(@minQty AS NVARCHAR(10));
+    IF @name IS NOT NULL
+        SET @q += N' AND Name = ''' + @name + '''';
+    SET @q = @q + N' ORDER BY ' + QUOTENAME(@sort);
+    EXEC sp_executesql @q;
+END"""
+    result = unroll_dynamic_sql(code)
+    assert "WHERE Qty >= @minQty" in result.code
+    assert "AND Name = @name" in result.code
+    assert "EXEC sp_executesql @q, N'@minQty INT, @name NVARCHAR(100)', @minQty, @name;" in result.code
+    assert result.notes == ["QUOTENAME(@sort) supplies an identifier, which cannot be a parameter"]
+
+@pytest.mark.parametrize("body", [
+    """DECLARE @i INT = 0;
+    WHILE @i < 3
+    BEGIN
+        SET @Sql = @Sql + N' UNION ALL SELECT 1';
+        SET @i = @i + 1;
+    END""",
+    "SELECT @Sql = @Sql + N' AND ' + Predicate FROM dbo.Filters;",
+])
+def test_untraceable_construction_is_unsupported(body):
+    code = f"""CREATE PROCEDURE dbo.Built
+AS
+BEGIN
+    DECLARE @Sql NVARCHAR(MAX) = N'SELECT 1';
+    {body}
+    EXEC sp_executesql @Sql;
+END"""
+    with pytest.raises(UnsupportedConstruct):
+        unroll_dynamic_sql(code)
+
+def test_shape_limit_bounds_the_work():
+    lines = [
+        "CREATE PROCEDURE dbo.ManyFilters " + ", ".join(f"@f{i} INT" for i in range(30)),
+        "AS",
+        "BEGIN",
+        "    DECLARE @Sql NVARCHAR(MAX) = N'SELECT * FROM dbo.Facts WHERE 1=1';",
+    ]
+    for i in range(30):
+        lines.append(f"    IF @f{i} IS NOT NULL")
+        lines.append(f"        SET @Sql = @Sql + N' AND C{i} = ' + CAST(@f{i} AS NVARCHAR(10));")
+    lines += ["    EXEC sp_executesql @Sql;", "END"]
+    started = time.perf_counter()
+    result = unroll_dynamic_sql("\n".join(lines))
+    assert time.perf_counter() - started < 5
+    assert result.shape_count == 2 ** 30
+    assert len(result.shapes) == MAX_SHAPES
@@ -0,0 +1,28 @@
+import os
+import re
+
+from families import derive, fingerprint
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+def read_example(name: str, dialect: str) -> str:
+    with open(os.path.join(EXAMPLES, name, f"{dialect}.sql"), encoding="utf-8") as handle:
+        return handle.read()
+
+def derive_renamed(example: str, old: str, new: str):
+    source = read_example(example, "sqlserver")
+    representative = fingerprint(source, "sqlserver")
+    member = fingerprint(re.sub(rf"\b{old}\b", new, source), "sqlserver")
+    assert member.key == representative.key
+    return derive(representative, read_example(example, "postgresql"), member, "postgresql", True)
+
+def test_rename_used_as_often_as_in_the_source():
+    code, problems = derive_renamed("sales_summary_brands", "BrandName", "LabelName")
+    assert problems == []
+    assert not re.search(r"\bbrandname\b", code, re.I)
+    assert re.search(r"\blabelname\b", code, re.I)
+
+def test_rename_used_less_often_than_in_the_source():
+    # MERGE becomes INSERT ... ON CONFLICT, which names the table fewer times.
+    _, problems = derive_renamed("upsert_store_inventory", "StoreInventory", "ShopInventory")
+    assert problems == ["storeinventory appears 2 times in the conversion, 4 in the source"]
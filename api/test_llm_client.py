@@ -0,0 +1,19 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import llm_client
+import metrics
+from llm_backends import MockBackend
+
+def test_stream_records_prompt_tokens():
+    messages = [SystemMessage(content="You convert SQL."), HumanMessage(content="Convert this to PostgreSQL: SELECT 1")]
+    llm_client.set_backend(MockBackend(latency_ms=0, tokens_per_second=100000))
+
+    async def consume():
+        return [chunk async for chunk in llm_client.stream_llm(messages)]
+
+    before = sum(metrics.prompt_tokens._sums.values())
+    asyncio.run(consume())
+    prompt, _ = llm_client.estimate_tokens(messages)
+    assert sum(metrics.prompt_tokens._sums.values()) - before == prompt
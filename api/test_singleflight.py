@@ -0,0 +1,56 @@
+import asyncio
+
+from scheduler import RateLimitScheduler, set_priority
+from singleflight import SingleFlight
+
+def test_joining_interactive_caller_raises_the_shared_call():
+    async def scenario():
+        scheduler = RateLimitScheduler(concurrency=1)
+        in_flight = SingleFlight()
+        admitted = []
+
+        async def upstream(name):
+            async with scheduler.slot():
+                admitted.append(name)
+
+        async def batch(work):
+            set_priority("batch")
+            return await work()
+
+        await scheduler.acquire()
+        other = asyncio.ensure_future(batch(lambda: upstream("other batch work")))
+        first = asyncio.ensure_future(batch(lambda: in_flight.run("k", lambda: upstream("shared"))))
+        await asyncio.sleep(0)
+        joined = asyncio.ensure_future(in_flight.run("k", lambda: upstream("never runs")))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(other, first, joined)
+        return admitted, in_flight.stats
+
+    admitted, stats = asyncio.run(scenario())
+    assert admitted == ["shared", "other batch work"]
+    assert stats == {"calls": 1, "coalesced": 1}
+
+def test_shared_call_keeps_its_priority_without_joiners():
+    async def scenario():
+        scheduler = RateLimitScheduler(concurrency=1)
+        in_flight = SingleFlight()
+        admitted = []
+
+        async def upstream(name):
+            async with scheduler.slot():
+                admitted.append(name)
+
+        async def batch(work):
+            set_priority("batch")
+            return await work()
+
+        await scheduler.acquire()
+        other = asyncio.ensure_future(batch(lambda: upstream("other batch work")))
+        first = asyncio.ensure_future(batch(lambda: in_flight.run("k", lambda: upstream("shared"))))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(other, first)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["other batch work", "shared"]
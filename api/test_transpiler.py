@@ -0,0 +1,68 @@
+import pytest
+
+from transpiler import UnsupportedConstruct, transpile
+
+TRANSLATIONS = [
+    # (source dialect, target dialect, source query, expected translation)
+    ("sqlserver", "postgresql",
+     "SELECT TOP 10 name FROM dbo.customers WITH (NOLOCK) WHERE ISNULL(city, 'x') = 'y' ORDER BY name",
+     "SELECT name FROM customers WHERE COALESCE(city, 'x') = 'y' ORDER BY name LIMIT 10"),
+    ("mysql", "sqlserver",
+     "SELECT name FROM customers ORDER BY name LIMIT 5",
+     "SELECT TOP 5 name FROM customers ORDER BY name"),
+    ("mysql", "postgresql",
+     "SELECT id FROM t WHERE FIND_IN_SET(id, '1,2,3')",
+     "SELECT id FROM t WHERE (CAST(id AS text) = ANY(string_to_array('1,2,3', ',')))"),
+    ("mysql", "sqlserver", "SELECT IFNULL(a, 0), NOW() FROM t", "SELECT ISNULL(a, 0), GETDATE() FROM t"),
+    ("sqlserver", "mysql", "SELECT LEN(name), GETDATE() FROM t", "SELECT CHAR_LENGTH(name), NOW() FROM t"),
+    ("mysql", "sqlserver", "SELECT `order` FROM `t`", "SELECT [order] FROM [t]"),
+    ("postgresql", "mysql", "SELECT id FROM t WHERE x = ANY(ARRAY[1, 2])", "SELECT id FROM t WHERE x IN (1, 2)"),
+    ("postgresql", "sqlserver", "SELECT CAST(a AS VARCHAR(10)) FROM t", "SELECT CAST(a AS NVARCHAR(10)) FROM t"),
+    ("mysql", "sqlserver",
+     "SELECT SUBSTRING(name, 2, 3), ROUND(x, 2), LTRIM(name), COUNT(*) FROM t",
+     "SELECT SUBSTRING(name, 2, 3), ROUND(x, 2), LTRIM(name), COUNT(*) FROM t"),
+    ("sqlserver", "postgresql",
+     "SELECT ROW_NUMBER() OVER (ORDER BY id), LAG(id, 1, 0) OVER (ORDER BY id) FROM t",
+     "SELECT ROW_NUMBER() OVER (ORDER BY id), LAG(id, 1, 0) OVER (ORDER BY id) FROM t"),
+    ("sqlserver", "mysql", "SELECT 1 + 2 AS three", "SELECT 1 + 2 AS three"),
+    ("sqlserver", "postgresql", "SELECT a / b FROM t", "SELECT a / b FROM t"),
+    # CONCAT skips NULLs in SQL Server and PostgreSQL, but returns NULL for any NULL in MySQL.
+    ("sqlserver", "postgresql",
+     "SELECT CONCAT(first_name, ' ', middle_name) AS n FROM people",
+     "SELECT CONCAT(first_name, ' ', middle_name) AS n FROM people"),
+    ("postgresql", "mysql",
+     "SELECT CONCAT(first_name, ' ', middle_name) AS n FROM people",
+     "SELECT CONCAT(COALESCE(first_name, ''), ' ', COALESCE(middle_name, '')) AS n FROM people"),
+]
+
+UNSUPPORTED = [
+    ("mysql", "postgresql", "SELECT CONCAT(first_name, ' ', middle_name) AS n FROM people"),
+    ("mysql", "sqlserver", "SELECT CONCAT(first_name, ' ', middle_name) AS n FROM people"),
+    ("postgresql", "sqlserver", "SELECT name FROM customers ORDER BY name LIMIT 5 OFFSET 10"),
+    ("sqlserver", "mysql", "SELECT 'a' + name FROM t"),
+    ("sqlserver", "mysql", "SELECT * FROM t WHERE id = @id"),
+    ("sqlserver", "postgresql", "UPDATE t SET a = 1"),
+    # Portable functions are only copied through in a form every dialect accepts.
+    ("postgresql", "sqlserver", "SELECT SUBSTRING(name FROM 2 FOR 3) FROM t"),
+    ("mysql", "sqlserver", "SELECT SUBSTRING(name, 2) FROM t"),
+    ("postgresql", "sqlserver", "SELECT ROUND(x) FROM t"),
+    ("postgresql", "sqlserver", "SELECT LTRIM(name, 'x') FROM t"),
+    ("sqlserver", "mysql", "SELECT ROUND(x, 2, 1) FROM t"),
+    # MySQL's / returns a decimal where the others divide integers as integers.
+    ("sqlserver", "mysql", "SELECT SUM(a)/COUNT(*) FROM t"),
+    ("postgresql", "mysql", "SELECT 7/2"),
+    ("mysql", "postgresql", "SELECT a / b FROM t"),
+    # SQL Server's + concatenates strings; MySQL adds them as numbers.
+    ("sqlserver", "mysql", "SELECT a.FirstName + a.LastName FROM people a"),
+    ("sqlserver", "postgresql", "SELECT price + 1 FROM t"),
+    ("mysql", "sqlserver", "SELECT a + b FROM t"),
+]
+
+@pytest.mark.parametrize("source, target, sql, expected", TRANSLATIONS)
+def test_translation(source, target, sql, expected):
+    assert transpile(sql, source, target) == expected
+
+@pytest.mark.parametrize("source, target, sql", UNSUPPORTED)
+def test_left_to_the_model(source, target, sql):
+    with pytest.raises(UnsupportedConstruct):
+        transpile(sql, source, target)
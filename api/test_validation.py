@@ -0,0 +1,15 @@
+import pytest
+
+from validation import validate_output
+
+@pytest.mark.parametrize("code", [
+    "SELECT 'it\\'s' AS x FROM t;",
+    "SELECT 'a\\\\', ')' AS x FROM t;",
+    "SELECT \"say \\\"hi\\\"\" AS x FROM t;",
+])
+def test_mysql_backslash_escapes(code):
+    assert validate_output(code, "mysql", False) == []
+
+def test_backslash_is_not_an_escape_elsewhere():
+    assert validate_output("SELECT 'C:\\' AS path FROM t;", "postgresql", False) == []
+    assert validate_output("SELECT 'it\\'s' AS x FROM t;", "postgresql", False) == ["unterminated string literal"]
@@ -0,0 +1,717 @@
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# =============================================================================
+# Local Dialect Transpiler
+# =============================================================================
+#
+# Rule-based translation of plain SELECT queries between SQL Server,
+# PostgreSQL and MySQL. Anything outside the supported subset raises
+# UnsupportedConstruct so the caller can fall back to the LLM; the
+# transpiler never guesses.
+
+class UnsupportedConstruct(Exception):
+    """Raised when a query uses syntax the local transpiler cannot translate."""
+
+class Token(NamedTuple):
+    kind: str   # ws, comment, string, ident, word, number, param, op, punct
+    text: str   # source text (for strings and idents: the unquoted value)
+    prefix: str = ""  # N for SQL Server national strings
+
+# =============================================================================
+# Tokenizer
+# =============================================================================
+
+_COMMON_PATTERNS = [
+    ("ws", r"\s+"),
+    ("comment", r"--[^\n]*|/\*.*?\*/"),
+]
+
+_DIALECT_PATTERNS = {
+    "sqlserver": [
+        ("string", r"N?'(?:[^']|'')*'"),
+        ("ident", r"\[(?:[^\]]|\]\])*\]|\"(?:[^\"]|\"\")*\""),
+        ("param", r"@@?\w+"),
+        ("word", r"[A-Za-z_#][\w#$@]*"),
+    ],
+    "postgresql": [
+        ("string", r"'(?:[^']|'')*'"),
+        ("ident", r"\"(?:[^\"]|\"\")*\""),
+        ("param", r"\$\d+"),
+        ("word", r"[A-Za-z_][\w$]*"),
+    ],
+    "mysql": [
+        ("comment", r"\#[^\n]*"),
+        ("string", r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""),
+        ("ident", r"`(?:[^`]|``)*`"),
+        ("param", r"@@?\w+"),
+        ("word", r"[A-Za-z_][\w$]*"),
+    ],
+}
+
+_TAIL_PATTERNS = [
+    ("number", r"\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+"),
+    ("op", r"::|<>|!=|<=|>=|\|\||[-+*/%=<>~!&|^?]"),
+    ("punct", r"[(),;.\[\]]"),
+]
+
+_TOKENIZERS = {
+    dialect: re.compile(
+        "|".join(f"(?P<{kind}{i}>{pattern})" for i, (kind, pattern) in enumerate(_COMMON_PATTERNS + patterns + _TAIL_PATTERNS)),
+        re.DOTALL,
+    )
+    for dialect, patterns in _DIALECT_PATTERNS.items()
+}
+
+_MYSQL_ESCAPES = {"0": "\0", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+def _unquote_string(text: str, dialect: str) -> Token:
+    prefix = ""
+    if text[0] in "Nn":
+        prefix, text = "N", text[1:]
+    quote, body = text[0], text[1:-1]
+    body = body.replace(quote * 2, quote)
+    if dialect == "mysql":
+        body = re.sub(
+            r"\\(.)",
+            lambda m: m.group(0) if m.group(1) in "%_" else _MYSQL_ESCAPES.get(m.group(1), m.group(1)),
+            body,
+        )
+    return Token("string", body, prefix)
+
+def _unquote_ident(text: str) -> Token:
+    closing = "]" if text[0] == "[" else text[0]
+    return Token("ident", text[1:-1].replace(closing * 2, closing))
+
+def tokenize(sql: str, dialect: str) -> List[Token]:
+    """Split SQL into tokens using the lexical rules of ``dialect``."""
+    pattern = _TOKENIZERS[dialect]
+    tokens: List[Token] = []
+    position = 0
+    while position < len(sql):
+        match = pattern.match(sql, position)
+        if match is None:
+            raise UnsupportedConstruct(f"Unexpected character {sql[position]!r}")
+        kind = re.sub(r"\d+$", "", match.lastgroup)
+        text = match.group()
+        if kind == "string":
+            tokens.append(_unquote_string(text, dialect))
+        elif kind == "ident":
+            tokens.append(_unquote_ident(text))
+        else:
+            tokens.append(Token(kind, text))
+        position = match.end()
+    return tokens
+
+# =============================================================================
+# Rendering
+# =============================================================================
+
+_SIMPLE_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _render_token(token: Token, dialect: str) -> str:
+    if token.kind == "string":
+        prefix = token.prefix if dialect == "sqlserver" else ""
+        return prefix + "'" + token.text.replace("'", "''") + "'"
+    if token.kind == "ident":
+        if dialect == "sqlserver":
+            return "[" + token.text.replace("]", "]]") + "]"
+        if dialect == "mysql":
+            return "`" + token.text.replace("`", "``") + "`"
+        # PostgreSQL folds unquoted names to lowercase, matching our schema.
+        if _SIMPLE_IDENTIFIER.match(token.text) and token.text.upper() not in _RESERVED_WORDS:
+            return token.text
+        return '"' + token.text.replace('"', '""') + '"'
+    if token.kind == "comment" and token.text.startswith("#"):
+        return "--" + token.text[1:]
+    return token.text
+
+def render(tokens: List[Token], dialect: str) -> str:
+    return "".join(_render_token(token, dialect) for token in tokens)
+
+# =============================================================================
+# Translation Rules
+# =============================================================================
+
+_RESERVED_WORDS = {
+    "ALL", "AND", "ANY", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "DESC", "DISTINCT",
+    "ELSE", "END", "FROM", "FULL", "GROUP", "HAVING", "IN", "INNER", "IS", "JOIN", "LEFT",
+    "LIKE", "LIMIT", "NOT", "NULL", "ON", "OR", "ORDER", "OUTER", "RIGHT", "SELECT", "TABLE",
+    "THEN", "TO", "UNION", "USER", "WHEN", "WHERE", "WITH",
+}
+
+# Words that may be followed by "(" without being a function call.
+_PAREN_KEYWORDS = {
+    "AS", "IN", "ON", "AND", "OR", "NOT", "WHERE", "FROM", "JOIN", "SELECT", "EXISTS", "OVER",
+    "USING", "THEN", "ELSE", "WHEN", "CASE", "BY", "DISTINCT", "HAVING", "BETWEEN", "IS",
+    "LIKE", "UNION", "ALL", "ANY", "SOME", "EXCEPT", "INTERSECT", "WITH", "END",
+}
+
+# Functions spelled and behaving the same way in all three dialects, with
+# the argument counts (min, max) every dialect accepts; None means no limit.
+_PORTABLE_FUNCTIONS = {
+    "COUNT": (1, 1), "SUM": (1, 1), "AVG": (1, 1), "MIN": (1, 1), "MAX": (1, 1),
+    "COALESCE": (2, None), "NULLIF": (2, 2), "ABS": (1, 1), "ROUND": (1, 2), "FLOOR": (1, 1),
+    "CEILING": (1, 1), "UPPER": (1, 1), "LOWER": (1, 1), "LTRIM": (1, 1), "RTRIM": (1, 1),
+    "REPLACE": (3, 3), "SUBSTRING": (2, 3),
+    "ROW_NUMBER": (0, 0), "RANK": (0, 0), "DENSE_RANK": (0, 0), "NTILE": (1, 1),
+    "LAG": (1, 3), "LEAD": (1, 3), "FIRST_VALUE": (1, 1), "LAST_VALUE": (1, 1),
+    "POWER": (2, 2), "SQRT": (1, 1), "EXP": (1, 1), "SIGN": (1, 1),
+}
+
+# Narrower argument counts a target dialect requires.
+_TARGET_ARITY = {
+    ("SUBSTRING", "sqlserver"): (3, 3),
+    ("ROUND", "sqlserver"): (2, 2),
+}
+
+# Keywords that turn a function's arguments into special syntax, as in
+# PostgreSQL's SUBSTRING(x FROM 2 FOR 3).
+_ARGUMENT_KEYWORDS = {"FROM", "FOR", "USING", "PLACING", "SIMILAR"}
+
+# Keywords that only exist in (or mean something else in) one dialect.
+_SOURCE_ONLY_WORDS = {
+    "sqlserver": {"APPLY", "PIVOT", "UNPIVOT", "OUTPUT", "OPTION", "XML", "FETCH", "OFFSET", "INTO", "GO"},
+    "postgresql": {"ILIKE", "SIMILAR", "LATERAL", "RETURNING", "FILTER", "NULLS", "INTERVAL", "INTO", "FETCH"},
+    "mysql": {"STRAIGHT_JOIN", "SQL_CALC_FOUND_ROWS", "REGEXP", "RLIKE", "DIV", "INTERVAL", "INTO", "DUAL", "XOR"},
+}
+
+_TARGET_MISSING_WORDS = {
+    "sqlserver": {"TRUE", "FALSE", "RECURSIVE"},
+    "postgresql": set(),
+    "mysql": {"FULL"},
+}
+
+_TABLE_HINTS = {
+    "NOLOCK", "READUNCOMMITTED", "READCOMMITTED", "READPAST", "ROWLOCK", "PAGLOCK", "TABLOCK",
+    "TABLOCKX", "UPDLOCK", "HOLDLOCK", "NOWAIT", "XLOCK", "REPEATABLEREAD", "SERIALIZABLE",
+}
+
+_DATE_PARTS = {"YEAR", "MONTH", "DAY"}
+
+_COMPARISON_OPS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+
+def _word(text: str) -> Token:
+    return Token("word", text)
+
+def _punct(text: str) -> Token:
+    return Token("punct", text)
+
+_SPACE = Token("ws", " ")
+_COMMA = [_punct(","), _SPACE]
+
+def _is_significant(token: Token) -> bool:
+    return token.kind not in ("ws", "comment")
+
+def _upper(token: Token) -> str:
+    return token.text.upper() if token.kind == "word" else ""
+
+def _next_index(tokens: List[Token], index: int) -> Optional[int]:
+    for i in range(index + 1, len(tokens)):
+        if _is_significant(tokens[i]):
+            return i
+    return None
+
+def _previous_index(tokens: List[Token], index: int) -> Optional[int]:
+    for i in range(index - 1, -1, -1):
+        if _is_significant(tokens[i]):
+            return i
+    return None
+
+def _matching_paren(tokens: List[Token], index: int, opening: str = "(", closing: str = ")") -> int:
+    depth = 0
+    for i in range(index, len(tokens)):
+        if tokens[i].kind == "punct":
+            if tokens[i].text == opening:
+                depth += 1
+            elif tokens[i].text == closing:
+                depth -= 1
+                if depth == 0:
+                    return i
+    raise UnsupportedConstruct("Unbalanced parentheses")
+
+def _strip(tokens: List[Token]) -> List[Token]:
+    start, end = 0, len(tokens)
+    while start < end and not _is_significant(tokens[start]):
+        start += 1
+    while end > start and not _is_significant(tokens[end - 1]):
+        end -= 1
+    return tokens[start:end]
+
+def _split_args(tokens: List[Token]) -> List[List[Token]]:
+    args, current, depth = [], [], 0
+    for token in tokens:
+        if token.kind == "punct" and token.text in "([":
+            depth += 1
+        elif token.kind == "punct" and token.text in ")]":
+            depth -= 1
+        if depth == 0 and token.kind == "punct" and token.text == ",":
+            args.append(_strip(current))
+            current = []
+        else:
+            current.append(token)
+    if _strip(current) or args:
+        args.append(_strip(current))
+    return args
+
+def _join_args(args: List[List[Token]]) -> List[Token]:
+    joined: List[Token] = []
+    for i, arg in enumerate(args):
+        if i:
+            joined.extend(_COMMA)
+        joined.extend(arg)
+    return joined
+
+def _call(name: str, args: List[List[Token]]) -> List[Token]:
+    return [_word(name), _punct("(")] + _join_args(args) + [_punct(")")]
+
+def _is_literal_list(tokens: List[Token]) -> bool:
+    items = _split_args(tokens)
+    return bool(items) and all(
+        len(item) == 1 and item[0].kind in ("string", "number")
+        or len(item) == 2 and item[0].text == "-" and item[1].kind == "number"
+        for item in items
+    )
+
+def _depths(tokens: List[Token]) -> List[int]:
+    depths, depth = [], 0
+    for token in tokens:
+        if token.kind == "punct" and token.text == ")":
+            depth -= 1
+        depths.append(depth)
+        if token.kind == "punct" and token.text == "(":
+            depth += 1
+    return depths
+
+# -- cast types ----------------------------------------------------------------
+
+_CAST_TYPES: Dict[str, Dict[str, Callable[[Optional[str]], str]]] = {
+    "integer": {
+        "sqlserver": lambda n: "INT", "postgresql": lambda n: "INTEGER", "mysql": lambda n: "SIGNED",
+    },
+    "bigint": {
+        "sqlserver": lambda n: "BIGINT", "postgresql": lambda n: "BIGINT", "mysql": lambda n: "SIGNED",
+    },
+    "decimal": {
+        "sqlserver": lambda n: f"DECIMAL({n})" if n else "DECIMAL",
+        "postgresql": lambda n: f"NUMERIC({n})" if n else "NUMERIC",
+        "mysql": lambda n: f"DECIMAL({n})" if n else "DECIMAL",
+    },
+    "date": {
+        "sqlserver": lambda n: "DATE", "postgresql": lambda n: "DATE", "mysql": lambda n: "DATE",
+    },
+    "timestamp": {
+        "sqlserver": lambda n: "DATETIME2", "postgresql": lambda n: "TIMESTAMP", "mysql": lambda n: "DATETIME",
+    },
+    "float": {
+        "sqlserver": lambda n: "FLOAT", "postgresql": lambda n: "DOUBLE PRECISION", "mysql": lambda n: "DOUBLE",
+    },
+    "text": {
+        "sqlserver": lambda n: f"NVARCHAR({n or 'MAX'})",
+        "postgresql": lambda n: f"VARCHAR({n})" if n else "TEXT",
+        "mysql": lambda n: f"CHAR({n})" if n else "CHAR",
+    },
+}
+
+_CAST_TYPE_ALIASES = {
+    "INT": "integer", "INTEGER": "integer", "SIGNED": "integer", "SMALLINT": "integer",
+    "BIGINT": "bigint",
+    "DECIMAL": "decimal", "NUMERIC": "decimal",
+    "DATE": "date",
+    "DATETIME": "timestamp", "DATETIME2": "timestamp", "TIMESTAMP": "timestamp",
+    "FLOAT": "float", "DOUBLE": "float", "REAL": "float",
+    "VARCHAR": "text", "NVARCHAR": "text", "CHAR": "text", "NCHAR": "text", "TEXT": "text",
+}
+
+def _translate_cast_type(tokens: List[Token], target: str) -> List[Token]:
+    words = [token for token in tokens if _is_significant(token)]
+    if not words or words[0].kind != "word":
+        raise UnsupportedConstruct("Unrecognised CAST type")
+    name = words[0].text.upper()
+    if name == "DOUBLE" and len(words) > 1 and _upper(words[1]) == "PRECISION":
+        words = words[1:]
+    size = None
+    if len(words) > 1:
+        if words[1].text != "(" or words[-1].text != ")":
+            raise UnsupportedConstruct(f"Unrecognised CAST type {name}")
+        size = ",".join(token.text for token in words[2:-1] if token.text != ",")
+        if size.upper() == "MAX":
+            size = None
+    family = _CAST_TYPE_ALIASES.get(name)
+    if family is None:
+        raise UnsupportedConstruct(f"CAST to {name} is not supported locally")
+    return [_word(_CAST_TYPES[family][target](size))]
+
+# =============================================================================
+# Translator
+# =============================================================================
+
+class _Translator:
+    def __init__(self, source: str, target: str):
+        self.source = source
+        self.target = target
+
+    def run(self, tokens: List[Token]) -> List[Token]:
+        self._check_statement(tokens)
+        if self.source == "sqlserver":
+            tokens = self._remove_table_hints(tokens)
+        tokens = self._rewrite_row_limit(tokens)
+        return self._translate(tokens)
+
+    # -- statement level -------------------------------------------------------
+
+    def _check_statement(self, tokens: List[Token]) -> None:
+        significant = [token for token in tokens if _is_significant(token)]
+        if not significant or _upper(significant[0]) not in ("SELECT", "WITH"):
+            raise UnsupportedConstruct("Only SELECT queries are translated locally")
+        for i, token in enumerate(significant):
+            if token.kind == "punct" and token.text == ";" and i != len(significant) - 1:
+                raise UnsupportedConstruct("Multiple statements")
+            if token.kind == "param" or token.text == "?":
+                raise UnsupportedConstruct(f"Variable or parameter {token.text}")
+            if token.kind == "op" and token.text in ("::", "||", "~", "^", "&", "|"):
+                raise UnsupportedConstruct(f"Operator {token.text}")
+            if token.kind == "word":
+                upper = token.text.upper()
+                if upper.startswith("#"):
+                    raise UnsupportedConstruct(f"Temporary table {token.text}")
+                if upper in _SOURCE_ONLY_WORDS[self.source] or upper in _TARGET_MISSING_WORDS[self.target]:
+                    raise UnsupportedConstruct(f"{token.text} has no local translation")
+            if token.kind == "op" and token.text == "/" and "mysql" in (self.source, self.target):
+                # MySQL's / always returns a decimal; the others divide integers as integers.
+                raise UnsupportedConstruct("Division across the MySQL boundary")
+            if token.kind == "op" and token.text == "+" and "sqlserver" in (self.source, self.target):
+                # SQL Server's + concatenates strings; elsewhere it only adds numbers.
+                operands = [significant[j] for j in (i - 1, i + 1) if 0 <= j < len(significant)]
+                if len(operands) != 2 or any(operand.kind != "number" for operand in operands):
+                    raise UnsupportedConstruct("+ on operands that may be strings")
+    def _remove_table_hints(self, tokens: List[Token]) -> List[Token]:
+        """Drop WITH (NOLOCK)-style table hints, which only SQL Server understands."""
+        result: List[Token] = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            start = i
+            if _upper(token) == "WITH":
+                nxt = _next_index(tokens, i)
+                if nxt is not None and tokens[nxt].text == "(":
+                    start = nxt
+            if tokens[start].kind == "punct" and tokens[start].text == "(":
+                close = _matching_paren(tokens, start)
+                inner = [t for t in tokens[start + 1:close] if _is_significant(t) and t.text != ","]
+                if inner and all(_upper(t) in _TABLE_HINTS for t in inner):
+                    while result and not _is_significant(result[-1]):
+                        result.pop()
+                    i = close + 1
+                    continue
+                if start != i:
+                    raise UnsupportedConstruct("Unsupported table hint")
+            result.append(token)
+            i += 1
+        return result
+
+    def _rewrite_row_limit(self, tokens: List[Token]) -> List[Token]:
+        """Translate TOP n <-> LIMIT n for the outermost query."""
+        depths = _depths(tokens)
+        top_level_selects = [
+            i for i, token in enumerate(tokens) if _upper(token) == "SELECT" and depths[i] == 0
+        ]
+
+        if self.source == "sqlserver":
+            tops = [i for i, token in enumerate(tokens) if _upper(token) == "TOP"]
+            if not tops:
+                return tokens
+            if len(tops) > 1 or depths[tops[0]] != 0 or len(top_level_selects) != 1:
+                raise UnsupportedConstruct("TOP outside a single outer SELECT")
+            start = tops[0]
+            value = end = _next_index(tokens, start)
+            if value is not None and tokens[value].text == "(":
+                end = _matching_paren(tokens, value)
+                value = _next_index(tokens, value)
+                if _next_index(tokens, value) != end:
+                    value = None
+            if value is None or tokens[value].kind != "number":
+                raise UnsupportedConstruct("TOP with a non-literal row count")
+            after = _next_index(tokens, end)
+            if after is not None and _upper(tokens[after]) in ("PERCENT", "WITH"):
+                raise UnsupportedConstruct("TOP PERCENT / WITH TIES")
+            body = tokens[:start] + tokens[end + 1:]
+            if body[start - 1].kind == "ws" and start < len(body) and body[start].kind == "ws":
+                del body[start]
+            return self._append_clause(body, [_word("LIMIT"), _SPACE, tokens[value]])
+
+        limits = [i for i, token in enumerate(tokens) if _upper(token) == "LIMIT"]
+        offsets = [i for i, token in enumerate(tokens) if _upper(token) == "OFFSET"]
+        if not limits:
+            if offsets:
+                raise UnsupportedConstruct("OFFSET without LIMIT")
+            return tokens
+        if len(limits) > 1 or depths[limits[0]] != 0:
+            raise UnsupportedConstruct("LIMIT inside a subquery")
+        start = limits[0]
+        clause = [token for token in tokens[start + 1:] if _is_significant(token) and token.text != ";"]
+        texts = [token.text.upper() for token in clause]
+        if len(clause) == 1 and clause[0].kind == "number":
+            count, offset = clause[0].text, None
+        elif len(clause) == 3 and clause[1].text == "," and self.source == "mysql":
+            offset, count = clause[0].text, clause[2].text
+        elif len(clause) == 3 and texts[1] == "OFFSET":
+            count, offset = clause[0].text, clause[2].text
+        else:
+            raise UnsupportedConstruct("Unrecognised LIMIT clause")
+        if not (count.isdigit() and (offset is None or offset.isdigit())):
+            raise UnsupportedConstruct("LIMIT with a non-literal row count")
+        if offsets and (offset is None or offsets != [i for i in range(start, len(tokens)) if _upper(tokens[i]) == "OFFSET"]):
+            raise UnsupportedConstruct("OFFSET outside the LIMIT clause")
+
+        body = _strip(tokens[:start])
+        suffix = [_punct(";")] if self._ends_with_semicolon(tokens) else []
+        suffix += [token for comment in tokens[start:] if comment.kind == "comment" for token in (_SPACE, comment)]
+        if self.target != "sqlserver":
+            clause = [_word("LIMIT"), _SPACE, Token("number", count)]
+            if offset is not None:
+                clause += [_SPACE, _word("OFFSET"), _SPACE, Token("number", offset)]
+            return body + [_SPACE] + clause + suffix
+
+        if offset is not None:
+            raise UnsupportedConstruct("LIMIT with OFFSET has no TOP equivalent")
+        if len(top_level_selects) != 1:
+            raise UnsupportedConstruct("LIMIT on a set operation")
+        insert_at = top_level_selects[0] + 1
+        nxt = _next_index(body, top_level_selects[0])
+        if nxt is not None and _upper(body[nxt]) in ("DISTINCT", "ALL"):
+            insert_at = nxt + 1
+        top = [_SPACE, _word("TOP"), _SPACE, Token("number", count)]
+        return body[:insert_at] + top + body[insert_at:] + suffix
+
+    @staticmethod
+    def _ends_with_semicolon(tokens: List[Token]) -> bool:
+        last = _previous_index(tokens, len(tokens))
+        return last is not None and tokens[last].text == ";"
+
+    def _append_clause(self, tokens: List[Token], clause: List[Token]) -> List[Token]:
+        end = len(tokens)
+        while end and (not _is_significant(tokens[end - 1]) or tokens[end - 1].text == ";"):
+            end -= 1
+        return tokens[:end] + [_SPACE] + clause + tokens[end:]
+
+    # -- expression level ------------------------------------------------------
+
+    def _translate(self, tokens: List[Token]) -> List[Token]:
+        out: List[Token] = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            nxt = _next_index(tokens, i)
+            upper = _upper(token)
+
+            if token.kind == "punct" and token.text in "[]":
+                raise UnsupportedConstruct("Array subscripts")
+
+            if self.source == "sqlserver" and token.text.lower() == "dbo" and nxt is not None and tokens[nxt].text == ".":
+                # The dbo schema is a SQL Server convention with no counterpart elsewhere.
+                i = nxt + 1
+                continue
+
+            if upper == "IN" and nxt is not None and tokens[nxt].text == "(" and self.target == "postgresql":
+                close = _matching_paren(tokens, nxt)
+                inner = tokens[nxt + 1:close]
+                if _is_literal_list(inner):
+                    negated = self._pop_not(out)
+                    out.extend([
+                        _word("<> ALL" if negated else "= ANY"), _punct("("), _word("ARRAY"), _punct("["),
+                        *_join_args(_split_args(inner)), _punct("]"), _punct(")"),
+                    ])
+                    i = close + 1
+                    continue
+
+            if token.kind == "op" and token.text in ("=", "<>", "!=") and nxt is not None and _upper(tokens[nxt]) in ("ANY", "ALL", "SOME"):
+                quantified = self._translate_quantified(tokens, i, nxt)
+                if quantified is not None:
+                    replacement, i = quantified
+                    out.extend(replacement)
+                    continue
+
+            if token.kind == "word" and nxt is not None and tokens[nxt].text == "(" and upper not in _PAREN_KEYWORDS:
+                close = _matching_paren(tokens, nxt)
+                previous = _previous_index(tokens, i)
+                if previous is not None and tokens[previous].text == ".":
+                    raise UnsupportedConstruct(f"Schema-qualified function {token.text}")
+                following = _next_index(tokens, close)
+                out.extend(self._translate_function(token, tokens[nxt + 1:close], out, tokens[following] if following is not None else None))
+                i = close + 1
+                continue
+
+            if upper in ("ANY", "ALL", "SOME") and nxt is not None and tokens[nxt].text == "(":
+                close = _matching_paren(tokens, nxt)
+                first = _next_index(tokens, nxt)
+                if first is None or _upper(tokens[first]) != "SELECT":
+                    raise UnsupportedConstruct(f"{upper} over a non-subquery")
+
+            if upper == "NOW" or upper == "GETDATE":
+                raise UnsupportedConstruct(f"{token.text} without parentheses")
+            if upper == "CURRENT_DATE" and self.target == "sqlserver":
+                out.extend(_call("CAST", [[_word("GETDATE"), _punct("("), _punct(")"), _SPACE, _word("AS"), _SPACE, _word("DATE")]]))
+                i += 1
+                continue
+
+            out.append(token)
+            i += 1
+        return out
+
+    @staticmethod
+    def _pop_not(out: List[Token]) -> bool:
+        last = _previous_index(out, len(out))
+        if last is not None and _upper(out[last]) == "NOT":
+            del out[last:]
+            while out and not _is_significant(out[-1]):
+                out.pop()
+            out.append(_SPACE)
+            return True
+        return False
+
+    def _translate_quantified(self, tokens: List[Token], op_index: int, word_index: int):
+        """Rewrite PostgreSQL ``= ANY(ARRAY[...])`` as ``IN (...)`` for other dialects."""
+        if self.source != "postgresql":
+            return None
+        paren = _next_index(tokens, word_index)
+        if paren is None or tokens[paren].text != "(":
+            raise UnsupportedConstruct("Malformed quantified comparison")
+        close = _matching_paren(tokens, paren)
+        inner = _strip(tokens[paren + 1:close])
+        if inner and _upper(inner[0]) == "SELECT":
+            return None
+        if len(inner) < 3 or _upper(inner[0]) != "ARRAY" or inner[1].text != "[" or inner[-1].text != "]":
+            raise UnsupportedConstruct("ANY/ALL over an array variable")
+        items = inner[2:-1]
+        if not _is_literal_list(items):
+            raise UnsupportedConstruct("ANY/ALL over a non-literal array")
+        op, quantifier = tokens[op_index].text, _upper(tokens[word_index])
+        if op == "=" and quantifier in ("ANY", "SOME"):
+            keyword = "IN"
+        elif op in ("<>", "!=") and quantifier == "ALL":
+            keyword = "NOT IN"
+        else:
+            raise UnsupportedConstruct(f"{op} {quantifier} has no IN equivalent")
+        return [_word(keyword), _SPACE, _punct("(")] + _join_args(_split_args(items)) + [_punct(")")], close + 1
+
+    def _translate_function(self, name_token: Token, inner: List[Token], out: List[Token], following: Optional[Token]) -> List[Token]:
+        name = name_token.text.upper()
+        source, target = self.source, self.target
+
+        if name == "CAST":
+            depths = _depths(inner)
+            split = [i for i, token in enumerate(inner) if _upper(token) == "AS" and depths[i] == 0]
+            if len(split) != 1:
+                raise UnsupportedConstruct("Malformed CAST")
+            expression = self._translate(_strip(inner[:split[0]]))
+            type_tokens = _translate_cast_type(inner[split[0] + 1:], target)
+            return _call("CAST", [expression + [_SPACE, _word("AS"), _SPACE] + type_tokens])
+
+        if name == "EXTRACT":
+            depths = _depths(inner)
+            split = [i for i, token in enumerate(inner) if _upper(token) == "FROM" and depths[i] == 0]
+            unit = _strip(inner[:split[0]]) if len(split) == 1 else []
+            if len(unit) != 1 or _upper(unit[0]) not in _DATE_PARTS or source == "sqlserver":
+                raise UnsupportedConstruct("Unsupported EXTRACT")
+            return self._date_part(_upper(unit[0]), self._translate(_strip(inner[split[0] + 1:])))
+
+        args = [self._translate(arg) for arg in _split_args(inner)]
+
+        if name in _PORTABLE_FUNCTIONS:
+            self._check_arguments(name, args)
+            return [Token("word", name_token.text), _punct("(")] + _join_args(args) + [_punct(")")]
+
+        if name in _DATE_PARTS and source in ("sqlserver", "mysql") and len(args) == 1:
+            return self._date_part(name, args[0])
+
+        if name == "DATE_PART" and source == "postgresql" and len(args) == 2:
+            unit = args[0]
+            if len(unit) == 1 and unit[0].kind == "string" and unit[0].text.upper() in _DATE_PARTS:
+                return self._date_part(unit[0].text.upper(), args[1])
+
+        if name == "ISNULL" and source == "sqlserver" and len(args) == 2:
+            return _call("IFNULL" if target == "mysql" else "COALESCE", args)
+
+        if name == "IFNULL" and source == "mysql" and len(args) == 2:
+            return _call("ISNULL" if target == "sqlserver" else "COALESCE", args)
+
+        if name == "FIND_IN_SET" and source == "mysql" and len(args) == 2:
+            return self._find_in_set(args, out, following)
+
+        if name == "CONCAT" and len(args) >= 2:
+            return self._concat(args)
+
+        if name in ("GETDATE", "NOW") and not args:
+            return _call("GETDATE" if target == "sqlserver" else "NOW", [])
+
+        if (name, source) in (("LEN", "sqlserver"), ("CHAR_LENGTH", "mysql"), ("LENGTH", "postgresql")) and len(args) == 1:
+            return _call({"sqlserver": "LEN", "postgresql": "LENGTH", "mysql": "CHAR_LENGTH"}[target], args)
+
+        raise UnsupportedConstruct(f"Function {name_token.text} has no local translation")
+
+    def _check_arguments(self, name: str, args: List[List[Token]]) -> None:
+        """Portable functions are copied by name, so their arguments must already suit the target."""
+        low, high = _TARGET_ARITY.get((name, self.target), _PORTABLE_FUNCTIONS[name])
+        if len(args) < low or (high is not None and len(args) > high):
+            raise UnsupportedConstruct(f"{name} with {len(args)} arguments")
+        for arg in args:
+            depths = _depths(arg)
+            if any(_upper(token) in _ARGUMENT_KEYWORDS and depths[i] == 0 for i, token in enumerate(arg)):
+                raise UnsupportedConstruct(f"{name} with keyword arguments")
+
+    def _concat(self, args: List[List[Token]]) -> List[Token]:
+        """CONCAT skips NULL arguments in SQL Server and PostgreSQL; in MySQL any NULL makes it NULL."""
+        if self.source == "mysql":
+            raise UnsupportedConstruct("MySQL CONCAT returns NULL for any NULL argument")
+        if self.target == "mysql":
+            args = [
+                arg if len(arg) == 1 and arg[0].kind in ("string", "number")
+                else _call("COALESCE", [arg, [Token("string", "")]])
+                for arg in args
+            ]
+        return _call("CONCAT", args)
+
+    def _date_part(self, unit: str, expression: List[Token]) -> List[Token]:
+        if self.target == "postgresql":
+            return _call("date_part", [[Token("string", unit.lower())], expression])
+        return _call(unit, [expression])
+
+    def _find_in_set(self, args: List[List[Token]], out: List[Token], following: Optional[Token]) -> List[Token]:
+        """FIND_IN_SET is only translatable when used as a bare predicate."""
+        previous = _previous_index(out, len(out))
+        if (following is not None and (following.text in _COMPARISON_OPS or _upper(following) == "IS")) or (
+            previous is not None and out[previous].text in _COMPARISON_OPS
+        ):
+            raise UnsupportedConstruct("FIND_IN_SET used as a value")
+        needle, haystack = args
+        if self.target == "postgresql":
+            expression = (
+                _call("CAST", [needle + [_SPACE, _word("AS"), _SPACE, _word("text")]])
+                + [_SPACE, _word("= ANY"), _punct("(")]
+                + _call("string_to_array", [haystack, [Token("string", ",")]])
+                + [_punct(")")]
+            )
+        else:
+            expression = (
+                _call("CAST", [needle + [_SPACE, _word("AS"), _SPACE, _word("NVARCHAR(MAX)")]])
+                + [_SPACE, _word("IN"), _SPACE, _punct("("), _word("SELECT value FROM"), _SPACE]
+                + _call("STRING_SPLIT", [haystack, [Token("string", ",")]])
+                + [_punct(")")]
+            )
+        return [_punct("(")] + expression + [_punct(")")]
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def transpile(sql: str, source_type: str, target_type: str) -> str:
+    """Translate a plain query between dialects without calling the LLM.
+
+    Raises UnsupportedConstruct when the query uses anything outside the
+    supported subset; callers should then fall back to the model.
+    """
+    if source_type == target_type:
+        return sql
+    tokens = tokenize(sql.strip(), source_type)
+    return render(_Translator(source_type, target_type).run(tokens), target_type)
@@ -0,0 +1,141 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from segmenter import _mask, _split_statements, _trim_span
+
+# =============================================================================
+# Output Validation
+# =============================================================================
+#
+# Cheap structural checks on model output. They cannot prove the SQL is
+# correct, but they catch the failures models make most often. Issues are
+# tied to the statement they occur in when possible, so only that fragment
+# has to be sent back for repair.
+
+Span = Tuple[int, int]
+
+@dataclass
+class Issue:
+    message: str
+    # Offsets of the offending statement in the code; None for whole-routine problems.
+    span: Optional[Span] = None
+
+# Constructs that do not belong in the target dialect. Matched against the
+# masked code, so string literals (e.g. dynamic SQL) and comments are ignored.
+_FOREIGN_CONSTRUCTS: Dict[str, List[Tuple[re.Pattern, str]]] = {
+    "postgresql": [
+        (re.compile(r"\bRETURN\s+NEXT\s+SELECT\b", re.I),
+         "RETURN NEXT SELECT is not valid PL/pgSQL; use OPEN cursorN FOR <query>; RETURN NEXT cursorN;"),
+        (re.compile(r"\bWITH\s*\(\s*NOLOCK\s*\)", re.I), "WITH(NOLOCK) is a SQL Server table hint"),
+        (re.compile(r"\bsp_executesql\b|\bEXEC\b(?!UTE)", re.I), "EXEC/sp_executesql is SQL Server syntax"),
+        (re.compile(r"\bSELECT\s+TOP\b", re.I), "TOP is SQL Server syntax; use LIMIT"),
+        (re.compile(r"\bGETDATE\s*\(", re.I), "GETDATE() is SQL Server syntax; use now()"),
+        (re.compile(r"\b(?:ISNULL|IFNULL)\s*\(", re.I), "use COALESCE instead of ISNULL/IFNULL"),
+        (re.compile(r"\bFIND_IN_SET\s*\(", re.I), "FIND_IN_SET is MySQL syntax; use = ANY(array)"),
+        (re.compile(r"(?<![\w@])@\w+"), "@variables are not PL/pgSQL"),
+        (re.compile(r"^\s*DELIMITER\b", re.I | re.M), "DELIMITER is a MySQL client command"),
+    ],
+    "sqlserver": [
+        (re.compile(r"::\s*[A-Za-z_]"), "::type casts are PostgreSQL syntax; use CAST(... AS ...)"),
+        (re.compile(r"\bRETURN\s+NEXT\b", re.I), "RETURN NEXT is PL/pgSQL syntax"),
+        (re.compile(r"\brefcursor\b", re.I), "refcursor is a PostgreSQL type"),
+        (re.compile(r"\$\w*\$"), "dollar-quoted bodies are PostgreSQL syntax"),
+        (re.compile(r"\bLIMIT\s+\d", re.I), "LIMIT is not T-SQL; use TOP or OFFSET/FETCH"),
+        (re.compile(r"^\s*DELIMITER\b", re.I | re.M), "DELIMITER is a MySQL client command"),
+        (re.compile(r"\b(?:FIND_IN_SET|IFNULL)\s*\(", re.I), "FIND_IN_SET/IFNULL are MySQL functions"),
+    ],
+    "mysql": [
+        (re.compile(r"::\s*[A-Za-z_]"), "::type casts are PostgreSQL syntax; use CAST(... AS ...)"),
+        (re.compile(r"\bRETURN\s+NEXT\b", re.I), "RETURN NEXT is PL/pgSQL syntax"),
+        (re.compile(r"\brefcursor\b", re.I), "refcursor is a PostgreSQL type"),
+        (re.compile(r"\bSELECT\s+TOP\b", re.I), "TOP is SQL Server syntax; use LIMIT"),
+        (re.compile(r"\bWITH\s*\(\s*NOLOCK\s*\)", re.I), "WITH(NOLOCK) is a SQL Server table hint"),
+        (re.compile(r"\bGETDATE\s*\(", re.I), "GETDATE() is SQL Server syntax; use NOW()"),
+        (re.compile(r"\bsp_executesql\b", re.I), "sp_executesql is SQL Server syntax"),
+    ],
+}
+
+_FENCE = re.compile(r"^\s*```[\w-]*[ \t]*\n?|\n?[ \t]*```\s*$")
+
+def strip_fences(code: str) -> str:
+    """Drop a markdown code fence wrapped around the whole output."""
+    return _FENCE.sub("", code.strip()).strip()
+
+def apply_local_fixes(code: str, dialect: str) -> str:
+    """Fix problems that need no model: fences and MySQL delimiter bookkeeping."""
+    code = strip_fences(code)
+    if dialect == "mysql" and re.match(r"\s*DELIMITER\s+\$\$", code, re.I):
+        if not re.search(r"\bEND\s*;?\s*\$\$", code, re.I):
+            code = re.sub(r"\bEND\s*;?\s*(?=(?:DELIMITER\s*;\s*)?$)", "END$$\n", code, count=1, flags=re.I).rstrip()
+        if not re.search(r"^\s*DELIMITER\s*;\s*$", code, re.I | re.M):
+            code = code.rstrip() + "\nDELIMITER ;"
+    return code
+
+def _unbalanced_parentheses(masked: str) -> bool:
+    depth = 0
+    for char in masked:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                return True
+    return depth != 0
+
+def _statement_span(masked: str, spans: Sequence[Span], offset: int) -> Optional[Span]:
+    for span in spans:
+        if span[0] <= offset < span[1]:
+            return _trim_span(masked, span)
+    return None
+
+def find_issues(code: str, dialect: str, is_procedure: bool) -> List[Issue]:
+    """Problems found in converted or optimized ``code``; empty if it looks sound."""
+    if not code.strip():
+        return [Issue("output is empty")]
+    issues: List[Issue] = []
+    if "```" in code:
+        issues.append(Issue("output contains a markdown code fence"))
+    masked = _mask(code, dialect)
+    if "'" in masked:
+        issues.append(Issue("unterminated string literal"))
+    if _unbalanced_parentheses(masked):
+        issues.append(Issue("unbalanced parentheses"))
+    if is_procedure and not re.search(r"\b(CREATE|ALTER)\b", masked, re.I):
+        issues.append(Issue("procedure definition is missing"))
+
+    if dialect == "postgresql" and is_procedure:
+        tags = re.findall(r"\$\w*\$", masked)
+        if len(tags) % 2:
+            issues.append(Issue("unterminated dollar-quoted function body"))
+    if dialect == "mysql" and re.match(r"\s*DELIMITER\s+\$\$", masked, re.I):
+        if not re.search(r"^\s*DELIMITER\s*;\s*$", masked, re.I | re.M):
+            issues.append(Issue("missing DELIMITER ; after the procedure"))
+
+    spans = _split_statements(masked, 0, len(masked))
+    for pattern, message in _FOREIGN_CONSTRUCTS.get(dialect, []):
+        for match in pattern.finditer(masked):
+            issues.append(Issue(message, _statement_span(masked, spans, match.start())))
+    if dialect == "postgresql":
+        for match in re.finditer(r"\bOPEN\s+(\w+)\s+FOR\b", masked, re.I):
+            cursor = match.group(1)
+            if not re.search(rf"\bRETURN\s+NEXT\s+{re.escape(cursor)}\b", masked[match.end():], re.I):
+                issues.append(Issue(
+                    f"cursor {cursor} is opened but never returned with RETURN NEXT {cursor}",
+                    _statement_span(masked, spans, match.start()),
+                ))
+    return issues
+
+def validate_output(code: str, dialect: str, is_procedure: bool) -> List[str]:
+    """Messages for every problem found in ``code``."""
+    return [issue.message for issue in find_issues(code, dialect, is_procedure)]
+
+def splice(code: str, replacements: Sequence[Tuple[Span, str]]) -> str:
+    """Replace statement spans with repaired fragments, keeping indentation and a trailing semicolon."""
+    for (start, end), fragment in sorted(replacements, key=lambda item: item[0][0], reverse=True):
+        fragment = strip_fences(fragment)
+        if code[start:end].rstrip().endswith(";") and not fragment.rstrip().endswith(";"):
+            fragment = fragment.rstrip() + ";"
+        line_start = code.rfind("\n", 0, start) + 1
+        indent = re.match(r"[ \t]*", code[line_start:start]).group()
+        code = code[:start] + fragment.replace("\n", "\n" + indent) + code[end:]
+    return code
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { DatabaseType } from '../types';
+import { BatchItemResult, ConversionRequest, DatabaseType } from '../types';
 
 const API_URL = 'http://localhost:8000';
 
@@ -67,6 +67,27 @@ export const processMultiDatabaseConversion = async (
   }
 };
 
+export const processBatchConversion = async (
+  items: ConversionRequest[],
+  maxParallelism?: number
+): Promise<BatchItemResult[]> => {
+  try {
+    const response = await axios.post(`${API_URL}/convert/batch`, {
+      items: items.map(item => ({
+        source_code: item.sourceCode,
+        source_type: item.sourceType,
+        target_type: item.targetType
+      })),
+      max_parallelism: maxParallelism
+    });
+    
+    return response.data.results;
+  } catch (error) {
+    console.error('Batch conversion error:', error);
+    throw new Error('Failed to convert SQL batch');
+  }
+};
+
 export const optimizeSqlCode = async (sqlCode: string, sqlType: DatabaseType): Promise<string> => {
   try {
     const response = await axios.post(`${API_URL}/optimize`, {
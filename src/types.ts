@@ -20,4 +20,12 @@ export interface ConversionRequest {
   sourceCode: string;
   sourceType: DatabaseType;
   targetType: DatabaseType;
-}
\ No newline at end of file
+}
+
+export interface BatchItemResult {
+  index: number;
+  source_type: DatabaseType;
+  target_type: DatabaseType;
+  converted_code: string | null;
+  error: string | null;
+}